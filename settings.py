@@ -24,7 +24,24 @@ class SettingsManager:
             "font_family": "Segoe UI", # This is part of the PySide6 app, not the Tkinter one
             "font_size": 11,
             "dock_assets": [], # NEW: To store paths of loaded dock images
-            "saved_borders": [] # NEW: To store paths of finalized smart borders
+            "saved_borders": [], # NEW: To store paths of finalized smart borders
+            "image_cache_budget_mb": 256, # NEW: Memory budget for decoded UI Creator images
+            "pixel_cache_budget_mb": 4096, # NEW: Disk budget for the decoded pixel cache; least recently used entries are pruned
+            "tiled_texture_threshold": 16777216, # NEW: Pixel count from which textures are stored tiled (0 = never)
+            "memory_budget_mb": 2048, # NEW: Cap for image memory before regenerable data is evicted
+            "export_workers": 0, # NEW: Export worker processes (0 = one per CPU core)
+            "dds_encoder": "native", # NEW: "native" (built-in BC3 encoder) or "external" (texconv / dds_converter_command)
+            "dds_quality": "fast", # NEW: Built-in encoder mode, "fast" or "hq"
+            "dds_mipmaps": True, # NEW: Write a full mip chain
+            "dds_mip_filter": "box", # NEW: Mip filter, "box" or "lanczos"
+            "blp_version": "BLP1", # NEW: "BLP1" (Warcraft III) or "BLP2" (palette only)
+            "blp_compression": "jpeg", # NEW: "jpeg" or "palette"
+            "blp_jpeg_quality": 90, # NEW
+            "blp_mipmaps": True, # NEW
+            "dds_converter_command": None, # NEW: Replaces texconv.exe, e.g. ["my_converter", "-o", "{out_dir}"]; inputs are appended
+            "undo_budget_mb": 256, # NEW: Compressed undo/redo history kept in memory before spilling to temp files
+            "undo_disk_budget_mb": 2048, # NEW: Spilled undo/redo history kept before the oldest steps are dropped
+            "autosave_journal": True # NEW: Journal edits in the background and offer recovery after a crash
         }
         self.settings = self.defaults.copy()
         self.load()
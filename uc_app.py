@@ -6,6 +6,8 @@ from tkinter import ttk
 from PIL import Image, ImageTk, ImageDraw, ImageEnhance, ImageChops
 import os
 import json
+import copy
+import shutil
 
 from uc_border_manager2 import NUMPY_AVAILABLE, SmartBorderManager # Import NUMPY_AVAILABLE
 import numpy as np
@@ -22,6 +24,16 @@ from uc_ui import UIManager
 from uc_border_manager import BorderManager
 from uc_image_manager import ImageManager
 from uc_export_manager import ExportManager
+from uc_image_handle import ImageHandle
+from uc_image_cache import DEFAULT_BUDGET_MB, PIXEL_CACHE_BUDGET_MB, image_cache, load_image
+from uc_image_loader import ImageSetLoader
+from uc_filter_manager import FilterManager
+from uc_tiled_image import DEFAULT_TILING_THRESHOLD, TiledImage, should_tile
+from uc_memory_budget import DEFAULT_CAP_MB, memory_budget
+from uc_layout import LAYOUT_SCHEMA_VERSION, PREVIEW_LAYOUT, read_layout_file, write_layout_file
+from uc_journal import JournalManager
+from uc_project_manager import ProjectManager
+from uc_undo import DEFAULT_BUDGET_MB as UNDO_BUDGET_MB, DEFAULT_DISK_BUDGET_MB as UNDO_DISK_BUDGET_MB, UndoManager, discard_state
 from settings import SettingsManager # type: ignore
 from utils import get_base_path # Import the centralized function
 
@@ -40,6 +52,9 @@ class ImageEditorApp:
 
         # --- NEW: Initialize Settings Manager ---
         self.settings_manager = SettingsManager()
+        image_cache.set_budget_mb(self.settings_manager.get("image_cache_budget_mb", DEFAULT_BUDGET_MB))
+        memory_budget.set_cap_mb(self.settings_manager.get("memory_budget_mb", DEFAULT_CAP_MB))
+        memory_budget.add_authoritative_source(self._iter_authoritative_handles)
         master.protocol("WM_DELETE_WINDOW", self.save_on_exit)
 
         # Constants
@@ -55,6 +70,7 @@ class ImageEditorApp:
         self.selected_component_tag = None
         self.tile_eraser_mode_active = False # NEW: For the tile eraser tool
         self.pre_move_state = {} # NEW: To store component positions before a move
+        self.layout_stack_order = [] # Bottom-to-top tags of the last applied layout (see `apply_layout`)
         self.smart_border_mode_active = False # NEW: For the smart border tool
         
         # --- NEW: Inventory Toggle State ---
@@ -68,15 +84,19 @@ class ImageEditorApp:
         self.maintain_aspect = tk.BooleanVar(value=True)
         self.move_amount = tk.IntVar(value=1) # NEW: For moving tiles by pixels
         self.mouse_coords_var = tk.StringVar(value="World: (0, 0)") # NEW: For coordinate display
+        self.memory_label_var = tk.StringVar(value="Mem: -") # NEW: Live memory budget readout
+        self.memory_cap_var = tk.StringVar(value=str(int(memory_budget.cap_bytes / (1024 * 1024))))
         self.resize_width.trace_add("write", self.on_resize_entry_change)
         self.resize_height.trace_add("write", self.on_resize_entry_change)
 
         # --- NEW: Undo Stack ---
         self.export_all_tiles = tk.BooleanVar(value=True) # FIX: For the export checkbox
 
-        self.undo_stack = []
-        self.MAX_UNDO_STATES = 20 # Limit memory usage
+        # Region-diff history capped by bytes (see uc_undo)
+        self.undo_manager = UndoManager(self, self.settings_manager.get("undo_budget_mb", UNDO_BUDGET_MB),
+                                        self.settings_manager.get("undo_disk_budget_mb", UNDO_DISK_BUDGET_MB))
         master.bind("<Control-z>", self.undo_last_action)
+        master.bind("<Control-y>", self.redo_last_action) # NEW: Redo
 
         self.is_group_dragging = False # Flag to prevent single-drag during group-pan
         
@@ -96,6 +116,11 @@ class ImageEditorApp:
         self.output_dir = os.path.join(self.ui_creator_contents_path, "output")
         self.layouts_dir = os.path.join(self.ui_creator_contents_path, "layouts")
         self.saved_borders_dir = os.path.join(self.ui_creator_contents_path, "saved_borders") # NEW
+        self.pixel_cache_dir = os.path.join(self.ui_creator_contents_path, "cache", "pixels") # NEW: Decoded RGBA cache
+        image_cache.attach_disk_cache(self.pixel_cache_dir, self.settings_manager.get("pixel_cache_budget_mb", PIXEL_CACHE_BUDGET_MB))
+        # Autosave journal, started once the first image set has loaded
+        self.journal_manager = JournalManager(self, os.path.join(self.ui_creator_contents_path, "journal"))
+        self.project_manager = ProjectManager(self) # NEW: Single-file projects
         print(f"[DEBUG] Base path: {self.base_path}")
         print(f"[DEBUG] Image dir: {self.image_base_dir}")
         print(f"[DEBUG] Output dir: {self.output_dir}")
@@ -127,6 +152,8 @@ class ImageEditorApp:
         self.camera = Camera(self, canvas)
         self.image_manager = ImageManager(self)
         self.export_manager = ExportManager(self)
+        self.image_loader = ImageSetLoader(self) # NEW: Decodes image sets off the Tk thread
+        self.filter_manager = FilterManager(self) # NEW: Filters tab adjustment stack
         # --- Initialize Components BEFORE UI that might use them ---
         # This ensures self.components exists before any callbacks can be triggered.
         self._initialize_components()
@@ -159,16 +186,7 @@ class ImageEditorApp:
         print("[DEBUG] Generic drag handler (<B1-Motion>) has been bound.")
 
         # --- PREVIEW LAYOUT COORDINATES ---
-        self.preview_layout = {
-            "humanuitile01": {"coords": [261, 57, 511, 357]},
-            "humanuitile02": {"coords": [511, 57, 761, 357]},
-            "humanuitile03": {"coords": [761, 57, 1011, 357]},
-            "humanuitile04": {"coords": [1011, 57, 1041, 357]},
-            "humanuitile05": {"coords": [11, 57, 261, 357]},
-            "humanuitile06": {"coords": [1041, 57, 1291, 357]},
-            "humanuitile-inventorycover": {"coords": [724, 57, 844, 357]},
-            "humanuitile-timeindicatorframe": {"coords": [585, 57, 720, 132]}
-        }
+        self.preview_layout = copy.deepcopy(PREVIEW_LAYOUT)
 
         # Set a default selected component
         self.set_selected_component('humanuitile01')
@@ -188,7 +206,7 @@ class ImageEditorApp:
         if self.image_sets:
             self.selected_image_set.set(self.image_sets[0])
         else:
-            self._attempt_auto_load_images(self.image_base_dir)
+            self._load_images_in_background(self.image_base_dir)
             
         # --- 6. Reload saved dock assets ---
         self._reload_dock_assets()
@@ -205,6 +223,45 @@ class ImageEditorApp:
     def initial_draw(self):
         """Performs the first layout application and redraw after the UI is ready."""
         self.apply_preview_layout()
+        self._update_memory_readout()
+
+    # --- NEW: Memory budget ---
+    MEMORY_READOUT_INTERVAL_MS = 1000
+
+    def _iter_authoritative_handles(self):
+        """Yields every image handle that can't be regenerated: component images and undo/redo snapshots."""
+        for comp in list(self.components.values()):
+            yield comp.image_handle
+            yield comp.original_image_handle
+            yield comp.filter_base_handle
+        yield from self.undo_manager.iter_handles()
+
+    def _update_memory_readout(self):
+        """Re-counts authoritative memory, enforces the cap and refreshes the status readout."""
+        memory_budget.refresh_authoritative()
+        memory_budget.enforce()
+        usage = memory_budget.usage()
+        over_cap = " - OVER CAP" if usage['over_cap'] else ""
+        self.memory_label_var.set(f"Mem: {usage['total_mb']:.0f} / {usage['cap_mb']:.0f} MB ({usage['regenerable_mb']:.0f} cache){over_cap}")
+        self.master.after(self.MEMORY_READOUT_INTERVAL_MS, self._update_memory_readout)
+
+    def apply_memory_cap(self):
+        """Applies the memory cap typed into the Tile Control tab and saves it."""
+        try:
+            cap_mb = int(self.memory_cap_var.get())
+        except ValueError:
+            messagebox.showerror("Invalid Value", "The memory cap must be a whole number of megabytes.")
+            return
+        memory_budget.set_cap_mb(cap_mb)
+        self.memory_cap_var.set(str(int(memory_budget.cap_bytes / (1024 * 1024))))
+        self.save_settings()
+        print(f"[INFO] Memory cap set to {self.memory_cap_var.get()} MB.")
+
+    def _drop_tk_image(self, comp):
+        """Evicts a component's rendered PhotoImage; the next redraw that shows it re-renders it."""
+        if comp.rect_id and comp.tk_image is not None:
+            self.canvas.itemconfigure(comp.rect_id, image='')
+        comp.tk_image = None
 
     def save_settings(self):
         """Saves the current application settings to the settings file."""
@@ -225,6 +282,9 @@ class ImageEditorApp:
                 })
         self.settings_manager.settings['dock_assets'] = dock_assets_to_save
         self.settings_manager.settings['saved_borders'] = saved_borders_to_save
+        self.settings_manager.settings['memory_budget_mb'] = int(memory_budget.cap_bytes / (1024 * 1024))
+        self.settings_manager.settings['dds_quality'] = self.export_manager.dds_quality_var.get()
+        self.settings_manager.settings['dds_mipmaps'] = self.export_manager.dds_mipmaps_var.get()
 
         # 5. Write the entire, updated settings object back to the file.
         with open(self.settings_manager.settings_path, 'w') as f:
@@ -234,6 +294,11 @@ class ImageEditorApp:
     def save_on_exit(self):
         """Saves settings and closes the application."""
         self.save_settings()
+        self.image_loader.shutdown()
+        self.export_manager.shutdown()
+        self.undo_manager.shutdown()
+        self.journal_manager.shutdown(clean=True)
+        image_cache.save_digest_index()
         # --- FIX: Explicitly destroy the cursor window on exit ---
         if self.border_manager and self.border_manager.smart_manager and self.border_manager.smart_manager.cursor_window:
             self.border_manager.smart_manager.cursor_window.destroy()
@@ -546,10 +611,13 @@ class ImageEditorApp:
                 # If the file exists, attempt to load it into the component
                 try:
                     # REFACTOR: Logic moved from component to app/manager
-                    pil_image = Image.open(full_path).convert("RGBA")
-                    if not component.original_pil_image:
-                        component.original_pil_image = pil_image.copy()
-                    component.set_image(pil_image)
+                    # The decoded image comes from the shared cache, so switching back to a set
+                    # that was already visited doesn't decode anything. The original and the
+                    # working image share the handle; pixels are only copied when edited.
+                    image_handle = self._prepare_image_handle(load_image(full_path))
+                    if component.original_image_handle is None: # Don't assemble a tiled original just to test it
+                        component.original_pil_image = image_handle
+                    component.set_image(image_handle, redraw=False)
                     print(f"Image loaded for {tag}: {os.path.basename(full_path)}")
                     loaded_count += 1
                 except Exception as e:
@@ -558,7 +626,10 @@ class ImageEditorApp:
                 # IMPORTANT: Print the full path that failed to help with debugging
                 print(f"File not found for {tag}: {full_path}")
 
+        stats = image_cache.stats()
+        self.redraw_all_zoomable()
         print(f"Auto-load complete. {loaded_count} images loaded.")
+        print(f"[DEBUG] Image cache: {stats['entries']} entries, {stats['total_mb']:.1f}/{stats['budget_mb']:.0f} MB, {stats['hits']} hits, {stats['misses']} misses ({stats['disk_hits']} mapped from disk).")
         print("-" * 30)
 
     def on_image_set_changed(self, *args):
@@ -569,9 +640,54 @@ class ImageEditorApp:
         
         new_image_dir = os.path.join(self.image_base_dir, set_name)
         print(f"\n--- Changing image set to: {set_name} ---")
-        self._attempt_auto_load_images(new_image_dir)
-        # Re-apply the layout to show the newly loaded images in their correct positions.
+        self._load_images_in_background(new_image_dir, set_name)
+
+    def _load_images_in_background(self, base_dir, set_name=None):
+        """
+        Decodes the images for every component on the loader's thread pool. Components keep
+        showing their current image (or a 'loading' placeholder) until the whole batch arrives.
+        """
+        for comp in self.components.values():
+            if comp.text_id and comp.image_handle is None:
+                self.canvas.itemconfig(comp.text_id, text=f"{comp.placeholder_text}\n(loading...)")
+        # Tiling huge textures is a full copy, so it runs in the loader's worker batch too.
+        threshold = self.settings_manager.get("tiled_texture_threshold", DEFAULT_TILING_THRESHOLD)
+        self.image_loader.load_set(base_dir, list(self.components.keys()), self._apply_loaded_images, set_name,
+                                   prepare=lambda handle: self._prepare_image_handle(handle, threshold))
+
+    def _prepare_image_handle(self, image_handle, threshold=None):
+        """Converts very large textures to tiled storage (see `tiled_texture_threshold`). Safe to call off the Tk thread."""
+        if threshold is None:
+            threshold = self.settings_manager.get("tiled_texture_threshold", DEFAULT_TILING_THRESHOLD)
+        if image_handle.tiled is None and should_tile(image_handle, threshold):
+            print(f"[INFO] Storing {image_handle.width}x{image_handle.height} texture as tiles.")
+            return ImageHandle(TiledImage.from_image(image_handle.image))
+        return image_handle
+
+    def _apply_loaded_images(self, images, errors):
+        """Runs on the Tk thread with a finished batch from the loader and redraws once."""
+        for tag, image_handle in images.items():
+            component = self.components.get(tag)
+            if not component:
+                continue
+            if component.original_image_handle is None: # Don't assemble a tiled original just to test it
+                component.original_pil_image = image_handle
+            component.set_image(image_handle, redraw=False)
+        for tag, error in errors.items():
+            print(f"[ERROR] Could not load image for {tag}: {error}")
+
+        # Components without an image in this set go back to their plain placeholder.
+        for comp in self.components.values():
+            if comp.text_id and comp.image_handle is None:
+                self.canvas.itemconfig(comp.text_id, text=comp.placeholder_text)
+
+        stats = image_cache.stats()
+        print(f"[INFO] Background load complete. {len(images)} images loaded.")
+        print(f"[DEBUG] Image cache: {stats['entries']} entries, {stats['total_mb']:.1f}/{stats['budget_mb']:.0f} MB, {stats['hits']} hits, {stats['misses']} misses ({stats['disk_hits']} mapped from disk).")
+        # Re-apply the layout to show the newly loaded images in their correct positions (one redraw).
         self.apply_preview_layout()
+        # Offer crash recovery only now, so the loaded set doesn't overwrite recovered images.
+        self.journal_manager.start()
 
     def select_component(self, tag):
         """Selects a component and highlights it."""
@@ -579,12 +695,12 @@ class ImageEditorApp:
         
         # Reset all borders first
         for comp in self.components.values():
-            if comp.rect_id and comp.pil_image is None: # It's a placeholder
+            if comp.rect_id and comp.image_handle is None: # It's a placeholder
                  self.canvas.itemconfig(comp.rect_id, outline='white', width=2)
         
         # Highlight the selected one
         selected_comp = self.components.get(tag)
-        if selected_comp and selected_comp.pil_image is None:
+        if selected_comp and selected_comp.image_handle is None:
             self.canvas.itemconfig(selected_comp.rect_id, outline='yellow', width=3)
         
         print(f"[ACTION] Component '{tag}' selected via sidebar.")
@@ -595,6 +711,9 @@ class ImageEditorApp:
         comp = self.components.get(tag)
         if comp: print(f"[DEBUG] Selected component: '{tag}' | World Coords: ({int(comp.world_x1)}, {int(comp.world_y1)})")
         else: print(f"[DEBUG] Selected component: {tag}")
+        # --- NEW: Show the selected tile's filter stack in the Filters tab ---
+        if hasattr(self, 'filter_manager'):
+            self.filter_manager.load_params_for_selection()
     
     def move_layer(self, direction):
         """Raises or lowers the currently selected layer's Z-order."""
@@ -635,41 +754,51 @@ class ImageEditorApp:
             return
 
         print(f"Deleting component '{tag_to_delete}'...")
+        memory_budget.forget(("tk_image", tag_to_delete))
 
         # --- NEW: Save state for Undo ---
         # We save all necessary data to fully reconstruct the component.
-        undo_data = {
-            'type': 'delete_component',
-            'component_data': {
-                'tag': comp_to_delete.tag, 'x1': comp_to_delete.world_x1, 'y1': comp_to_delete.world_y1,
-                'x2': comp_to_delete.world_x2, 'y2': comp_to_delete.world_y2, 'color': comp_to_delete.placeholder_color,
-                'text': comp_to_delete.placeholder_text, 'is_decal': comp_to_delete.is_decal,
-                'is_border_asset': comp_to_delete.is_border_asset, 'parent_tag': comp_to_delete.parent_tag,
-                'pil_image': comp_to_delete.pil_image.copy() if comp_to_delete.pil_image else None,
-                'original_pil_image': comp_to_delete.original_pil_image.copy() if comp_to_delete.original_pil_image else None
-            }
-        }
-        self._save_undo_state(undo_data)
+        self._save_undo_state({'type': 'delete_component', 'component_data': self._component_snapshot(comp_to_delete)})
 
         self.image_manager._remove_stamp_source_component(comp_to_delete)
         print(f"Component '{tag_to_delete}' deleted.")
 
+    def _component_snapshot(self, comp):
+        """Returns the data needed to re-create `comp` (for undo/redo of deletions)."""
+        return {
+            'tag': comp.tag, 'x1': comp.world_x1, 'y1': comp.world_y1,
+            'x2': comp.world_x2, 'y2': comp.world_y2, 'color': comp.placeholder_color,
+            'text': comp.placeholder_text, 'is_decal': comp.is_decal,
+            'is_border_asset': comp.is_border_asset, 'parent_tag': comp.parent_tag,
+            # Share the image handles instead of copying the pixels.
+            'pil_image': comp.image_handle.acquire() if comp.image_handle else None,
+            'original_pil_image': comp.original_image_handle.acquire() if comp.original_image_handle else None
+        }
+
+    def _stacking_order(self):
+        """Returns the tags of the non-dock components from bottom to top."""
+        by_item = {comp.rect_id: tag for tag, comp in self.components.items() if comp.rect_id and not comp.is_dock_asset}
+        order = [by_item[item] for item in self.canvas.find_all() if item in by_item]
+        # Components that aren't on the canvas yet are drawn last, in dictionary order.
+        drawn = set(order)
+        order += [tag for tag, comp in self.components.items() if tag not in drawn and not comp.is_dock_asset]
+        return order
+
     def save_layout(self):
-        """Saves the current coordinates of all components to a JSON file."""
+        """Saves the world coordinates, stacking order and parent links of all components to a JSON file."""
         if not self.components:
             messagebox.showwarning("Empty Canvas", "No components to save.")
             return
 
-        layout_data = {}
-        for tag, comp in self.components.items():
-            bbox = self.canvas.bbox(comp.rect_id)
-            if bbox:
-                # Store coordinates (x1, y1, x2, y2)
-                layout_data[tag] = {
-                    "coords": bbox 
-                    # Z-order is not stored as Tkinter does not expose it easily, 
-                    # but coordinates are fully saved.
-                }
+        layout_components = {}
+        for tag in self._stacking_order():
+            comp = self.components[tag]
+            if comp.is_decal: continue # Decals are temporary and never part of a layout
+            layout_components[tag] = {
+                "box": [comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2],
+                "z": len(layout_components),
+                "parent": comp.parent_tag
+            }
 
         os.makedirs(self.layouts_dir, exist_ok=True)
         filepath = filedialog.asksaveasfilename(
@@ -681,15 +810,14 @@ class ImageEditorApp:
         
         if filepath:
             try:
-                with open(filepath, 'w') as f:
-                    json.dump(layout_data, f, indent=4)
+                write_layout_file(filepath, layout_components)
                 messagebox.showinfo("Success", f"Layout saved to {os.path.basename(filepath)}")
                 print(f"Layout saved to {filepath}")
             except Exception as e:
                 messagebox.showerror("Save Error", f"Failed to save layout: {e}")
 
     def load_layout(self):
-        """Loads coordinates for all components from a JSON file and moves them."""
+        """Loads a layout file and applies it to all components at once."""
         filepath = filedialog.askopenfilename(
             filetypes=[("JSON files", "*.json")],
             title="Load Component Layout",
@@ -698,83 +826,146 @@ class ImageEditorApp:
         
         if filepath:
             try:
-                with open(filepath, 'r') as f:
-                    layout_data = json.load(f)
-                
-                # Apply coordinates
-                for tag, data in layout_data.items():
-                    if tag in self.components and "coords" in data:
-                        # For an image anchored at NW (top-left), bbox[0] and bbox[1] are its coordinates
-                        target_x1, target_y1, _, _ = data["coords"]
-                        comp = self.components[tag]
-                        
-                        current_bbox = self.canvas.bbox(comp.rect_id)
-                        if not current_bbox:
-                            continue # Skip if component isn't drawn yet
-
-                        current_x1, current_y1, _, _ = current_bbox
-                        
-                        # Calculate movement required (delta)
-                        dx = target_x1 - current_x1
-                        dy = target_y1 - current_y1
-                        
-                        # Apply movement
-                        self.canvas.move(comp.rect_id, dx, dy)
-                        if comp.text_id:
-                            self.canvas.move(comp.text_id, dx, dy)
-
-
+                sizes = {tag: (comp.world_x2 - comp.world_x1, comp.world_y2 - comp.world_y1) for tag, comp in self.components.items()}
+                layout, converted = read_layout_file(filepath, sizes)
+                if converted:
+                    # --- NEW: Upgrade old (screen-space) layout files in place, keeping a backup ---
+                    shutil.copy2(filepath, f"{filepath}.v1.bak")
+                    write_layout_file(filepath, layout["components"])
+                    print(f"[INFO] Converted layout {filepath} to schema {LAYOUT_SCHEMA_VERSION} (backup: {filepath}.v1.bak).")
+                applied = self.apply_layout(layout["components"])
                 messagebox.showinfo("Success", f"Layout loaded from {os.path.basename(filepath)}")
-                print(f"Layout loaded from {filepath}")
+                print(f"Layout loaded from {filepath} ({applied} components).")
             except json.JSONDecodeError as e:
                 messagebox.showerror("Load Error", f"Invalid layout file format: The file is corrupted or not valid JSON: {e}")
             except Exception as e:
                 messagebox.showerror("Load Error", f"Failed to load layout: {e}")
 
+    def apply_layout(self, layout_components):
+        """
+        Applies {tag: {"box", "z", "parent"}} to the existing components as one batch: all
+        boxes, parent links and the stacking order are set first, then the canvas is redrawn
+        once. Children that the layout doesn't mention follow their parent's move. If any box
+        changes, the whole change is a single undo step. Returns the number of components laid out.
+        """
+        targets = {tag: data for tag, data in layout_components.items() if tag in self.components and not self.components[tag].is_dock_asset}
+        if not targets:
+            return 0
+
+        new_boxes = {tag: tuple(data["box"]) for tag, data in targets.items()}
+        # Components the layout doesn't place follow their parent's move. Resolve them parent-first,
+        # one generation per pass, so a grandchild follows however the dict happens to be ordered.
+        followers = {tag: comp.parent_tag for tag, comp in self.components.items() if tag not in new_boxes}
+        while True:
+            ready = [tag for tag, parent_tag in followers.items() if parent_tag in new_boxes]
+            if not ready: break
+            for tag in ready:
+                comp, parent = self.components[tag], self.components[followers.pop(tag)]
+                dx, dy = new_boxes[parent.tag][0] - parent.world_x1, new_boxes[parent.tag][1] - parent.world_y1
+                new_boxes[tag] = (comp.world_x1 + dx, comp.world_y1 + dy, comp.world_x2 + dx, comp.world_y2 + dy)
+
+        old_boxes = {tag: (self.components[tag].world_x1, self.components[tag].world_y1, self.components[tag].world_x2, self.components[tag].world_y2) for tag in new_boxes}
+        changed = {tag for tag, box in new_boxes.items() if old_boxes[tag] != box}
+        if changed:
+            self._save_undo_state({'type': 'move', 'positions': {tag: old_boxes[tag] for tag in changed}})
+        for tag, box in new_boxes.items():
+            comp = self.components[tag]
+            comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2 = box
+            if tag in targets:
+                comp.parent_tag = targets[tag].get("parent")
+
+        # Stacking order: components the layout doesn't mention keep their place below the laid-out ones.
+        current = self._stacking_order()
+        rank = {tag: i for i, tag in enumerate(current)}
+        order = sorted(current, key=lambda t: (1, targets[t].get("z", 0), rank[t]) if t in targets else (0, 0, rank[t]))
+        for tag in order:
+            if self.components[tag].rect_id:
+                self.canvas.tag_raise(tag) # Raises the image or placeholder rectangle and its text
+        # Components that get (or re-create) their canvas item later are slotted in by `_place_in_stack`.
+        self.layout_stack_order = order
+
+        self.redraw_all_zoomable()
+        return len(targets)
+
+
+    def _place_in_stack(self, comp):
+        """Lowers a newly created canvas item below the next component above it in the applied layout's order."""
+        order = self.layout_stack_order
+        if comp.tag not in order:
+            return
+        for above_tag in order[order.index(comp.tag) + 1:]:
+            above = self.components.get(above_tag)
+            if above and above.rect_id and above.rect_id != comp.rect_id:
+                self.canvas.tag_lower(comp.tag, above_tag)
+                return
 
     def _save_undo_state(self, undo_data):
         """
-        Saves an action to the undo stack.
-        - For paint actions, `undo_data` is the PIL image of the paint layer *before* the change.
-        - For component changes, `undo_data` is a dictionary mapping component tags to their PIL images *before* the change.
+        Saves an action to the undo stack and clears the redo stack.
+        - For component image changes, `undo_data` is a dictionary mapping component tags to their image handles *before* the change.
+        - Other actions are dictionaries with a 'type' key (see `_restore_state`).
+        The undo manager later replaces the images with compressed diffs.
         """
         # --- DEBUG: Log what is being saved ---
         if isinstance(undo_data, dict) and 'type' in undo_data:
             print(f"[DEBUG] Saving undo state for action: '{undo_data['type']}'.")
-        
-        self.undo_stack.append(undo_data)
-        # Limit the stack size to save memory
-        if len(self.undo_stack) > self.MAX_UNDO_STATES:
-            self.undo_stack.pop(0) # Remove the oldest state
-        # Enable the undo button
-        self.undo_button.config(state='normal')
 
+        self.undo_manager.push(undo_data)
+        self._update_undo_buttons()
+
+    def _update_undo_buttons(self):
+        if hasattr(self, 'undo_button'):
+            self.undo_button.config(state='normal' if self.undo_manager.can_undo else 'disabled')
+        if hasattr(self, 'redo_button'):
+            self.redo_button.config(state='normal' if self.undo_manager.can_redo else 'disabled')
 
     def undo_last_action(self, event=None):
         """Reverts the last action from the undo stack."""
-        if not self.undo_stack:
+        last_state = self.undo_manager.pop_undo()
+        if last_state is None:
             print("Undo stack is empty.")
             return
+        self.undo_manager.push_inverse(self._restore_state(last_state), to_redo=True)
+        print("Undo successful.")
+        self._update_undo_buttons()
 
-        last_state = self.undo_stack.pop()
-
+    def redo_last_action(self, event=None):
+        """Re-applies the last undone action."""
+        state = self.undo_manager.pop_redo()
+        if state is None:
+            print("Redo stack is empty.")
+            return
+        self.undo_manager.push_inverse(self._restore_state(state), to_redo=False)
+        print("Redo successful.")
+        self._update_undo_buttons()
+
+    def _restore_state(self, last_state):
+        """Restores a state from the undo or redo stack and returns the state that reverts it again."""
+        undo_manager = self.undo_manager
+        inverse = {}
         if isinstance(last_state, dict): # It's a component image state
             action_type = last_state.get('type')
 
-            print(f"[DEBUG] Undoing action of type: '{action_type}'.")
+            print(f"[DEBUG] Restoring action of type: '{action_type}'.")
             if action_type == 'move':
+                positions = {}
                 for move_tag, pos in last_state.get('positions', {}).items():
                     if move_tag in self.components:
                         comp = self.components[move_tag]
+                        positions[move_tag] = (comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2)
                         comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2 = pos
+                inverse = {'type': 'move', 'positions': positions}
                 self.redraw_all_zoomable()
             elif action_type == 'add_component':
                 tag_to_remove = last_state.get('tag')
                 if tag_to_remove and tag_to_remove in self.components:
                     comp_to_remove = self.components[tag_to_remove]
+                    inverse = {'type': 'delete_component', 'component_data': self._component_snapshot(comp_to_remove)}
                     self.canvas.delete(comp_to_remove.tag)
                     if comp_to_remove.rect_id: self.canvas.delete(comp_to_remove.rect_id)
                     del self.components[tag_to_remove]
+                    comp_to_remove.release_images() # The inverse snapshot holds its own references
+                    memory_budget.forget(("tk_image", tag_to_remove))
                     self.redraw_all_zoomable()
                     print(f"Undid component addition for '{tag_to_remove}'.")
             elif action_type == 'delete_component':
@@ -789,31 +980,42 @@ class ImageEditorApp:
                     new_comp.is_border_asset = data['is_border_asset']
                     new_comp.parent_tag = data['parent_tag']
                     new_comp.original_pil_image = data['original_pil_image']
-                    
+
                     self.components[data['tag']] = new_comp
                     self._bind_component_events(data['tag'])
-                    
+
                     # Set the image, which will trigger a redraw
                     if data['pil_image']:
-                        new_comp.set_image(data['pil_image'])
+                        new_comp.set_image(undo_manager.resolve_image(data['pil_image']))
+                    inverse = {'type': 'add_component', 'tag': data['tag']}
                     print(f"Undid component deletion for '{data['tag']}'.")
+            elif action_type == 'filters':
+                comp = self.components.get(last_state.get('tag'))
+                if comp:
+                    inverse = {'type': 'filters', 'tag': comp.tag, 'params': comp.filter_params}
+                    last_state['image'], inverse['image'] = undo_manager.swap_image(comp.image_handle, last_state['image'])
+                    self.filter_manager.restore_from_undo(last_state)
+                    print(f"Reverted filters for component '{last_state.get('tag')}'.")
             elif action_type == 'border_points':
                 # --- NEW: Handle undo for smart border points ---
                 points_to_restore = last_state.get('before')
                 if points_to_restore is not None:
-                    self.border_manager.smart_manager.raw_border_points = points_to_restore
-                    self.border_manager.smart_manager._rebuild_quadtree()
-                    self.border_manager.smart_manager._update_highlights()
+                    smart_manager = self.border_manager.smart_manager
+                    inverse = {'type': 'border_points', 'before': set(smart_manager.raw_border_points), 'after': points_to_restore}
+                    smart_manager.raw_border_points = points_to_restore
+                    smart_manager._rebuild_quadtree()
+                    smart_manager._update_highlights()
             else: # It's a component image state (original implementation)
                 for tag, image in last_state.items():
                     if tag in self.components:
-                        self.components[tag].set_image(image)
+                        comp = self.components[tag]
+                        image, inverse[tag] = undo_manager.swap_image(comp.image_handle, image)
+                        comp.set_image(image)
                         print(f"Reverted image for component '{tag}'.")
 
-        print("Undo successful.")
-        # Disable button if stack is now empty
-        if not self.undo_stack:
-            self.undo_button.config(state='disabled')
+            # The restored components hold their own references now.
+            discard_state(last_state)
+        return inverse
 
     def on_canvas_resize(self, event):
         """Handles the canvas being resized, updating composition area and paint layer."""
@@ -837,7 +1039,12 @@ class ImageEditorApp:
         view_wx2, view_wy2 = self.camera.screen_to_world(canvas_w, canvas_h)
 
         # 1. Draw the main components (tiles, decals)
-        self._draw_components(use_fast_preview, view_wx1, view_wy1, view_wx2, view_wy2, canvas_w, canvas_h)
+        # Everything rendered or touched in this pass is on screen, so the budget won't evict it.
+        memory_budget.begin_frame()
+        try:
+            self._draw_components(use_fast_preview, view_wx1, view_wy1, view_wx2, view_wy2, canvas_w, canvas_h)
+        finally:
+            memory_budget.end_frame()
 
         # 2. Draw overlays (highlights, tool previews) on top
         self._draw_overlays(zoom_scale, view_wx1, view_wy1, view_wx2, view_wy2, canvas_w, canvas_h)
@@ -864,17 +1071,18 @@ class ImageEditorApp:
                 if comp.rect_id: self.canvas.itemconfigure(comp.rect_id, state='normal')
 
             if not comp.rect_id:
-                if comp.pil_image:
+                if comp.image_handle:
                     sx1, sy1 = self.camera.world_to_screen(comp.world_x1, comp.world_y1)
                     comp.rect_id = self.canvas.create_image(
                         sx1, sy1,
                         anchor=tk.NW,
                         tags=(comp.tag, "draggable", "zoom_target")
                     )
+                    self._place_in_stack(comp)
                     print(f"[DEBUG] Created initial canvas image for new component '{comp.tag}'.")
 
             if comp.rect_id:
-                if comp.pil_image:
+                if comp.image_handle:
                     if comp.tk_image is None:
                         self.canvas.delete(comp.rect_id)
                         sx1, sy1 = self.camera.world_to_screen(comp.world_x1, comp.world_y1)
@@ -883,23 +1091,29 @@ class ImageEditorApp:
                             anchor=tk.NW,
                             tags=(comp.tag, "draggable", "zoom_target")
                         )
+                        self._place_in_stack(comp)
                         if comp.text_id:
                             self.canvas.delete(comp.text_id); comp.text_id = None
                         comp._cached_screen_w, comp._cached_screen_h = -1, -1
 
                     screen_w, screen_h = sx2 - sx1, sy2 - sy1
+                    if comp.display_pil_image is not None:
+                        source_img = comp.display_pil_image
+                    else:
+                        # Tiled textures are drawn from the coarsest adequate mip level.
+                        source_img = comp.image_handle.display_image(int(screen_w), int(screen_h))
 
-                    if screen_w > 0 and screen_h > 0 and (int(screen_w) != comp._cached_screen_w or int(screen_h) != comp._cached_screen_h or comp.tk_image is None):
-                        comp._cached_screen_w = int(screen_w); comp._cached_screen_h = int(screen_h)
-                        if comp._cached_screen_w <= 0 or comp._cached_screen_h <= 0: continue
-                        
-                        source_img = comp.display_pil_image if comp.display_pil_image is not None else comp.pil_image
-                        if not source_img: continue
+                    # O(1) dirty check on size, source image and handle revision.
+                    if source_img and int(screen_w) > 0 and int(screen_h) > 0 and comp.needs_render(source_img, screen_w, screen_h):
+                        comp.mark_rendered(source_img, screen_w, screen_h)
 
                         resample_quality = Image.Resampling.NEAREST if use_fast_preview else Image.Resampling.LANCZOS
                         resized_img = source_img.resize((comp._cached_screen_w, comp._cached_screen_h), resample_quality)
                         comp.tk_image = ImageTk.PhotoImage(resized_img)
                         self.canvas.itemconfigure(comp.rect_id, image=comp.tk_image)
+                        memory_budget.track(("tk_image", comp.tag), resized_img.width * resized_img.height * 4, lambda c=comp: self._drop_tk_image(c))
+                    else:
+                        memory_budget.touch(("tk_image", comp.tag))
 
                     self.canvas.coords(comp.rect_id, sx1, sy1)
 
@@ -1099,7 +1313,7 @@ class ImageEditorApp:
             return
 
         comp = self.components.get(self.selected_component_tag)
-        if not comp or not comp.original_pil_image:
+        if not comp or comp.original_image_handle is None:
             return
 
         # Determine which entry was changed by checking which one is currently being focused
@@ -1107,7 +1321,7 @@ class ImageEditorApp:
             focused_widget = self.master.focus_get()
             if not isinstance(focused_widget, tk.Entry): return
             
-            original_w, original_h = comp.original_pil_image.size
+            original_w, original_h = comp.original_image_handle.size
             if original_w == 0 or original_h == 0: return
             aspect_ratio = original_w / original_h
 
@@ -1154,8 +1368,8 @@ class ImageEditorApp:
 
         # If the component has an image, re-apply it to trigger the resize.
         # Otherwise, redraw the placeholder rectangle.
-        if comp.pil_image:
-            comp.set_image(comp.pil_image) # This will trigger a redraw
+        if comp.image_handle:
+            comp.set_image(comp.image_handle) # This will trigger a redraw
         else:
             self.redraw_all_zoomable() # Just redraw the placeholder with new world coords
         
@@ -1226,7 +1440,7 @@ class ImageEditorApp:
                 height = comp.world_y2 - comp.world_y1
                 comp.world_x1, comp.world_y1 = target_x1, target_y1
                 comp.world_x2, comp.world_y2 = target_x1 + width, target_y1 + height
-            if comp.pil_image is None and comp.rect_id:
+            if comp.image_handle is None and comp.rect_id:
                 self.canvas.itemconfig(comp.rect_id, outline='white', width=2)
         self.redraw_all_zoomable()
 
@@ -1242,9 +1456,9 @@ class ImageEditorApp:
         
         # --- NEW: Save state for Undo ---
         comp_to_reset = self.components.get(self.selected_component_tag)
-        if comp_to_reset and comp_to_reset.pil_image:
+        if comp_to_reset and comp_to_reset.image_handle:
             undo_data = {
-                comp_to_reset.tag: comp_to_reset.pil_image.copy()
+                comp_to_reset.tag: comp_to_reset.image_handle.acquire() # Shared, not copied
             }
             self._save_undo_state(undo_data)
 
@@ -1253,9 +1467,9 @@ class ImageEditorApp:
             messagebox.showerror("Error", f"Could not find the component '{self.selected_component_tag}'.")
             return
 
-        if comp.original_pil_image:
+        if comp.original_image_handle is not None:
             # Revert the current image back to the original one
-            comp.set_image(comp.original_pil_image)
+            comp.set_image(comp.original_image_handle)
             print(f"Layer '{comp.tag}' has been reset to its original image.")
         else:
             messagebox.showinfo("No Image", f"Layer '{comp.tag}' does not have an original image to reset to.")
@@ -0,0 +1,218 @@
+from PIL import Image, ImageChops
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("[WARNING] NumPy not found. Tiled images and array blending are unavailable.")
+
+# --- Blend Modes ---
+# "over": standard source-over alpha compositing (PIL's Image.alpha_composite).
+# "over_dst_alpha": like "over", but the source alpha is first multiplied by the destination
+#     alpha so transparent parts of the underlying tile stay transparent (decal stamping).
+# "mask": plain mask-paste, `dst = dst * (1 - m) + src * m` on all four channels
+#     (PIL's Image.paste(src, box, mask)). The mask defaults to the source alpha.
+BLEND_OVER = "over"
+BLEND_OVER_DST_ALPHA = "over_dst_alpha"
+BLEND_MASK = "mask"
+
+_INV_255 = 1.0 / 255.0
+
+
+def _store(dst, values):
+    """Writes float results into `dst`, rounding and clamping when `dst` is an integer array."""
+    if dst.dtype == np.uint8:
+        np.add(values, 0.5, out=values)
+        np.clip(values, 0, 255, out=values)
+    np.copyto(dst, values, casting='unsafe')
+
+
+def blend_over(dst, src, respect_dst_alpha=False):
+    """
+    Composites `src` over `dst` in place. Both are HxWx4 RGBA arrays (uint8 or float32 in the
+    0-255 range) of the same shape; `dst` may be a view into a larger array.
+    Where the effective source alpha is zero the destination is left untouched, matching PIL.
+    """
+    s = src.astype(np.float32, copy=False)
+    d = dst.astype(np.float32, copy=False)
+
+    dst_a = d[..., 3:4] * _INV_255
+    if respect_dst_alpha:
+        # Quantize the combined alpha the way ImageChops.multiply does (truncating a*b/255),
+        # otherwise near-zero alphas over near-transparent pixels would bleed colour.
+        src_a = np.floor(s[..., 3:4] * d[..., 3:4] / 255.0) * _INV_255
+    else:
+        src_a = s[..., 3:4] * _INV_255
+
+    dst_weight = dst_a * (1.0 - src_a)
+    out_a = src_a + dst_weight
+    rgb = s[..., :3] * src_a
+    rgb += d[..., :3] * dst_weight
+
+    out_rgb = d[..., :3].copy()
+    np.divide(rgb, out_a, out=out_rgb, where=src_a > 0)
+    out_a *= 255.0
+    np.copyto(out_a, d[..., 3:4], where=src_a <= 0)
+
+    _store(dst[..., :3], out_rgb)
+    _store(dst[..., 3:4], out_a)
+    return dst
+
+
+def paste_masked(dst, src, mask=None):
+    """
+    Pastes `src` onto `dst` in place through `mask` (HxW or HxWx1, 0-255). When no mask is
+    given the source's own alpha channel is used, like `Image.paste(src, box, src)`.
+    """
+    s = src.astype(np.float32, copy=False)
+    d = dst.astype(np.float32, copy=False)
+    if mask is None:
+        m = s[..., 3:4] * _INV_255
+    else:
+        m = mask.astype(np.float32, copy=False) * _INV_255
+        if m.ndim == 2:
+            m = m[..., None]
+
+    out = s - d
+    out *= m
+    out += d
+    _store(dst, out)
+    return dst
+
+
+def blend_arrays(dst, src, mode=BLEND_OVER, mask=None):
+    """Dispatches to the kernel for `mode`. `dst` is modified in place and returned."""
+    if mode == BLEND_OVER:
+        return blend_over(dst, src)
+    if mode == BLEND_OVER_DST_ALPHA:
+        return blend_over(dst, src, respect_dst_alpha=True)
+    if mode == BLEND_MASK:
+        return paste_masked(dst, src, mask)
+    raise ValueError(f"Unknown blend mode: {mode}")
+
+
+def clip_box(dst_w, dst_h, src_w, src_h, x, y):
+    """
+    Clips a (src_w x src_h) patch placed at (x, y) to a (dst_w x dst_h) destination.
+    Returns (dst_box, src_box) as (x1, y1, x2, y2) tuples, or None if they don't overlap.
+    """
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(dst_w, x + src_w), min(dst_h, y + src_h)
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return (x1, y1, x2, y2), (x1 - x, y1 - y, x2 - x, y2 - y)
+
+
+def composite_array_patch(dst, src, x, y, mode=BLEND_OVER):
+    """
+    Blends the `src` array into the `dst` array at (x, y), clipping to bounds.
+    Only views of the overlapping rectangle are touched; nothing is copied up front.
+    Returns True if any pixels were covered.
+    """
+    boxes = clip_box(dst.shape[1], dst.shape[0], src.shape[1], src.shape[0], x, y)
+    if boxes is None:
+        return False
+    (dx1, dy1, dx2, dy2), (sx1, sy1, sx2, sy2) = boxes
+    blend_arrays(dst[dy1:dy2, dx1:dx2], src[sy1:sy2, sx1:sx2], mode)
+    return True
+
+
+def composite_patch(image, patch, x, y, mode=BLEND_OVER):
+    """
+    Blends the RGBA `patch` image into the RGBA `image` at (x, y), modifying `image` in place.
+    Only the intersection rectangle is read and written. Returns True if any pixels were covered.
+
+    PIL images don't expose a writable pixel buffer, so an array kernel would have to copy the
+    region out and back in; PIL's own C routines on the region are faster for that (see the
+    benchmarks below). The array kernels are used where the pixels already live in arrays
+    (`composite_array_patch`, `TiledImage.composite_patch`).
+    """
+    boxes = clip_box(image.width, image.height, patch.width, patch.height, x, y)
+    if boxes is None:
+        return False
+    dst_box, src_box = boxes
+    if src_box != (0, 0, patch.width, patch.height):
+        patch = patch.crop(src_box)
+
+    if mode == BLEND_MASK:
+        image.paste(patch, dst_box[:2], patch)
+        return True
+    if mode not in (BLEND_OVER, BLEND_OVER_DST_ALPHA):
+        raise ValueError(f"Unknown blend mode: {mode}")
+    region = image.crop(dst_box)
+    if mode == BLEND_OVER_DST_ALPHA:
+        patch = patch.copy()
+        patch.putalpha(ImageChops.multiply(patch.getchannel('A'), region.getchannel('A')))
+    image.paste(Image.alpha_composite(region, patch), dst_box[:2])
+    return True
+
+
+# --- Micro-benchmarks ---
+# Run `python uc_blend.py` to compare each path against the code it replaced:
+#   stamping      - the original full-size decal layer chain vs `composite_patch`'s region chain
+#   array kernels - `composite_patch` on a PIL image vs the kernels on views of a tile array,
+#                   which is what tiled textures and export workers hold
+if __name__ == "__main__":
+    import timeit
+
+    if not NUMPY_AVAILABLE:
+        raise SystemExit("NumPy is required to run the blending benchmarks.")
+
+    rng = np.random.default_rng(0)
+    tile = Image.fromarray(rng.integers(0, 256, (1024, 1024, 4), dtype=np.uint8), "RGBA")
+    decal = Image.fromarray(rng.integers(0, 256, (128, 128, 4), dtype=np.uint8), "RGBA")
+    paste_x, paste_y = 300, 400
+    offsets = range(0, 512, 64)
+
+    def pil_full_size_chain():
+        """The original stamping chain: full-size decal layer, multiply, alpha_composite."""
+        final_image = tile.copy()
+        decal_layer = Image.new("RGBA", final_image.size, (0, 0, 0, 0))
+        decal_layer.paste(decal, (paste_x, paste_y))
+        decal_layer.putalpha(ImageChops.multiply(decal_layer.getchannel('A'), final_image.getchannel('A')))
+        return Image.alpha_composite(final_image, decal_layer)
+
+    def pil_stamp():
+        final_image = tile.copy()
+        composite_patch(final_image, decal, paste_x, paste_y, BLEND_OVER_DST_ALPHA)
+        return final_image
+
+    tile_array = np.array(tile)
+    decal_array = np.asarray(decal)
+
+    def array_stamp():
+        canvas = tile_array.copy()
+        composite_array_patch(canvas, decal_array, paste_x, paste_y, BLEND_OVER_DST_ALPHA)
+        return canvas
+
+    def pil_borders():
+        final_image = tile.copy()
+        for offset in offsets:
+            composite_patch(final_image, decal, offset, offset, BLEND_MASK)
+        return final_image
+
+    def array_borders():
+        canvas = tile_array.copy()
+        for offset in offsets:
+            composite_array_patch(canvas, decal_array, offset, offset, BLEND_MASK)
+        return canvas
+
+    # Sanity check: both paths agree with the original chain to within rounding.
+    reference = np.asarray(pil_full_size_chain()).astype(np.int16)
+    for name, func in (("region chain", pil_stamp), ("array kernel", array_stamp)):
+        print(f"Max abs difference vs full-size chain (stamp, {name}): {np.abs(reference - np.asarray(func()).astype(np.int16)).max()}")
+    reference = np.asarray(pil_borders()).astype(np.int16)
+    print(f"Max abs difference (8 borders, array kernel vs PIL paste): {np.abs(reference - array_borders().astype(np.int16)).max()}")
+
+    benchmarks = [
+        ("Stamp: original full-size chain", pil_full_size_chain),
+        ("Stamp: composite_patch (region chain)", pil_stamp),
+        ("Stamp: array kernel on a tile view", array_stamp),
+        ("8 borders: composite_patch (PIL paste)", pil_borders),
+        ("8 borders: array kernel on tile views", array_borders),
+    ]
+    for name, func in benchmarks:
+        runs = 20
+        seconds = min(timeit.repeat(func, number=runs, repeat=3)) / runs
+        print(f"{name:<42} {seconds * 1000:8.3f} ms")
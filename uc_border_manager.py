@@ -12,6 +12,8 @@ except ImportError:
     
 from uc_border_manager2 import SmartBorderManager
 from uc_component import DraggableComponent
+from uc_image_cache import load_image
+from uc_layout import parse_border_file, render_point_border
 
 class BorderManager:
     """Manages tracing, creating, and applying borders to the canvas."""
@@ -56,7 +58,7 @@ class BorderManager:
         try:
             brick_path = os.path.join(self.app.image_base_dir, "brick.png")
             if os.path.exists(brick_path):
-                self.border_textures["Brick"] = Image.open(brick_path).convert("RGBA")
+                self.border_textures["Brick"] = load_image(brick_path).image
                 print("Loaded 'Brick' border texture.")
             # Add more textures here, e.g., "stone.png" # type: ignore
         except Exception as e:
@@ -148,21 +150,11 @@ class BorderManager:
                 print(f"[WARNING] Skipping preset points for non-existent tile '{tile_tag}'.")
                 continue
 
-            # Find bounding box of points to determine image size
-            if not points: continue
-            min_x = min(p[0] for p in points)
-            min_y = min(p[1] for p in points)
-            max_x = max(p[0] for p in points)
-            max_y = max(p[1] for p in points)
-            
-            width = int(max_x - min_x) + 1
-            height = int(max_y - min_y) + 1
-
-            # Create an image and draw the points relative to its top-left
-            border_img = Image.new("RGBA", (width, height), (0,0,0,0))
-            draw = ImageDraw.Draw(border_img)
-            for p_x, p_y in points:
-                draw.point((p_x - min_x, p_y - min_y), fill=(0, 255, 255, 255)) # Cyan color
+            # Draw the points into an image cropped to their bounding box
+            rendered = render_point_border(points)
+            if not rendered: continue
+            border_img, min_x, min_y = rendered
+            width, height = border_img.size
 
             # Create the DraggableComponent
             new_border_tag = f"preset_{pretty_name.replace(' ','')}_{tile_tag}_{self.next_border_id}"
@@ -256,30 +248,8 @@ class BorderManager:
         pass
 
     def _parse_border_file(self, filepath: str) -> dict:
-        """Parses a .txt file and returns a dictionary of {tile_tag: [(x,y), ...]}.
-        
-        Expected format:
-        humanuitile01
-        293,164
-        294,164
-        humanuitile02
-        123,123
-        """
-        points_by_tile = {}
-        current_tile_tag = None
-        with open(filepath, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line: continue
-                if ',' in line: # It's a coordinate
-                    if current_tile_tag:
-                        x_str, y_str = line.split(',')
-                        points_by_tile[current_tile_tag].append((int(x_str), int(y_str)))
-                else: # It's a tile tag
-                    current_tile_tag = line
-                    if current_tile_tag not in points_by_tile:
-                        points_by_tile[current_tile_tag] = []
-        return points_by_tile
+        """Parses a .txt file and returns a dictionary of {tile_tag: [(x,y), ...]}."""
+        return parse_border_file(filepath)
 
     # --- NEW: Smart Border Tool Methods ---
 
@@ -389,14 +359,14 @@ class BorderManager:
             new_tag
         )
         new_comp.is_decal = True
-        new_comp.original_pil_image = original_border_comp.original_pil_image.copy()
+        new_comp.original_pil_image = original_border_comp.original_image_handle # Shared, copy-on-write
         new_comp.image_path = original_border_comp.image_path
         new_comp.parent_tag = original_border_comp.parent_tag # Ensure parent tag is carried over
 
         # 4. Add the new component to the application and draw it.
         self.app.components[new_tag] = new_comp
         self.app._bind_component_events(new_tag)
-        new_comp.set_image(new_comp.original_pil_image) # This will handle the initial draw
+        new_comp.set_image(new_comp.original_image_handle) # This will handle the initial draw
 
         # --- NEW: Save the action for the undo stack ---
         self.app._save_undo_state({'type': 'add_component', 'tag': new_tag})
@@ -540,7 +510,7 @@ class BorderManager:
             return
 
         try:
-            border_image = Image.open(image_path).convert("RGBA")
+            border_image = load_image(image_path) # Cached, shared handle
             border_tag = os.path.splitext(os.path.basename(image_path))[0]
             rel_x, rel_y = relative_coords
 
@@ -551,7 +521,7 @@ class BorderManager:
             new_border_comp.is_decal = True
             new_border_comp.relative_x, new_border_comp.relative_y = rel_x, rel_y # Apply the saved relative coords
             new_border_comp.parent_tag = parent_tag # NEW: Restore the parent tag
-            new_border_comp.original_pil_image = border_image.copy()
+            new_border_comp.original_pil_image = border_image
             new_border_comp.image_path = image_path # Store the path for re-saving
 
             # --- FIX: Update the next_border_id to avoid name collisions ---
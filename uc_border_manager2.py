@@ -82,7 +82,7 @@ class SmartBorderManager:
 
             tile_components = [
                 c for c in self.app.components.values() 
-                if c.original_pil_image and not c.is_decal and not c.is_dock_asset
+                if c.original_image_handle is not None and not c.is_decal and not c.is_dock_asset
             ]
             if not tile_components:
                 messagebox.showwarning("No Images", "No image tiles found to analyze.")
@@ -500,25 +500,18 @@ class SmartBorderManager:
         self.cursor_window.show()
 
     def _redraw_cursor_image_style(self):
-        """Generates the PIL image for the cursor and updates the cursor window."""
+        """Selects the cached cursor sprite for the current brush and updates the cursor window."""
         radius = self.smart_brush_radius.get()
-        size = (radius * 2) + 4
-        offset = size // 2
-
-        # 1. Create a new PIL image for the cursor.
-        cursor_pil_image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(cursor_pil_image)
         color = "red" if self.is_erasing_points.get() else "cyan"
-        draw.ellipse((offset - radius, offset - radius, offset + radius, offset + radius), outline=color, width=2)
 
-        # 2. Update the cursor window with the new image.
-        self.cursor_window.set_image(cursor_pil_image)
+        # 1. Fetch (or build once) the ring sprite for this radius and color.
+        offset = self.cursor_window.set_sprite(radius, color, mode="ring")
 
-        # 3. Immediately update its position to the current mouse location.
+        # 2. Immediately update its position to the current mouse location.
         # This prevents the cursor from appearing at (0,0) or an old position.
         root_x = self.app.master.winfo_pointerx()
         root_y = self.app.master.winfo_pointery()
-        self.cursor_window.move(root_x - offset, root_y - offset)
+        self.cursor_window.move(root_x - offset, root_y - offset, immediate=True)
 
     def _update_canvas_brush_position(self, event):
         """Moves the custom cursor window to follow the mouse."""
@@ -533,6 +526,7 @@ class SmartBorderManager:
 
         radius = self.smart_brush_radius.get()
         offset = radius + 2 # Half of the image size ((radius*2)+4)/2
+        # The cursor window coalesces these requests to one geometry call per frame.
         self.cursor_window.move(root_x - offset, root_y - offset)
 
     def _update_canvas_brush_color(self):
@@ -682,7 +676,7 @@ class SmartBorderManager:
             self.app, border_tag, min_x, min_y, max_x, max_y, "green", border_tag
         )
         new_border_comp.is_decal = True # Treat it like a decal for dragging/stamping
-        new_border_comp.original_pil_image = border_image.copy()
+        new_border_comp.original_pil_image = border_image
         
         # --- NEW: 5. Save the border image to a file for persistence ---
         os.makedirs(self.app.saved_borders_dir, exist_ok=True)
@@ -735,7 +729,7 @@ class SmartBorderManager:
         # 6. Add the new component to the application and bind its events.
         self.app.components[border_tag] = new_border_comp
         self.app._bind_component_events(border_tag)
-        new_border_comp.set_image(border_image) # This will handle the initial draw
+        new_border_comp.set_image(new_border_comp.original_image_handle) # Shares the original; this will handle the initial draw
 
         # 7. Clear the detected points and deactivate the tool.
         self.clear_detected_points()
@@ -1,6 +1,8 @@
 from PIL import Image, ImageTk
 import os
 
+from uc_image_handle import ImageHandle
+
 class DraggableComponent:
     """
     A data class to represent the state of a draggable element.
@@ -13,10 +15,12 @@ class DraggableComponent:
         self.last_y = 0
         self.tk_image = None # Reference to the PhotoImage object
         self.preview_pil_image = None # For dock previews
-        self.pil_image = None # Reference to the PIL Image object
+        # --- NEW: Images are held through shared, copy-on-write handles ---
+        # `pil_image` and `original_pil_image` are properties that read through these handles.
+        self.image_handle = None # Backs pil_image, the PIL Image object
+        self.original_image_handle = None # Backs original_pil_image, the pristine image
         self.display_pil_image = None # For temporary on-canvas display (e.g., transparent decal)
         self.border_pil_image = None # For storing the border image
-        self.original_pil_image = None # For storing the pristine decal image
         self.image_path = None # NEW: To store the original file path for saving/reloading
         self.rect_id = None
         self.text_id = None
@@ -26,6 +30,11 @@ class DraggableComponent:
         self.is_dock_asset = is_dock_asset
         self.parent_tag = None # To link components, e.g., a border to its tile
 
+        # --- NEW: Re-editable filter stack (see FilterManager) ---
+        self.filter_params = None # The parameters the current image was filtered with
+        self.filter_base_handle = None # The unfiltered image the stack is applied to
+        self.filter_result_revision = None # Image revision produced by the last filter commit
+
         # --- NEW: For accurate border positioning ---
         self.relative_x = 0
         self.relative_y = 0
@@ -40,26 +49,105 @@ class DraggableComponent:
         # Caching for Performance
         self._cached_screen_w = -1
         self._cached_screen_h = -1
+        self._drawn_source = None # The image the current tk_image was rendered from
+        self._drawn_revision = None # ...and its handle revision, for O(1) dirty checks
+
+    # --- Copy-on-write image access ---
+    @property
+    def pil_image(self):
+        """The component's current PIL image. Treat it as read-only; see `writable_image`."""
+        return self.image_handle.image if self.image_handle else None
+
+    @pil_image.setter
+    def pil_image(self, image_or_handle):
+        self._swap_handle('image_handle', image_or_handle)
+
+    @property
+    def original_pil_image(self):
+        """The pristine image the component was loaded with. Treat it as read-only."""
+        return self.original_image_handle.image if self.original_image_handle else None
+
+    @original_pil_image.setter
+    def original_pil_image(self, image_or_handle):
+        self._swap_handle('original_image_handle', image_or_handle)
+
+    def _swap_handle(self, attr_name, image_or_handle):
+        """Points `attr_name` at a (possibly shared) handle, updating reference counts. Never copies pixels."""
+        new_handle = ImageHandle.wrap(image_or_handle)
+        old_handle = getattr(self, attr_name)
+        if new_handle is old_handle:
+            return
+        if new_handle:
+            new_handle.acquire()
+        if old_handle:
+            old_handle.release()
+        setattr(self, attr_name, new_handle)
 
-    def set_image(self, pil_image):
-        """Sets the internal PIL image for this component."""
+    def release_images(self):
+        """Drops this component's image, original and filter-base handles (when it is removed from the canvas)."""
+        self._swap_handle('image_handle', None)
+        self._swap_handle('original_image_handle', None)
+        self.release_filter_base()
+        self.tk_image = None
+        self.display_pil_image = None
+
+    def release_filter_base(self):
+        if self.filter_base_handle:
+            self.filter_base_handle.release()
+        self.filter_base_handle = None
+        self.filter_result_revision = None
+
+    @property
+    def image_revision(self):
+        """Revision of the current image handle, or None. Changes whenever the pixels change."""
+        return self.image_handle.revision if self.image_handle else None
+
+    def needs_render(self, source_img, screen_w, screen_h):
+        """O(1) dirty check: True if the cached tk_image doesn't match this source image, revision and size."""
+        return (self.tk_image is None
+                or int(screen_w) != self._cached_screen_w or int(screen_h) != self._cached_screen_h
+                or source_img is not self._drawn_source or self.image_revision != self._drawn_revision)
+
+    def mark_rendered(self, source_img, screen_w, screen_h):
+        self._cached_screen_w, self._cached_screen_h = int(screen_w), int(screen_h)
+        self._drawn_source = source_img
+        self._drawn_revision = self.image_revision
+
+    def writable_image(self):
+        """
+        Returns a PIL image that may be modified in place and becomes the component's image.
+        The pixels are only copied if the current image is shared (e.g. with the undo stack).
+        Callers must call `set_image(self.image_handle)` afterwards to refresh the display.
+        """
+        if not self.image_handle:
+            return None
+        handle, image = self.image_handle.writable_image()
+        self._swap_handle('image_handle', handle)
+        return image
+
+    def set_image(self, pil_image, redraw=True):
+        """
+        Sets the internal image for this component. Accepts a PIL image (ownership is taken,
+        no copy is made) or an ImageHandle (shared, no copy is made).
+        Pass `redraw=False` when setting many images at once and redraw once afterwards.
+        """
         print("-" * 20)
         print(f"[DEBUG] Setting image for '{self.tag}'.")
-        self.pil_image = pil_image.copy() if pil_image else None
+        self._swap_handle('image_handle', pil_image)
 
         # If this is the first time an image is set, replace the placeholder
-        if self.pil_image and self.text_id:
+        if self.image_handle and self.text_id:
             self.app.canvas.delete(self.rect_id)
             self.app.canvas.delete(self.text_id)
             self.rect_id = None
             self.text_id = None
             self.tk_image = None # Force redraw to create a new image item
 
-        # --- DEFINITIVE FIX: Reset the cache to force a visual update ---
-        # This ensures that even if the component's size hasn't changed, the new image data will be rendered.
-        self._cached_screen_w, self._cached_screen_h = -1, -1
+        # The draw loop compares image revisions (see `needs_render`), so a new image is
+        # re-rendered even if the component's size hasn't changed; no cache reset is needed.
 
         # The manager that calls this method is responsible for redrawing.
-        self.app.redraw_all_zoomable()
+        if redraw:
+            self.app.redraw_all_zoomable()
         print(f"[DEBUG] AFTER image set: World Coords=({int(self.world_x1)}, {int(self.world_y1)})")
-        print("-" * 20)
\ No newline at end of file
+        print("-" * 20)
@@ -1,5 +1,5 @@
 import tkinter as tk
-from PIL import ImageTk
+from PIL import Image, ImageDraw, ImageTk
 
 try:
     import win32gui
@@ -15,6 +15,9 @@ class CursorWindow:
     Manages a transparent, click-through, top-level window to act as a custom cursor.
     This is significantly more performant than drawing and moving a cursor on the main canvas.
     """
+    # Position updates are coalesced to at most one geometry call per display frame (~60 Hz).
+    FRAME_INTERVAL_MS = 16
+
     def __init__(self, master):
         self.master = master
         self.window = tk.Toplevel(master)
@@ -52,6 +55,15 @@ class CursorWindow:
         self.canvas.pack(fill="both", expand=True)
         self.image_id = self.canvas.create_image(0, 0, anchor=tk.NW) 
         self.tk_image = None
+
+        # --- NEW: Sprite cache and motion coalescing state ---
+        # Sprites are keyed by (radius, color, mode) and hold (pil_image, tk_image) pairs,
+        # so toggling erase mode or dragging the brush size slider back and forth reuses them.
+        self._sprite_cache = {}
+        self._current_sprite_key = None
+        self._pending_position = None # Latest requested (x, y); older requests are dropped
+        self._applied_position = None # Last position actually sent to the window manager
+        self._move_job = None
         
         # 3. CRITICAL CLICK-THROUGH FIX: Bindings to stop the Canvas/Window from capturing mouse events.
         # This is primarily for non-Windows platforms or as a fallback.
@@ -110,37 +122,117 @@ class CursorWindow:
         except Exception as e:
             print(f"[ERROR] Could not set click-through property on cursor window: {e}")
 
+    def _build_sprite(self, radius, color, mode):
+        """Renders the PIL image for a brush sprite. Only called on a cache miss."""
+        size = (radius * 2) + 4
+        offset = size // 2
+        sprite = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(sprite)
+        if mode == "dot":
+            draw.ellipse((offset - radius, offset - radius, offset + radius, offset + radius), fill=color)
+        else: # "ring" is the default brush outline
+            draw.ellipse((offset - radius, offset - radius, offset + radius, offset + radius), outline=color, width=2)
+        return sprite
+
+    def set_sprite(self, radius, color, mode="ring"):
+        """
+        Displays a cached brush sprite, building it only the first time a given
+        (radius, color, mode) combination is requested.
+        Returns the sprite's half-size, i.e. the offset from its top-left corner to its center.
+        """
+        key = (int(radius), color, mode)
+        sprite = self._sprite_cache.get(key)
+        if sprite is None:
+            pil_image = self._build_sprite(key[0], color, mode)
+            sprite = (pil_image, ImageTk.PhotoImage(pil_image))
+            self._sprite_cache[key] = sprite
+
+        pil_image, tk_image = sprite
+        if key != self._current_sprite_key:
+            self._current_sprite_key = key
+            self._display(pil_image, tk_image)
+        return pil_image.width // 2
+
     def set_image(self, pil_image):
         """Updates the image displayed in the cursor window."""
+        self._current_sprite_key = None # An arbitrary image is not a cached sprite
         if pil_image:
-            self.tk_image = ImageTk.PhotoImage(pil_image)
-            
-            w, h = pil_image.width, pil_image.height
-            
-            # 1. Resize the Toplevel window to match the image size
-            self.window.geometry(f"{w}x{h}+{self.window.winfo_x()}+{self.window.winfo_y()}")
-
-            # 2. Update and center the image on the Canvas
-            # We no longer need to check/change state since we removed state='disabled'
-            self.canvas.config(width=w, height=h) # Also resize the canvas
-            self.canvas.coords(self.image_id, w // 2, h // 2)
-            self.canvas.itemconfig(self.image_id, image=self.tk_image, anchor=tk.CENTER, state='normal')
+            self._display(pil_image, ImageTk.PhotoImage(pil_image))
         else:
             self.canvas.itemconfig(self.image_id, state='hidden')
             self.tk_image = None
 
-    def move(self, x, y):
-        """Moves the top-left corner of the cursor window to the specified screen coordinates."""
-        self.window.geometry(f"+{x}+{y}")
+    def _display(self, pil_image, tk_image):
+        """Shows the given image, resizing the window and canvas to fit it."""
+        self.tk_image = tk_image
+        
+        w, h = pil_image.width, pil_image.height
+        
+        # 1. Resize the Toplevel window to match the image size
+        self.window.geometry(f"{w}x{h}+{self.window.winfo_x()}+{self.window.winfo_y()}")
+        self._applied_position = None # Placed outside `_flush_move`, so the next move must not be skipped
+
+        # 2. Update and center the image on the Canvas
+        # We no longer need to check/change state since we removed state='disabled'
+        self.canvas.config(width=w, height=h) # Also resize the canvas
+        self.canvas.coords(self.image_id, w // 2, h // 2)
+        self.canvas.itemconfig(self.image_id, image=self.tk_image, anchor=tk.CENTER, state='normal')
+
+    def move(self, x, y, immediate=False):
+        """
+        Requests a move of the cursor window's top-left corner to the given screen coordinates.
+        Requests are coalesced: only the latest position is applied, at most once per frame.
+        Pass `immediate=True` to apply the position right away (e.g. when the sprite changes).
+        """
+        self._pending_position = (int(x), int(y))
+        if immediate:
+            self._cancel_move_job()
+            self._flush_move()
+        elif self._move_job is None:
+            self._move_job = self.window.after(self.FRAME_INTERVAL_MS, self._on_frame)
+
+    def _on_frame(self):
+        """Timer callback that applies the position accumulated during the last frame."""
+        self._move_job = None
+        self._flush_move()
+
+    def _flush_move(self):
+        """Applies the most recent pending position, skipping redundant geometry calls."""
+        position = self._pending_position
+        self._pending_position = None
+        if position is None or position == self._applied_position:
+            return
+        if not self.window.winfo_exists():
+            return
+        self.window.geometry(f"+{position[0]}+{position[1]}")
+        self._applied_position = position
+
+    def _cancel_move_job(self):
+        """Cancels the scheduled frame callback, if any."""
+        if self._move_job is not None:
+            try:
+                self.window.after_cancel(self._move_job)
+            except tk.TclError:
+                pass
+            self._move_job = None
+
+    def _cancel_pending_move(self):
+        """Drops any queued position update."""
+        self._cancel_move_job()
+        self._pending_position = None
 
     def show(self):
         """Makes the cursor window visible."""
         self.window.deiconify()
+        self._applied_position = None # The window manager may have placed it anywhere
 
     def hide(self):
         """Hides the cursor window."""
+        self._cancel_pending_move()
         self.window.withdraw()
 
     def destroy(self):
         """Destroys the cursor window."""
-        self.window.destroy()
\ No newline at end of file
+        self._cancel_pending_move()
+        self._sprite_cache.clear()
+        self.window.destroy()
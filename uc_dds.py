@@ -0,0 +1,322 @@
+import math
+import os
+import struct
+import threading
+
+from PIL import Image
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("[WARNING] NumPy not found. The built-in DDS encoder is disabled; DDS export needs an external converter.")
+
+# --- BC3 (DXT5) Block Layout ---
+# Every 4x4 pixel block is 16 bytes:
+#   alpha0 (1) | alpha1 (1) | 16 x 3-bit alpha indices (6) | color0 565 (2) | color1 565 (2) | 16 x 2-bit color indices (4)
+# Alpha uses the 8-value mode (alpha0 > alpha1); colour always uses the 4-colour mode, so
+# color0 is kept strictly greater than color1 for decoders that still check the order.
+MODE_FAST = "fast"  # Bounding-box endpoints, inset slightly
+MODE_HQ = "hq"      # Principal-axis endpoints refined by least squares, best candidate per block
+MIP_BOX = "box"
+MIP_LANCZOS = "lanczos"
+
+BLOCK_BYTES = 16
+CHUNK_BLOCKS = 32768 # Blocks encoded per vectorized pass; bounds temporary memory
+
+# --- DDS Header ---
+DDS_MAGIC = b"DDS "
+DDSD_CAPS, DDSD_HEIGHT, DDSD_WIDTH, DDSD_PIXELFORMAT = 0x1, 0x2, 0x4, 0x1000
+DDSD_MIPMAPCOUNT, DDSD_LINEARSIZE = 0x20000, 0x80000
+DDPF_FOURCC = 0x4
+DDSCAPS_COMPLEX, DDSCAPS_TEXTURE, DDSCAPS_MIPMAP = 0x8, 0x1000, 0x400000
+HEADER_STRUCT = struct.Struct("<7I44x8I4I4x") # DDS_HEADER (124 bytes) including its DDS_PIXELFORMAT
+
+# Colour index -> weight of color0 in the 4-colour palette, and alpha index -> weight of alpha0.
+_COLOR_WEIGHTS = (1.0, 0.0, 2.0 / 3.0, 1.0 / 3.0)
+_ALPHA_WEIGHTS = (1.0, 0.0, 6 / 7, 5 / 7, 4 / 7, 3 / 7, 2 / 7, 1 / 7)
+
+
+# --- Blocks ---
+def _to_blocks(pixels):
+    """Pads an HxWx4 array to whole blocks (repeating edges) and returns (N, 16, 4) blocks in raster order."""
+    h, w = pixels.shape[:2]
+    pad_h, pad_w = (-h) % 4, (-w) % 4
+    if pad_h or pad_w:
+        pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+    bh, bw = pixels.shape[0] // 4, pixels.shape[1] // 4
+    return pixels.reshape(bh, 4, bw, 4, 4).transpose(0, 2, 1, 3, 4).reshape(bh * bw, 16, 4)
+
+
+def _from_blocks(blocks, width, height):
+    """Inverse of `_to_blocks`: assembles (N, 16, 4) blocks into an HxWx4 array cropped to size."""
+    bh, bw = math.ceil(height / 4), math.ceil(width / 4)
+    pixels = blocks.reshape(bh, bw, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(bh * 4, bw * 4, 4)
+    return pixels[:height, :width]
+
+
+# --- Colour Endpoints ---
+def _quantize_565(colors):
+    """Rounds float RGB (..., 3) to 5:6:5 and returns (packed uint16, expanded float RGB as the decoder sees it)."""
+    r = np.clip(np.rint(colors[..., 0] * (31 / 255)), 0, 31).astype(np.uint16)
+    g = np.clip(np.rint(colors[..., 1] * (63 / 255)), 0, 63).astype(np.uint16)
+    b = np.clip(np.rint(colors[..., 2] * (31 / 255)), 0, 31).astype(np.uint16)
+    packed = (r << 11) | (g << 5) | b
+    return packed, _expand_565(packed)
+
+
+def _expand_565(packed):
+    packed = packed.astype(np.uint32)
+    r, g, b = (packed >> 11) & 31, (packed >> 5) & 63, packed & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float32)
+
+
+def _color_palette(c0, c1):
+    """(N, 3) endpoints -> (N, 4, 3) 4-colour palette (the decoder's interpolation)."""
+    return np.stack([c0, c1, (2 * c0 + c1) / 3, (c0 + 2 * c1) / 3], axis=1)
+
+
+def _fit_colors(rgb, c0, c1):
+    """Quantizes endpoints and picks the nearest palette entry per pixel. Returns (packed0, packed1, indices, error)."""
+    p0, q0 = _quantize_565(c0)
+    p1, q1 = _quantize_565(c1)
+    palette = _color_palette(q0, q1)
+    dist = ((rgb[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=-1) # (N, 16, 4)
+    indices = dist.argmin(axis=-1).astype(np.uint8)
+    error = np.take_along_axis(dist, indices[..., None].astype(np.intp), axis=-1)[..., 0].sum(axis=1)
+    return p0, p1, indices, error
+
+
+def _least_squares_endpoints(values, indices, weight_table):
+    """
+    Solves for the two endpoints that best reproduce `values` (N, 16, C) given fixed palette
+    `indices`, i.e. min ||w*e0 + (1-w)*e1 - x||^2 per block. Degenerate blocks return None rows (NaN).
+    """
+    w = np.asarray(weight_table, dtype=np.float32)[indices] # (N, 16)
+    v = 1.0 - w
+    ww, vv, wv = (w * w).sum(1), (v * v).sum(1), (w * v).sum(1)
+    wx = (w[..., None] * values).sum(1)
+    vx = (v[..., None] * values).sum(1)
+    det = ww * vv - wv * wv
+    with np.errstate(divide="ignore", invalid="ignore"):
+        e0 = (vv[:, None] * wx - wv[:, None] * vx) / det[:, None]
+        e1 = (ww[:, None] * vx - wv[:, None] * wx) / det[:, None]
+    bad = np.abs(det) < 1e-6
+    e0[bad] = np.nan
+    e1[bad] = np.nan
+    return np.clip(e0, 0, 255), np.clip(e1, 0, 255)
+
+
+def _select(mask, candidate, current):
+    """Per block, takes each field of the `candidate` fit where `mask` is set, otherwise `current`."""
+    return tuple(np.where(mask.reshape(-1, *([1] * (c.ndim - 1))), a, c) for a, c in zip(candidate, current))
+
+
+def _principal_endpoints(rgb):
+    """Endpoints at the extreme projections of each block onto its principal colour axis."""
+    mean = rgb.mean(axis=1)
+    centered = rgb - mean[:, None, :]
+    cov = np.einsum("nki,nkj->nij", centered, centered)
+    axis = rgb.max(axis=1) - rgb.min(axis=1) + 1e-3 # Start the power iteration from the bounding-box diagonal
+    for _ in range(6):
+        axis = np.einsum("nij,nj->ni", cov, axis)
+        axis /= np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-9)
+    proj = np.einsum("nki,ni->nk", centered, axis)
+    c0 = mean + axis * proj.max(axis=1, keepdims=True)
+    c1 = mean + axis * proj.min(axis=1, keepdims=True)
+    return np.clip(c0, 0, 255), np.clip(c1, 0, 255)
+
+
+def _encode_colors(rgb, mode):
+    """Returns (packed0, packed1, indices) for (N, 16, 3) float RGB blocks."""
+    lo, hi = rgb.min(axis=1), rgb.max(axis=1)
+    inset = (hi - lo) / 16.0 # Pulls endpoints in slightly, as in the usual real-time DXT encoders
+    c0, c1 = hi - inset, lo + inset
+    best = _fit_colors(rgb, c0, c1)
+    if mode == MODE_HQ:
+        # Try the principal axis, then refine whichever fits better; keep the best result per block.
+        pc0, pc1 = _principal_endpoints(rgb)
+        candidate = _fit_colors(rgb, pc0, pc1)
+        better = candidate[3] < best[3]
+        best = _select(better, candidate, best)
+        c0, c1 = np.where(better[:, None], pc0, c0), np.where(better[:, None], pc1, c1)
+        for _ in range(2):
+            r0, r1 = _least_squares_endpoints(rgb, best[2], _COLOR_WEIGHTS)
+            valid = ~np.isnan(r0[:, 0])
+            r0[~valid], r1[~valid] = c0[~valid], c1[~valid]
+            candidate = _fit_colors(rgb, r0, r1)
+            better = candidate[3] < best[3]
+            best = _select(better, candidate, best)
+            c0, c1 = np.where(better[:, None], r0, c0), np.where(better[:, None], r1, c1)
+    p0, p1, indices = best[0], best[1], best[2]
+
+    # Keep color0 > color1 (4-colour mode); swapping endpoints swaps indices 0<->1 and 2<->3.
+    swap = p0 < p1
+    p0, p1 = np.where(swap, p1, p0), np.where(swap, p0, p1)
+    indices = np.where(swap[:, None], indices ^ 1, indices)
+    indices[p0 == p1] = 0
+    return p0, p1, indices
+
+
+# --- Alpha Endpoints ---
+def _alpha_palette(a0, a1):
+    weights = np.asarray(_ALPHA_WEIGHTS, dtype=np.float32)
+    return np.floor(a0[:, None] * weights + a1[:, None] * (1 - weights) + 0.5)
+
+
+def _fit_alpha(alpha, a0, a1):
+    a0, a1 = np.clip(np.rint(a0), 0, 255), np.clip(np.rint(a1), 0, 255)
+    a0, a1 = np.maximum(a0, a1), np.minimum(a0, a1)
+    palette = _alpha_palette(a0, a1)
+    dist = (alpha[:, :, None] - palette[:, None, :]) ** 2
+    indices = dist.argmin(axis=-1).astype(np.uint8)
+    error = np.take_along_axis(dist, indices[..., None].astype(np.intp), axis=-1)[..., 0].sum(axis=1)
+    return a0, a1, indices, error
+
+
+def _encode_alpha(alpha, mode):
+    """Returns (alpha0, alpha1, indices) for (N, 16) float alpha blocks, always in the 8-value mode."""
+    best = _fit_alpha(alpha, alpha.max(axis=1), alpha.min(axis=1))
+    if mode == MODE_HQ:
+        r0, r1 = _least_squares_endpoints(alpha[..., None], best[2], _ALPHA_WEIGHTS)
+        r0, r1 = r0[:, 0], r1[:, 0]
+        valid = ~np.isnan(r0)
+        r0[~valid], r1[~valid] = best[0][~valid], best[1][~valid]
+        candidate = _fit_alpha(alpha, r0, r1)
+        best = _select(candidate[3] < best[3], candidate, best)
+    a0, a1, indices = best[0], best[1], best[2]
+    # alpha0 == alpha1 would select the 6-value mode; with all indices 0 the block is still exact.
+    indices = np.where((a0 == a1)[:, None], 0, indices)
+    return a0.astype(np.uint8), a1.astype(np.uint8), indices
+
+
+# --- Encoding / Decoding ---
+def _encode_block_chunk(blocks, mode):
+    values = blocks.astype(np.float32)
+    a0, a1, alpha_idx = _encode_alpha(values[..., 3], mode)
+    c0, c1, color_idx = _encode_colors(values[..., :3], mode)
+
+    out = np.empty((len(blocks), BLOCK_BYTES), dtype=np.uint8)
+    out[:, 0], out[:, 1] = a0, a1
+    shifts = np.arange(16, dtype=np.uint64)
+    alpha_bits = (alpha_idx.astype(np.uint64) << (shifts * np.uint64(3))).sum(axis=1, dtype=np.uint64)
+    out[:, 2:8] = alpha_bits.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+    out[:, 8:10] = c0.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 10:12] = c1.astype("<u2").view(np.uint8).reshape(-1, 2)
+    color_bits = (color_idx.astype(np.uint32) << (np.arange(16, dtype=np.uint32) * np.uint32(2))).sum(axis=1, dtype=np.uint32)
+    out[:, 12:16] = color_bits.astype("<u4").view(np.uint8).reshape(-1, 4)
+    return out
+
+
+def encode_bc3(pixels, mode=MODE_FAST):
+    """Encodes an HxWx4 uint8 RGBA array to BC3 block data (bytes)."""
+    blocks = _to_blocks(pixels)
+    chunks = [_encode_block_chunk(blocks[i:i + CHUNK_BLOCKS], mode) for i in range(0, len(blocks), CHUNK_BLOCKS)]
+    return np.concatenate(chunks).tobytes() if chunks else b""
+
+
+def decode_bc3(data, width, height):
+    """Decodes BC3 block data back to an HxWx4 uint8 array (used to verify the encoder)."""
+    raw = np.frombuffer(data, dtype=np.uint8, count=math.ceil(width / 4) * math.ceil(height / 4) * BLOCK_BYTES).reshape(-1, BLOCK_BYTES)
+    a0, a1 = raw[:, 0].astype(np.float32), raw[:, 1].astype(np.float32)
+    weights = np.asarray(_ALPHA_WEIGHTS, dtype=np.float32)
+    alpha_palette = np.floor(a0[:, None] * weights + a1[:, None] * (1 - weights) + 0.5)
+    six_mode = a0 <= a1 # The 6-value mode: interpolants plus 0 and 255
+    if six_mode.any():
+        w6 = np.array([1.0, 0.0, 4 / 5, 3 / 5, 2 / 5, 1 / 5], dtype=np.float32)
+        alpha_palette[six_mode, :6] = np.floor(a0[six_mode, None] * w6 + a1[six_mode, None] * (1 - w6) + 0.5)
+        alpha_palette[six_mode, 6], alpha_palette[six_mode, 7] = 0, 255
+    alpha_bits = np.zeros((len(raw), 8), dtype=np.uint8)
+    alpha_bits[:, :6] = raw[:, 2:8]
+    alpha_bits = alpha_bits.view("<u8")[:, 0]
+    alpha_idx = ((alpha_bits[:, None] >> (np.arange(16, dtype=np.uint64) * np.uint64(3))) & np.uint64(7)).astype(np.intp)
+
+    c0 = raw[:, 8:10].copy().view("<u2")[:, 0]
+    c1 = raw[:, 10:12].copy().view("<u2")[:, 0]
+    palette = np.floor(_color_palette(_expand_565(c0), _expand_565(c1)) + 0.5)
+    color_bits = raw[:, 12:16].copy().view("<u4")[:, 0]
+    color_idx = ((color_bits[:, None] >> (np.arange(16, dtype=np.uint32) * np.uint32(2))) & np.uint32(3)).astype(np.intp)
+
+    blocks = np.empty((len(raw), 16, 4), dtype=np.uint8)
+    blocks[..., :3] = np.take_along_axis(palette, color_idx[..., None], axis=1)
+    blocks[..., 3] = np.take_along_axis(alpha_palette, alpha_idx, axis=1)
+    return _from_blocks(blocks, width, height)
+
+
+# --- Mipmaps ---
+def mip_count(width, height):
+    return int(math.log2(max(width, height))) + 1
+
+
+def build_mip_chain(image, mip_filter=MIP_BOX):
+    """Returns [level0, level1, ...] RGBA arrays down to 1x1 (each level is half the previous, rounded down)."""
+    base = image.convert("RGBA") if image.mode != "RGBA" else image
+    levels = [np.asarray(base)]
+    width, height = base.size
+    for level in range(1, mip_count(width, height)):
+        w, h = max(1, width >> level), max(1, height >> level)
+        if mip_filter == MIP_LANCZOS:
+            # Resampled from the base level each time so errors don't accumulate down the chain.
+            levels.append(np.asarray(base.resize((w, h), Image.Resampling.LANCZOS)))
+            continue
+        prev = levels[-1].astype(np.uint16)
+        if prev.shape[0] > 1:
+            prev = prev[:h * 2:2] + prev[1:h * 2:2]
+        else:
+            prev = prev * 2
+        if prev.shape[1] > 1:
+            prev = prev[:, :w * 2:2] + prev[:, 1:w * 2:2]
+        else:
+            prev = prev * 2
+        levels.append(((prev + 2) // 4).astype(np.uint8))
+    return levels
+
+
+# --- DDS Files ---
+def dds_header(width, height, mip_levels):
+    flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_LINEARSIZE
+    caps = DDSCAPS_TEXTURE
+    if mip_levels > 1:
+        flags |= DDSD_MIPMAPCOUNT
+        caps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+    linear_size = math.ceil(width / 4) * math.ceil(height / 4) * BLOCK_BYTES
+    return DDS_MAGIC + HEADER_STRUCT.pack(
+        124, flags, height, width, linear_size, 0, mip_levels,
+        32, DDPF_FOURCC, int.from_bytes(b"DXT5", "little"), 0, 0, 0, 0, 0,
+        caps, 0, 0, 0)
+
+
+def encode_dds(image, mode=MODE_FAST, mipmaps=True, mip_filter=MIP_BOX):
+    """Returns the bytes of a BC3 (DXT5) DDS file for a PIL image, with an optional full mip chain."""
+    levels = build_mip_chain(image, mip_filter) if mipmaps else [np.asarray(image.convert("RGBA"))]
+    width, height = image.size
+    return dds_header(width, height, len(levels)) + b"".join(encode_bc3(level, mode) for level in levels)
+
+
+def read_dds_top_level(data):
+    """Decodes the top mip level of a BC3 DDS file written by `encode_dds`. Returns an HxWx4 array."""
+    if data[:4] != DDS_MAGIC:
+        raise ValueError("not a DDS file")
+    fields = HEADER_STRUCT.unpack_from(data, 4)
+    height, width, fourcc = fields[2], fields[3], fields[9]
+    if fourcc != int.from_bytes(b"DXT5", "little"):
+        raise ValueError("not a DXT5 DDS file")
+    return decode_bc3(data[4 + HEADER_STRUCT.size:], width, height)
+
+
+def round_trip_rmse(image, data):
+    """Root-mean-square error per RGBA channel between `image` and the decoded top level of `data`."""
+    original = np.asarray(image.convert("RGBA") if image.mode != "RGBA" else image, dtype=np.float32)
+    decoded = read_dds_top_level(data).astype(np.float32)
+    return float(np.sqrt(((original - decoded) ** 2).mean()))
+
+
+def save_dds(image, path, mode=MODE_FAST, mipmaps=True, mip_filter=MIP_BOX):
+    """Encodes `image` and writes it to `path` atomically. Returns the encoded bytes."""
+    data = encode_dds(image, mode, mipmaps, mip_filter)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return data
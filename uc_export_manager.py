@@ -1,84 +1,420 @@
+import json
+import math
 import os
-import subprocess
+import shlex
+import shutil
+import time
+import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import messagebox
-from PIL import Image
+
+from uc_blp import BLP1, COMPRESSION_JPEG, NUMPY_AVAILABLE as NATIVE_BLP_AVAILABLE
+from uc_dds import MIP_BOX, MODE_FAST, NUMPY_AVAILABLE as NATIVE_DDS_AVAILABLE
+from uc_export_worker import DEFAULT_CONVERTER_ARGS, build_converter_command, convert_batch, export_tile, split_batches
+from uc_image_handle import new_hasher
+
+# --- Export Manifest ---
+# Each export folder holds a manifest mapping every exported tile to a hash of everything its
+# output depends on (tile pixels, border images and placement, format and encoder options) and
+# to the size/mtime of the file written. Tiles whose inputs hash the same and whose output is
+# untouched are skipped on the next export.
+MANIFEST_NAME = "export_manifest.json"
+MANIFEST_VERSION = 1
 
 class ExportManager:
-    """Manages all logic related to exporting final images."""
+    """
+    Manages all logic related to exporting final images.
+
+    An export runs as a background job: the tiles to export are snapshotted on the main thread
+    (copy-on-write handles, so this is cheap), then compositing and saving run in a process pool
+    (`uc_export_worker`). DDS tiles are encoded there by the built-in BC3 encoder (`uc_dds`); with
+    an external converter they are staged as PNGs and converted afterwards in a few batched
+    calls instead of one process per tile. Progress is polled with `after`,
+    the job can be cancelled, and all per-tile errors are shown in one summary at the end.
+    Unchanged tiles are skipped using the export folder's manifest unless a full export is forced.
+    """
+    POLL_INTERVAL_MS = 50
+
     def __init__(self, app):
         self.app = app
+        self.progress_var = tk.DoubleVar(value=0.0)
+        self.status_var = tk.StringVar(value="Idle")
+        settings = app.settings_manager
+        self.dds_quality_var = tk.StringVar(value=settings.get("dds_quality", MODE_FAST))
+        self.dds_mipmaps_var = tk.BooleanVar(value=settings.get("dds_mipmaps", True))
+        self.force_full_export_var = tk.BooleanVar(value=False)
+        self._executor = None
+        self._futures = {} # future -> ("render", tag, handle held until done) or ("convert", tags)
+        self._results = []
+        self._staged_paths = [] # DDS only: rendered PNGs waiting for conversion
+        self._total = 0
+        self._units_total = 0 # Progress units: one per render, plus one per conversion for DDS
+        self._units_done = 0
+        self._converter_command = None
+        self._save_dir = None
+        self._workers = 1
+        self._cancelled = False
+        self._job_format = None
+        self._start_time = 0.0
+        self._manifest = {} # tag -> {"inputs", "size", "mtime_ns"} for the current export folder
+        self._input_hashes = {} # tag -> input hash of the tiles being exported
+        self._skipped = 0
+
+    @property
+    def is_running(self):
+        return self._executor is not None
+
+    def _max_workers(self):
+        workers = self.app.settings_manager.get("export_workers", 0)
+        return workers if workers and workers > 0 else (os.cpu_count() or 1)
 
     def export_images(self, export_format):
-        """Generic export function to save modified layers as either PNG or DDS."""
+        """Starts a background export of the modified layers as PNG, DDS or BLP."""
         print("-" * 30)
         print(f"Starting export process for {export_format.upper()}...")
-        if export_format not in ['png', 'dds']:
+        if self.is_running:
+            messagebox.showinfo("Export Running", "An export is already in progress.")
+            return
+        if export_format not in ['png', 'dds', 'blp']:
             messagebox.showerror("Export Error", f"Unsupported export format: {export_format}")
             return
+        if export_format == 'blp' and not NATIVE_BLP_AVAILABLE:
+            messagebox.showerror("BLP Export Error", "BLP export requires NumPy.")
+            return
 
         save_dir = os.path.join(self.app.output_dir, f"export_{export_format}")
         os.makedirs(save_dir, exist_ok=True)
 
-        exported_count = 0
+        stage_dir = None
+        self._converter_command = None
+        dds_options = None
+        if export_format == 'dds' and self._use_native_dds():
+            dds_options = {
+                "mode": self.dds_quality_var.get(),
+                "mipmaps": self.dds_mipmaps_var.get(),
+                "mip_filter": self.app.settings_manager.get("dds_mip_filter", MIP_BOX),
+            }
+        elif export_format == 'dds':
+            self._converter_command = self._get_converter_command()
+            if self._converter_command is None:
+                return
+            stage_dir = os.path.join(save_dir, "_staging")
+            os.makedirs(stage_dir, exist_ok=True)
+
+        blp_options = None
+        if export_format == 'blp':
+            settings = self.app.settings_manager
+            blp_options = {
+                "version": settings.get("blp_version", BLP1),
+                "compression": settings.get("blp_compression", COMPRESSION_JPEG),
+                "quality": settings.get("blp_jpeg_quality", 90),
+                "mipmaps": settings.get("blp_mipmaps", True),
+            }
+
+        self._manifest = {} if self.force_full_export_var.get() else self._load_manifest(save_dir)
+        self._input_hashes = {}
+        self._skipped = 0
+        output_params = {"format": export_format, "dds": dds_options, "blp": blp_options, "converter": self._converter_command}
+        tasks = self._build_tasks(export_format, save_dir, stage_dir, dds_options, blp_options, output_params)
+        if not tasks:
+            if self._skipped:
+                messagebox.showinfo("Export Info", f"All {self._skipped} tiles are already up to date.")
+            else:
+                messagebox.showinfo("Export Info", "No modified layers found to export.")
+            return
+
+        self._save_dir = save_dir
+        self._start_job(tasks, export_format)
+
+    def _use_native_dds(self):
+        """The built-in encoder is used unless the `dds_encoder` setting asks for an external converter."""
+        if self.app.settings_manager.get("dds_encoder", "native") != "native":
+            return False
+        if not NATIVE_DDS_AVAILABLE:
+            print("[WARNING] Built-in DDS encoder needs NumPy; falling back to the external converter.")
+            return False
+        return True
 
+    def _get_converter_command(self):
+        """
+        Returns the DDS converter command without its input files, or None (after telling the user)
+        if the converter can't be found. The `dds_converter_command` setting replaces the bundled
+        texconv.exe; it is a list of arguments (or one string) that may use "{out_dir}".
+        """
+        custom = self.app.settings_manager.get("dds_converter_command", None)
+        if custom:
+            command = shlex.split(custom, posix=(os.name != 'nt')) if isinstance(custom, str) else list(custom)
+            if not (os.path.exists(command[0]) or shutil.which(command[0])):
+                messagebox.showerror("DDS Export Error", f"DDS converter not found:\n{command[0]}")
+                return None
+            return command
+        texconv_path = os.path.join(self.app.tools_dir, "texconv.exe")
+        if not os.path.exists(texconv_path):
+            messagebox.showerror("DDS Export Error", f"texconv.exe not found at:\n{texconv_path}")
+            return None
+        return [texconv_path] + DEFAULT_CONVERTER_ARGS
+
+    # --- Job Setup ---
+    def _build_tasks(self, export_format, save_dir, stage_dir, dds_options=None, blp_options=None, output_params=None):
+        """Returns a list of (task, handle) pairs for every tile that needs exporting. Up-to-date tiles are counted in `_skipped`."""
         # Pre-calculate which borders belong to which tiles
         borders_by_parent = {}
         for comp in self.app.components.values():
             if comp.tag.startswith("preset_border_") and comp.parent_tag:
-                parent_tag = comp.parent_tag
-                if parent_tag not in borders_by_parent:
-                    borders_by_parent[parent_tag] = []
-                borders_by_parent[parent_tag].append(comp)
+                borders_by_parent.setdefault(comp.parent_tag, []).append(comp)
 
+        tasks = []
         for tag, comp in self.app.components.items():
             # We only export primary tiles, not assets, clones, or the borders themselves.
-            if not comp.pil_image or comp.is_dock_asset or tag.startswith("clone_") or tag.startswith("preset_border_"):
+            if not comp.image_handle or comp.is_dock_asset or tag.startswith("clone_") or tag.startswith("preset_border_"):
                 continue
 
-            final_image = comp.pil_image.copy()
-            has_borders = False
-
             # Conditionally skip unmodified tiles based on UI checkbox
             if not self.app.export_all_tiles.get():
-                is_modified = (comp.original_pil_image is not None and not self.app.image_manager._are_images_identical(comp.pil_image, comp.original_pil_image))
+                is_modified = (comp.original_image_handle is not None and not self.app.image_manager._are_images_identical(comp.image_handle, comp.original_image_handle))
                 if not is_modified and tag not in borders_by_parent:
                     continue
 
-            # Composite any borders onto the final image
-            if tag in borders_by_parent:
-                for border_comp in borders_by_parent[tag]:
-                    final_image, has_borders = self.app.image_manager._composite_border_onto_image(final_image, comp, border_comp)
+            # Skip tiles whose inputs and output file match the manifest.
+            input_hash = self._tile_input_hash(comp, borders_by_parent.get(tag, []), output_params)
+            if self._is_up_to_date(tag, input_hash, os.path.join(save_dir, f"{tag}.{export_format}")):
+                self._skipped += 1
+                continue
+            self._input_hashes[tag] = input_hash
+
+            # Hold the handle for the job's lifetime, so edits made while exporting copy instead
+            # of changing the pixels the worker is about to receive.
+            handle = comp.image_handle.acquire()
+            if handle.tiled is not None:
+                image = handle.tiled.snapshot()
+            else:
+                image = handle.image
+            tasks.append(({
+                "tag": tag,
+                "image": image,
+                "borders": self._collect_border_patches(comp, borders_by_parent.get(tag, [])),
+                "save_dir": save_dir,
+                "stage_dir": stage_dir,
+                "format": export_format,
+                "dds_options": dds_options,
+                "blp_options": blp_options,
+            }, handle))
+        return tasks
 
-            save_path = os.path.join(save_dir, f"{tag}.{export_format}")
+    # --- Manifest ---
+    def _tile_input_hash(self, comp, border_comps, output_params):
+        """Hashes everything the exported file depends on. Pixel hashes are cached per image revision."""
+        hasher = new_hasher()
+        hasher.update(json.dumps([MANIFEST_VERSION, output_params], sort_keys=True).encode("utf-8"))
+        hasher.update(comp.image_handle.content_hash().encode("ascii"))
+        tile_geometry = (comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2)
+        for border_comp in sorted(border_comps, key=lambda c: c.tag):
+            if not border_comp.image_handle:
+                continue
+            border_geometry = (border_comp.world_x1, border_comp.world_y1, border_comp.world_x2, border_comp.world_y2)
+            hasher.update(repr((border_comp.tag, tile_geometry, border_geometry)).encode("utf-8"))
+            hasher.update(border_comp.image_handle.content_hash().encode("ascii"))
+        return hasher.hexdigest()
+
+    def _is_up_to_date(self, tag, input_hash, output_path):
+        entry = self._manifest.get(tag)
+        if not entry or entry.get("inputs") != input_hash:
+            return False
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return False # Output was deleted
+        return stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns")
+
+    def _load_manifest(self, save_dir):
+        path = os.path.join(save_dir, MANIFEST_NAME)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring unreadable export manifest '{path}': {e}")
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("tiles", {})
+
+    def _update_manifest(self):
+        """Records every successfully written tile and saves the manifest (write-then-rename)."""
+        for result in self._results:
+            tag = result["tag"]
+            if result["error"] is not None or tag not in self._input_hashes:
+                self._manifest.pop(tag, None)
+                continue
             try:
-                if export_format == 'dds':
-                    texconv_path = os.path.join(self.app.tools_dir, "texconv.exe")
-                    if not os.path.exists(texconv_path):
-                        messagebox.showerror("DDS Export Error", f"texconv.exe not found at:\n{texconv_path}")
-                        return
-
-                    temp_png_path = os.path.join(save_dir, f"{tag}.png")
-                    final_image.save(temp_png_path, format='PNG')
-
-                    command = [texconv_path, "-f", "BC3_UNORM", "-o", save_dir, "-y", temp_png_path]
-                    result = subprocess.run(command, capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-                    if result.returncode != 0:
-                        error_message = f"texconv.exe failed.\nSTDOUT:\n{result.stdout.strip()}\n\nSTDERR:\n{result.stderr.strip()}"
-                        raise RuntimeError(error_message)
-                    os.remove(temp_png_path)
-                else:
-                    final_image.save(save_path)
-
-                exported_count += 1
-                print(f"Saved modified image to: {save_path}")
-            except (Exception, RuntimeError) as e:
-                messagebox.showerror("DDS Export Error", f"Could not save '{os.path.basename(save_path)}'.\n\nDetails:\n{e}")
-
-        if exported_count > 0:
-            messagebox.showinfo("Export Complete", f"Successfully exported {exported_count} modified files.")
+                stat = os.stat(result["path"])
+            except OSError:
+                self._manifest.pop(tag, None)
+                continue
+            self._manifest[tag] = {"inputs": self._input_hashes[tag], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        path = os.path.join(self._save_dir, MANIFEST_NAME)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "tiles": self._manifest}, f, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"[WARNING] Could not write export manifest '{path}': {e}")
+
+    def _collect_border_patches(self, comp, border_comps):
+        """Returns (patch, paste_x, paste_y) for each border of `comp`, scaled to its pixel size."""
+        patches = []
+        for border_comp in border_comps:
+            patch, paste_x, paste_y = self.app.image_manager._get_border_patch(comp.image_handle.size, comp, border_comp)
+            if patch is not None:
+                patches.append((patch, paste_x, paste_y))
+        return patches
+
+    def _start_job(self, tasks, export_format):
+        workers = self._workers = min(self._max_workers(), len(tasks))
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._futures = {}
+        self._results = []
+        self._staged_paths = []
+        self._total = len(tasks)
+        self._units_total = self._total * (2 if self._converter_command else 1)
+        self._units_done = 0
+        self._cancelled = False
+        self._job_format = export_format
+        self._start_time = time.perf_counter()
+        for task, handle in tasks:
+            future = self._executor.submit(export_tile, task)
+            self._futures[future] = ("render", task["tag"], handle)
+
+        self.progress_var.set(0.0)
+        self.status_var.set(f"Exporting 0 / {self._total}...")
+        print(f"[INFO] Exporting {self._total} tiles on {workers} worker processes.")
+        self.app.master.after(self.POLL_INTERVAL_MS, self._poll_job)
+
+    # --- Job Progress ---
+    def _poll_job(self):
+        """Collects finished work, updates the progress bar and moves the job to its next phase."""
+        for future in [f for f in self._futures if f.done()]:
+            kind, *info = self._futures.pop(future)
+            if kind == "render":
+                self._collect_render(future, *info)
+            else:
+                self._collect_conversion(future, *info)
+
+        self.progress_var.set(100.0 * self._units_done / self._units_total)
+        if self._cancelled:
+            self.status_var.set(f"Cancelling ({len(self._results)} / {self._total})...")
+        elif any(entry[0] == "convert" for entry in self._futures.values()):
+            self.status_var.set(f"Converting to DDS ({len(self._results)} / {self._total})...")
         else:
-            messagebox.showinfo("Export Info", "No modified layers found to export.")
+            self.status_var.set(f"Exporting {self._units_done} / {self._total}...")
+
+        if not self._futures and self._staged_paths:
+            if self._cancelled:
+                self._discard_staged()
+            else:
+                self._start_conversion()
+        if self._futures:
+            self.app.master.after(self.POLL_INTERVAL_MS, self._poll_job)
+        else:
+            self._finish_job()
+
+    def _collect_render(self, future, tag, handle):
+        handle.release()
+        self._units_done += 1
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e: # e.g. a worker process died
+            result = {"tag": tag, "path": None, "error": f"{type(e).__name__}: {e}"}
+        if result["error"] is None and self._converter_command:
+            self._staged_paths.append(result["path"]) # Final result comes from the conversion
+            return
+        self._results.append(result)
+        if result["error"] is None:
+            print(f"Saved modified image to: {result['path']}")
+            if "rmse" in result:
+                print(f"[DEBUG] {self._job_format.upper()} round trip for '{tag}': RMSE {result['rmse']:.2f}")
+
+    def _start_conversion(self):
+        """Converts all staged PNGs in as few converter calls as the command line allows, spread over the pool."""
+        base_command = build_converter_command(self._converter_command, self._save_dir)
+        batches = split_batches(base_command, self._staged_paths, max_files=math.ceil(len(self._staged_paths) / self._workers))
+        print(f"[INFO] Converting {len(self._staged_paths)} tiles to DDS in {len(batches)} converter call(s).")
+        for batch in batches:
+            future = self._executor.submit(convert_batch, base_command, batch, self._save_dir)
+            tags = [os.path.splitext(os.path.basename(path))[0] for path in batch]
+            self._futures[future] = ("convert", tags)
+        self._staged_paths = []
+
+    def _collect_conversion(self, future, tags):
+        self._units_done += len(tags)
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [{"tag": tag, "path": None, "error": f"{type(e).__name__}: {e}"} for tag in tags]
+        for result in results:
+            self._results.append(result)
+            if result["error"] is None:
+                print(f"Saved modified image to: {result['path']}")
+
+    def _discard_staged(self):
+        for path in self._staged_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._staged_paths = []
+
+    def cancel_export(self):
+        """Cancels tiles that haven't started yet; tiles already being written are allowed to finish."""
+        if not self.is_running or self._cancelled:
+            return
+        self._cancelled = True
+        for future in self._futures:
+            future.cancel()
+        print("[INFO] Export cancelled; waiting for running tiles to finish.")
+
+    def _finish_job(self):
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        elapsed = time.perf_counter() - self._start_time
+        exported = [r for r in self._results if r["error"] is None]
+        errors = [r for r in self._results if r["error"] is not None]
+        self._update_manifest()
+        skipped = f", {self._skipped} unchanged" if self._skipped else ""
+        self.status_var.set(f"{'Cancelled' if self._cancelled else 'Done'}: {len(exported)} exported{skipped}, {len(errors)} failed")
+        print(f"[INFO] Export finished in {elapsed:.1f}s: {len(exported)} exported{skipped}, {len(errors)} failed.")
+
+        if errors:
+            self._show_error_summary(exported, errors)
+        elif self._cancelled:
+            messagebox.showinfo("Export Cancelled", f"Export cancelled after {len(exported)} of {self._total} files.")
+        else:
+            messagebox.showinfo("Export Complete", f"Successfully exported {len(exported)} modified files{skipped}.")
+
+    def _show_error_summary(self, exported, errors):
+        """Shows every per-tile failure in one dialog (the full details go to the console)."""
+        max_listed = 12
+        lines = []
+        for result in errors:
+            print(f"[ERROR] Export of '{result['tag']}' failed: {result['error']}")
+            if len(lines) < max_listed:
+                lines.append(f"- {result['tag']}: {result['error'].splitlines()[0]}")
+        if len(errors) > max_listed:
+            lines.append(f"...and {len(errors) - max_listed} more (see console).")
+        messagebox.showwarning(
+            "Export Finished With Errors",
+            f"Exported {len(exported)} of {self._total} files; {len(errors)} failed:\n\n" + "\n".join(lines))
+
+    def shutdown(self):
+        """Cancels any running export without waiting. Called on exit."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     def open_export_folder(self, export_format: str):
         """Opens the specified export folder."""
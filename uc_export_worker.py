@@ -0,0 +1,156 @@
+import os
+import subprocess
+
+from uc_blend import BLEND_MASK, composite_patch
+from uc_blp import round_trip_rmse as blp_round_trip_rmse, save_blp
+from uc_dds import round_trip_rmse, save_dds
+from uc_tiled_image import TiledImage
+
+# This module runs inside export worker processes, so it must not import tkinter or any
+# module that touches the app. Everything a worker needs travels in the task dict:
+#   tag          - component tag, used for the output file name
+#   image        - the tile's PIL image, or a TiledImage snapshot for tiled textures
+#   borders      - list of (patch, paste_x, paste_y) border images already scaled to the tile
+#   save_dir     - output folder
+#   stage_dir    - folder for PNGs awaiting external DDS conversion
+#   format       - 'png', 'dds' or 'blp'
+#   dds_options  - for the built-in DDS encoder: {"mode", "mipmaps", "mip_filter"}; None when
+#                  an external converter is used
+#   blp_options  - for BLP: {"version", "compression", "quality", "mipmaps"}
+
+# CREATE_NO_WINDOW only exists on Windows.
+_SUBPROCESS_FLAGS = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# --- DDS Conversion ---
+# DDS files are produced by an external converter in batches: each worker stages its tile as a
+# PNG, then the staged files are converted with as many inputs per converter call as the
+# command-line limit allows. The command is a list of arguments with "{out_dir}" standing for
+# the output folder; input files are appended at the end. Any program that writes
+# <out_dir>/<input stem>.dds for each input works (e.g. a stand-in script in tests).
+DEFAULT_CONVERTER_ARGS = ["-f", "BC3_UNORM", "-y", "-o", "{out_dir}"]
+MAX_COMMAND_LINE = 30000 # Windows CreateProcess allows 32767 characters; keep a margin
+DDS_MAGIC = b"DDS "
+DDS_MIN_SIZE = 128 # Magic plus the 124-byte header
+
+
+def render_tile(task):
+    """Composites the task's borders onto its tile and returns the final PIL image."""
+    image = task["image"]
+    if isinstance(image, TiledImage):
+        for patch, paste_x, paste_y in task["borders"]:
+            image.composite_patch(patch, paste_x, paste_y, BLEND_MASK)
+        return image.to_image()
+
+    if task["borders"]:
+        image = image.convert("RGBA") if image.mode != "RGBA" else image.copy()
+        for patch, paste_x, paste_y in task["borders"]:
+            composite_patch(image, patch, paste_x, paste_y, BLEND_MASK)
+    return image
+
+
+def export_tile(task):
+    """
+    Renders and saves one tile. DDS tiles are encoded directly with the built-in encoder (and
+    checked by decoding them again), or, with an external converter, only staged as a PNG in
+    `stage_dir` for `convert_batch`. Never raises: returns a dict with the tag, the written
+    path and an `error` string (None on success), so the caller can aggregate failures into
+    one report.
+    """
+    tag, export_format = task["tag"], task["format"]
+    dds_options = task.get("dds_options")
+    if export_format == "dds" and not dds_options:
+        save_path = os.path.join(task["stage_dir"], f"{tag}.png")
+    else:
+        save_path = os.path.join(task["save_dir"], f"{tag}.{export_format}")
+    try:
+        final_image = render_tile(task)
+        if dds_options:
+            data = save_dds(final_image, save_path, dds_options["mode"], dds_options["mipmaps"], dds_options["mip_filter"])
+            rmse = round_trip_rmse(final_image, data)
+            return {"tag": tag, "path": save_path, "error": None, "rmse": rmse}
+        if export_format == "blp":
+            options = task["blp_options"]
+            data = save_blp(final_image, save_path, options["version"], options["compression"], options["quality"], options["mipmaps"])
+            return {"tag": tag, "path": save_path, "error": None, "rmse": blp_round_trip_rmse(final_image, data)}
+        final_image.save(save_path, format="PNG")
+        return {"tag": tag, "path": save_path, "error": None}
+    except Exception as e:
+        return {"tag": tag, "path": save_path, "error": f"{type(e).__name__}: {e}"}
+
+
+def build_converter_command(converter_command, out_dir):
+    """Expands the "{out_dir}" placeholder in a converter command (a list of arguments)."""
+    return [arg.replace("{out_dir}", out_dir) for arg in converter_command]
+
+
+def split_batches(base_command, input_paths, max_length=MAX_COMMAND_LINE, max_files=None):
+    """
+    Splits `input_paths` into batches whose full command line stays under `max_length`
+    characters (measured the way Windows quotes it). A single oversized path gets its own batch.
+    """
+    base_length = len(subprocess.list2cmdline(base_command))
+    batches, current, length = [], [], base_length
+    for path in input_paths:
+        arg_length = len(subprocess.list2cmdline([path])) + 1
+        if current and (length + arg_length > max_length or (max_files and len(current) >= max_files)):
+            batches.append(current)
+            current, length = [], base_length
+        current.append(path)
+        length += arg_length
+    if current:
+        batches.append(current)
+    return batches
+
+
+def validate_dds(path):
+    """Returns None if `path` looks like a complete DDS file, otherwise a reason string."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            magic = f.read(4)
+    except OSError:
+        return "no output file was written"
+    if magic != DDS_MAGIC:
+        return "output is not a DDS file"
+    if size < DDS_MIN_SIZE:
+        return f"output is truncated ({size} bytes)"
+    return None
+
+
+def convert_batch(base_command, input_paths, out_dir):
+    """
+    Runs one converter call for `input_paths` and validates each expected output separately.
+    Staged inputs are deleted afterwards. Returns one result dict per input, like `export_tile`.
+    """
+    expected = {}
+    for path in input_paths:
+        tag = os.path.splitext(os.path.basename(path))[0]
+        expected[tag] = os.path.join(out_dir, f"{tag}.dds")
+        try:
+            os.remove(expected[tag]) # So a stale file from an earlier export can't pass validation
+        except OSError:
+            pass
+
+    process_error = None
+    try:
+        result = subprocess.run(base_command + list(input_paths), capture_output=True, text=True, creationflags=_SUBPROCESS_FLAGS)
+        if result.returncode != 0:
+            process_error = f"converter exited with code {result.returncode}\nSTDOUT:\n{result.stdout.strip()}\nSTDERR:\n{result.stderr.strip()}"
+    except OSError as e:
+        process_error = f"could not start converter: {e}"
+    finally:
+        for path in input_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    results = []
+    for tag, output_path in expected.items():
+        reason = validate_dds(output_path)
+        if reason is None:
+            results.append({"tag": tag, "path": output_path, "error": None})
+        else:
+            error = f"{reason} ({process_error})" if process_error else reason
+            results.append({"tag": tag, "path": output_path, "error": error})
+    return results
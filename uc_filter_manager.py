@@ -0,0 +1,163 @@
+import tkinter as tk
+from tkinter import messagebox
+
+from uc_filters import FILTER_DEFAULTS, apply_filters, is_identity, make_proxy
+from uc_image_handle import ImageHandle
+from uc_memory_budget import memory_budget
+
+
+class FilterManager:
+    """
+    Manages the Filters tab: a re-editable adjustment stack per component.
+
+    Each filtered component remembers the image it was filtered from (`filter_base_handle`)
+    and its parameters (`filter_params`), so the stack is always re-applied to the unfiltered
+    base instead of compounding. Slider drags preview on a downscaled proxy through the
+    component's `display_pil_image`; the full-resolution result is committed on release as a
+    single undo step.
+    """
+    PROXY_MAX_SIDE = 512
+
+    def __init__(self, app):
+        self.app = app
+        self.vars = {}
+        for key, default in FILTER_DEFAULTS.items():
+            if isinstance(default, str):
+                self.vars[key] = tk.StringVar(value=default)
+            elif isinstance(default, float):
+                self.vars[key] = tk.DoubleVar(value=default)
+            else:
+                self.vars[key] = tk.IntVar(value=default)
+
+        self._proxy_key = None # (tag, base revision) the cached proxy was made from
+        self._proxy_image = None
+        self._previewing_tag = None
+        self._loading_vars = False
+
+    # --- Helpers ---
+    def _get_target(self, show_warning=False):
+        """Returns the selected tile component, or None if it can't be filtered."""
+        comp = self.app.components.get(self.app.selected_component_tag)
+        if not comp or comp.is_decal or comp.is_dock_asset or not comp.image_handle:
+            if show_warning:
+                messagebox.showwarning("Selection Required", "Please select a tile with an image to apply filters.")
+            return None
+        return comp
+
+    def _current_params(self):
+        params = {}
+        for key, var in self.vars.items():
+            try:
+                params[key] = var.get()
+            except tk.TclError: # Partially typed values in entry fields
+                params[key] = FILTER_DEFAULTS[key]
+        return params
+
+    def _get_base_handle(self, comp):
+        """
+        Returns the unfiltered image for `comp`. If the component was edited some other way since
+        the filters were last committed (e.g. a stamp), that edit becomes the new base.
+        """
+        if comp.filter_base_handle and comp.filter_result_revision == comp.image_revision:
+            return comp.filter_base_handle
+        if comp.filter_base_handle:
+            comp.filter_base_handle.release()
+        comp.filter_base_handle = comp.image_handle.acquire()
+        comp.filter_params = dict(FILTER_DEFAULTS)
+        comp.filter_result_revision = comp.image_revision
+        return comp.filter_base_handle
+
+    def _drop_proxy(self):
+        self._proxy_key, self._proxy_image = None, None
+
+    def load_params_for_selection(self):
+        """Shows the selected component's filter stack in the sliders."""
+        comp = self._get_target()
+        params = comp.filter_params if comp and comp.filter_params and comp.filter_result_revision == comp.image_revision else FILTER_DEFAULTS
+        self._loading_vars = True
+        try:
+            for key, var in self.vars.items():
+                var.set(params.get(key, FILTER_DEFAULTS[key]))
+        finally:
+            self._loading_vars = False
+
+    # --- Preview / Commit ---
+    def preview(self, *args):
+        """Applies the current stack to a downscaled proxy and shows it. Called while dragging."""
+        if self._loading_vars:
+            return
+        comp = self._get_target()
+        if not comp:
+            return
+        base = self._get_base_handle(comp)
+        params = self._current_params()
+        if params == comp.filter_params:
+            # Nothing to preview (e.g. a scale echoing a programmatic update); show the real image.
+            if comp.display_pil_image is not None and self._previewing_tag == comp.tag:
+                comp.display_pil_image = None
+                self.app.redraw_all_zoomable()
+            return
+
+        proxy_key = (comp.tag, base.revision)
+        if self._proxy_key != proxy_key:
+            self._proxy_image = make_proxy(base.image, self.PROXY_MAX_SIDE)
+            self._proxy_key = proxy_key
+            memory_budget.track("filter_proxy", self._proxy_image.width * self._proxy_image.height * 4, self._drop_proxy)
+
+        comp.display_pil_image = apply_filters(self._proxy_image, params)
+        self._previewing_tag = comp.tag
+        self.app.redraw_all_zoomable(use_fast_preview=True)
+
+    def commit(self, event=None):
+        """Renders the stack at full resolution and applies it as one undo step. Called on release."""
+        comp = self._get_target()
+        if not comp:
+            return
+        params = self._current_params()
+        base = self._get_base_handle(comp)
+        if comp.display_pil_image is not None and self._previewing_tag == comp.tag:
+            comp.display_pil_image = None
+        self._previewing_tag = None
+
+        if params == comp.filter_params:
+            self.app.redraw_all_zoomable()
+            return
+
+        # One undo entry restores the image and the stack it was made with.
+        self.app._save_undo_state({
+            'type': 'filters',
+            'tag': comp.tag,
+            'image': comp.image_handle.acquire(),
+            'params': dict(comp.filter_params),
+        })
+
+        if is_identity(params):
+            result = base # Back to the unfiltered image, no copy needed
+        else:
+            result = ImageHandle(apply_filters(base.image, params))
+        comp.set_image(result)
+        comp.filter_params = params
+        comp.filter_result_revision = comp.image_revision
+        print(f"[INFO] Applied filters to '{comp.tag}'.")
+
+    def reset_filters(self):
+        """Clears the selected component's filter stack back to its unfiltered base."""
+        if not self._get_target(show_warning=True):
+            return
+        self._loading_vars = True
+        try:
+            for key, var in self.vars.items():
+                var.set(FILTER_DEFAULTS[key])
+        finally:
+            self._loading_vars = False
+        self.commit()
+
+    def restore_from_undo(self, state):
+        """Reverts a 'filters' undo entry."""
+        comp = self.app.components.get(state.get('tag'))
+        if not comp:
+            return
+        comp.set_image(state['image'])
+        comp.filter_params = state.get('params')
+        comp.filter_result_revision = comp.image_revision
+        self.load_params_for_selection()
@@ -0,0 +1,146 @@
+import math
+
+from PIL import Image, ImageEnhance, ImageFilter
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("[WARNING] NumPy not found. Filters will use slower PIL fallbacks and hue shifts are disabled.")
+
+# --- Filter Parameters ---
+# A filter stack is a plain dict so it can be stored on components, in undo entries and in
+# layout files. Every value at its default is a no-op.
+FILTER_DEFAULTS = {
+    "brightness": 0,      # -100..100, added to every channel
+    "contrast": 0,        # -100..100
+    "hue": 0,             # -180..180 degrees
+    "saturation": 0,      # -100..100 (-100 = greyscale)
+    "levels_black": 0,    # 0..254 input black point
+    "levels_white": 255,  # 1..255 input white point
+    "levels_gamma": 1.0,  # 0.1..5.0
+    "tint_color": "#ff7f50",
+    "tint_strength": 0,   # 0..100
+    "sharpen": 0,         # 0..100
+}
+
+# Luminance weights used by the CSS filter spec's saturate/hue-rotate matrices.
+_LUMA_R, _LUMA_G, _LUMA_B = 0.213, 0.715, 0.072
+
+
+def is_identity(params):
+    """True if `params` leaves images unchanged. The tint colour doesn't matter at zero strength."""
+    return all(params.get(key, default) == default for key, default in FILTER_DEFAULTS.items() if key != "tint_color")
+
+
+def _hex_to_rgb(color):
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def build_channel_luts(params):
+    """
+    Folds levels, brightness, contrast and tint into one 256-entry lookup table per RGB channel.
+    Returns a flat 1024-entry list for `Image.point` on an RGBA image (alpha is left as-is).
+    """
+    black = params.get("levels_black", 0)
+    white = max(black + 1, params.get("levels_white", 255))
+    gamma = max(0.01, params.get("levels_gamma", 1.0))
+    brightness = params.get("brightness", 0) * 2.55
+    contrast = params.get("contrast", 0) * 2.55
+    contrast_factor = (259 * (contrast + 255)) / (255 * (259 - contrast))
+    tint_rgb = _hex_to_rgb(params.get("tint_color", "#ffffff"))
+    tint_strength = params.get("tint_strength", 0) / 100.0
+
+    if NUMPY_AVAILABLE:
+        x = np.arange(256, dtype=np.float32)
+        x = np.clip((x - black) / (white - black), 0.0, 1.0) ** (1.0 / gamma) * 255.0
+        x = contrast_factor * (x + brightness - 128.0) + 128.0
+        luts = []
+        for channel_tint in tint_rgb:
+            channel = x * (1.0 - tint_strength + tint_strength * channel_tint / 255.0)
+            luts.append(np.clip(channel + 0.5, 0, 255).astype(np.uint8))
+        luts.append(np.arange(256, dtype=np.uint8))
+        return np.concatenate(luts).tolist()
+
+    # --- Fallback: the same curve in pure Python (still only 256 evaluations per channel) ---
+    base = []
+    for value in range(256):
+        v = min(1.0, max(0.0, (value - black) / (white - black))) ** (1.0 / gamma) * 255.0
+        base.append(contrast_factor * (v + brightness - 128.0) + 128.0)
+    lut = []
+    for channel_tint in tint_rgb:
+        scale = 1.0 - tint_strength + tint_strength * channel_tint / 255.0
+        lut.extend(int(min(255, max(0, v * scale + 0.5))) for v in base)
+    lut.extend(range(256))
+    return lut
+
+
+def color_matrix(params):
+    """
+    Returns the 3x3 matrix combining saturation and hue rotation (the luminance-preserving
+    matrices from the CSS filter spec), or None if both are at their defaults.
+    """
+    saturation = 1.0 + params.get("saturation", 0) / 100.0
+    hue = params.get("hue", 0)
+    if saturation == 1.0 and hue == 0:
+        return None
+
+    lr, lg, lb = _LUMA_R, _LUMA_G, _LUMA_B
+    s = saturation
+    sat = np.array([
+        [lr + (1 - lr) * s, lg - lg * s, lb - lb * s],
+        [lr - lr * s, lg + (1 - lg) * s, lb - lb * s],
+        [lr - lr * s, lg - lg * s, lb + (1 - lb) * s],
+    ], dtype=np.float32)
+
+    c, n = math.cos(math.radians(hue)), math.sin(math.radians(hue))
+    rot = np.array([
+        [lr + c * (1 - lr) - n * lr, lg - c * lg - n * lg, lb - c * lb + n * (1 - lb)],
+        [lr - c * lr + n * 0.143, lg + c * (1 - lg) + n * 0.140, lb - c * lb - n * 0.283],
+        [lr - c * lr - n * (1 - lr), lg - c * lg + n * lg, lb + c * (1 - lb) + n * lb],
+    ], dtype=np.float32) # Rows sum to 1, so greys stay grey
+    return rot @ sat
+
+
+def apply_filters(image, params):
+    """
+    Returns a new RGBA image with the filter stack applied: levels, brightness/contrast and tint
+    through per-channel LUTs, then hue/saturation as one matrix multiply, then sharpening.
+    The source image is not modified.
+    """
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    result = image.point(build_channel_luts(params))
+
+    if NUMPY_AVAILABLE:
+        matrix = color_matrix(params)
+        if matrix is not None:
+            pixels = np.array(result)
+            rgb = pixels[..., :3].reshape(-1, 3).astype(np.float32)
+            rgb = rgb @ matrix.T
+            np.add(rgb, 0.5, out=rgb)
+            np.clip(rgb, 0, 255, out=rgb)
+            pixels[..., :3] = rgb.reshape(pixels.shape[0], pixels.shape[1], 3)
+            result = Image.fromarray(pixels, "RGBA")
+    elif params.get("saturation", 0) != 0:
+        alpha = result.getchannel("A")
+        result = ImageEnhance.Color(result.convert("RGB")).enhance(1.0 + params["saturation"] / 100.0).convert("RGBA")
+        result.putalpha(alpha)
+
+    sharpen = params.get("sharpen", 0)
+    if sharpen > 0:
+        alpha = result.getchannel("A")
+        result = result.convert("RGB").filter(ImageFilter.UnsharpMask(radius=2, percent=int(sharpen * 2), threshold=2)).convert("RGBA")
+        result.putalpha(alpha)
+    return result
+
+
+def make_proxy(image, max_side=512):
+    """Returns a downscaled copy of `image` for interactive previews (or the image itself if it's small)."""
+    scale = max_side / max(image.width, image.height)
+    if scale >= 1.0:
+        return image
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.Resampling.BILINEAR)
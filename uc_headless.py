@@ -0,0 +1,335 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+from settings import SettingsManager # type: ignore
+from uc_blp import BLP1, BLP2, COMPRESSION_JPEG, COMPRESSION_PALETTE, NUMPY_AVAILABLE as NATIVE_BLP_AVAILABLE
+from uc_dds import MIP_BOX, MIP_LANCZOS, MODE_FAST, MODE_HQ, NUMPY_AVAILABLE as NATIVE_DDS_AVAILABLE
+from uc_export_worker import export_tile
+from uc_layout import PREVIEW_LAYOUT, load_layout_file, parse_border_file, render_point_border, scale_border_patch
+from utils import get_base_path
+
+# Headless rendering: composites a saved layout's tiles with preset border files and writes
+# PNG, DDS or BLP without creating any Tk windows, e.g. to build themes on a build server:
+#
+#   python uc_headless.py --image-set Human --layout layouts/mine.json --borders TopBorder.txt --format dds --workers 8
+#   python uc_headless.py --image-set "*" --borders TopBorder.txt --format blp --out themes
+#
+# Jobs are small dicts (file paths and world boxes); each worker process decodes its own tile
+# and renders the border files once, then hands the composited tile to the same
+# `export_tile` the editor's ExportManager uses. DDS always uses the built-in encoder here.
+# Several image sets (names or glob patterns) are exported as one batch: the tiles of all sets
+# share one pool, and border textures are rendered and scaled once per worker for every set.
+# This module must not import tkinter or the app.
+
+CONTENTS_DIR = os.path.join(get_base_path(), "contents", "ui creator")
+IMAGE_BASE_DIR = os.path.join(CONTENTS_DIR, "images")
+OUTPUT_DIR = os.path.join(CONTENTS_DIR, "output")
+LAYOUTS_DIR = os.path.join(CONTENTS_DIR, "layouts")
+PRESET_BORDERS_DIR = os.path.join(CONTENTS_DIR, "preset_borders")
+
+_worker_borders = {} # border file -> {tile tag: (border image, min_x, min_y)}, per worker process
+_worker_patches = {} # (border file, tile tag, tile box, target size) -> scaled patch, per worker process
+
+
+# --- Resolving Inputs ---
+def _resolve(path, base_dir):
+    """Returns `path` if it exists, otherwise `path` inside `base_dir` (the editor's content folders)."""
+    if os.path.exists(path) or os.path.isabs(path):
+        return path
+    return os.path.join(base_dir, path)
+
+
+def load_borders(border_files):
+    """Parses and renders border files. Returns {path: {tile tag: (image, min_x, min_y)}}."""
+    borders = {}
+    for path in border_files:
+        rendered = {}
+        for tile_tag, points in parse_border_file(path).items():
+            result = render_point_border(points)
+            if result:
+                rendered[tile_tag] = result
+        borders[path] = rendered
+    return borders
+
+
+def export_options(export_format, settings, overrides=None):
+    """Returns (dds_options, blp_options) from the editor's settings, with CLI `overrides` applied."""
+    overrides = {k: v for k, v in (overrides or {}).items() if v is not None}
+    dds_options = None
+    if export_format == 'dds':
+        dds_options = {
+            "mode": overrides.get("dds_quality", settings.get("dds_quality", MODE_FAST)),
+            "mipmaps": overrides.get("mipmaps", settings.get("dds_mipmaps", True)),
+            "mip_filter": overrides.get("mip_filter", settings.get("dds_mip_filter", MIP_BOX)),
+        }
+    blp_options = None
+    if export_format == 'blp':
+        blp_options = {
+            "version": overrides.get("blp_version", settings.get("blp_version", BLP1)),
+            "compression": overrides.get("blp_compression", settings.get("blp_compression", COMPRESSION_JPEG)),
+            "quality": overrides.get("jpeg_quality", settings.get("blp_jpeg_quality", 90)),
+            "mipmaps": overrides.get("mipmaps", settings.get("blp_mipmaps", True)),
+        }
+    return dds_options, blp_options
+
+
+def resolve_image_sets(patterns):
+    """
+    Returns the image set folders matching `patterns`: folders, or names / glob patterns of
+    sets in the editor's images folder. Sorted and without duplicates.
+    """
+    image_dirs = []
+    for pattern in patterns:
+        matches = [pattern] if os.path.isdir(pattern) else glob.glob(pattern) or glob.glob(os.path.join(IMAGE_BASE_DIR, pattern))
+        image_dirs.extend(os.path.normpath(path) for path in matches if os.path.isdir(path))
+    return sorted(set(image_dirs))
+
+
+def build_jobs(tile_boxes, image_dir, border_files, export_format, save_dir, dds_options=None, blp_options=None):
+    """
+    Returns (jobs, missing): one job per tile with an image in `image_dir`, and the tags whose
+    image is missing. `tile_boxes` maps tags to world boxes, as from `load_layout_file`.
+    Jobs are tagged with their image set's folder name.
+    """
+    jobs, missing = [], []
+    for tag, tile_box in tile_boxes.items():
+        image_path = os.path.join(image_dir, f"{tag}.png")
+        if not os.path.isfile(image_path):
+            missing.append(tag)
+            continue
+        jobs.append({
+            "tag": tag,
+            "set": os.path.basename(os.path.normpath(image_dir)),
+            "image_path": image_path,
+            "tile_box": tuple(tile_box),
+            "border_files": list(border_files),
+            "save_dir": save_dir,
+            "format": export_format,
+            "dds_options": dds_options,
+            "blp_options": blp_options,
+        })
+    return jobs, missing
+
+
+# --- Worker Side ---
+def init_worker(border_files):
+    """Process pool initializer: renders the border files once per worker."""
+    _worker_borders.clear()
+    _worker_patches.clear()
+    _worker_borders.update(load_borders(border_files))
+
+
+def _border_patches(job, target_size):
+    """
+    Returns the (patch, paste_x, paste_y) list for a job, scaled like the editor's border components.
+    Scaled patches are cached, so sets with same-sized tiles reuse them. Patches are only read
+    by the compositing code, never modified.
+    """
+    x1, y1 = job["tile_box"][0], job["tile_box"][1]
+    patches = []
+    for path in job["border_files"]:
+        key = (path, job["tag"], job["tile_box"], target_size)
+        if key not in _worker_patches:
+            if path not in _worker_borders: # Not pre-rendered (e.g. run without the initializer)
+                _worker_borders.update(load_borders([path]))
+            rendered = _worker_borders[path].get(job["tag"])
+            patch = None
+            if rendered:
+                border_img, min_x, min_y = rendered
+                border_box = (x1 + min_x, y1 + min_y, x1 + min_x + border_img.width, y1 + min_y + border_img.height)
+                patch = scale_border_patch(border_img, target_size, job["tile_box"], border_box)
+            _worker_patches[key] = patch if patch and patch[0] is not None else None
+        if _worker_patches[key]:
+            patches.append(_worker_patches[key])
+    return patches
+
+
+def run_job(job):
+    """Decodes, composites and saves one tile. Never raises; returns `export_tile`'s result dict plus timing."""
+    start = time.perf_counter()
+    try:
+        with Image.open(job["image_path"]) as source:
+            # The editor always holds RGBA (the image cache decodes to RGBA), so export RGBA too.
+            image = source.convert("RGBA") if source.mode != "RGBA" else source.copy()
+        task = {
+            "tag": job["tag"],
+            "image": image,
+            "borders": _border_patches(job, image.size),
+            "save_dir": job["save_dir"],
+            "stage_dir": None,
+            "format": job["format"],
+            "dds_options": job["dds_options"],
+            "blp_options": job["blp_options"],
+        }
+    except Exception as e:
+        result = {"tag": job["tag"], "path": job["image_path"], "error": f"{type(e).__name__}: {e}"}
+    else:
+        result = export_tile(task)
+    result["set"] = job.get("set")
+    result["seconds"] = time.perf_counter() - start
+    if not result["error"]:
+        result["bytes"] = os.path.getsize(result["path"])
+    return result
+
+
+def run_jobs(jobs, workers, border_files, on_result=None):
+    """Runs `jobs` on a process pool of `workers` and returns their results in completion order."""
+    results = []
+    if not jobs:
+        return results
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs))), initializer=init_worker, initargs=(list(border_files),)) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+# --- Batch Export ---
+def batch_export(image_dirs, tile_boxes, border_files, export_format, out_root, workers, dds_options=None, blp_options=None, on_result=None):
+    """
+    Exports every image set in `image_dirs` into `out_root/<set name>` on one process pool.
+    Returns one report per set, in `image_dirs` order: {"set", "dir", "save_dir", "exported",
+    "failed" [(tag, error)], "missing" [tags], "bytes", "cpu_seconds", "wall_seconds"}, where
+    `wall_seconds` runs from the batch start to the set's last finished tile.
+    """
+    reports, jobs = {}, []
+    for image_dir in image_dirs:
+        set_name = os.path.basename(os.path.normpath(image_dir))
+        save_dir = os.path.join(out_root, set_name)
+        set_jobs, missing = build_jobs(tile_boxes, image_dir, border_files, export_format, save_dir, dds_options, blp_options)
+        if set_jobs:
+            os.makedirs(save_dir, exist_ok=True)
+        reports[set_name] = {"set": set_name, "dir": image_dir, "save_dir": save_dir, "exported": 0, "failed": [],
+                             "missing": missing, "bytes": 0, "cpu_seconds": 0.0, "wall_seconds": 0.0}
+        jobs.extend(set_jobs)
+
+    start = time.perf_counter()
+
+    def collect(result):
+        report = reports[result["set"]]
+        report["cpu_seconds"] += result["seconds"]
+        report["wall_seconds"] = time.perf_counter() - start
+        if result["error"]:
+            report["failed"].append((result["tag"], result["error"]))
+        else:
+            report["exported"] += 1
+            report["bytes"] += result["bytes"]
+        if on_result:
+            on_result(result)
+
+    run_jobs(jobs, workers, border_files, on_result=collect)
+    return list(reports.values())
+
+
+def format_report(reports):
+    """Returns the per-set batch report as printable lines."""
+    lines = [f"{'Set':<24} {'Tiles':>7} {'Failed':>6} {'Size':>10} {'Wall':>8} {'CPU':>8}"]
+    for report in reports:
+        tiles = report["exported"] + len(report["failed"])
+        lines.append(f"{report['set'][:24]:<24} {report['exported']:>3}/{tiles:<3} {len(report['failed']):>6} "
+                     f"{report['bytes'] / (1024 * 1024):>8.2f}MB {report['wall_seconds']:>7.2f}s {report['cpu_seconds']:>7.2f}s")
+        for tag, error in report["failed"]:
+            lines.append(f"    [ERROR] {tag}: {error}")
+        if report["missing"]:
+            lines.append(f"    [WARNING] No image for: {', '.join(report['missing'])}")
+    return lines
+
+
+# --- Command Line ---
+def _print_result(result):
+    if result["error"]:
+        print(f"[ERROR] {result['set']}/{result['tag']}: {result['error']}")
+    else:
+        rmse = f", rmse {result['rmse']:.2f}" if "rmse" in result else ""
+        print(f"[INFO] {result['set']}/{result['tag']} -> {result['path']} ({result['seconds']:.2f}s{rmse})")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render a UI Creator layout and export its tiles without opening the editor.")
+    parser.add_argument("--image-set", "--image-sets", dest="image_sets", nargs="+", required=True,
+                        help="Image set folders, or names / glob patterns of sets in the editor's images folder.")
+    parser.add_argument("--layout", help="Saved layout JSON (default: the preview layout).")
+    parser.add_argument("--borders", nargs="*", default=[], help="Preset border .txt files (paths or names in preset_borders).")
+    parser.add_argument("--format", choices=["png", "dds", "blp"], default="png")
+    parser.add_argument("--out", help="Output folder (default: output/export_<format>); a single set is written directly into it, several sets into one subfolder each.")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: the export_workers setting, 0 = one per CPU core).")
+    parser.add_argument("--dds-quality", choices=[MODE_FAST, MODE_HQ])
+    parser.add_argument("--mip-filter", choices=[MIP_BOX, MIP_LANCZOS])
+    parser.add_argument("--no-mipmaps", dest="mipmaps", action="store_false", default=None)
+    parser.add_argument("--blp-version", choices=[BLP1, BLP2])
+    parser.add_argument("--blp-compression", choices=[COMPRESSION_JPEG, COMPRESSION_PALETTE])
+    parser.add_argument("--jpeg-quality", type=int)
+    return parser
+
+
+def default_workers(settings, requested=None):
+    workers = requested if requested is not None else settings.get("export_workers", 0)
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = SettingsManager()
+
+    if (args.format == 'dds' and not NATIVE_DDS_AVAILABLE) or (args.format == 'blp' and not NATIVE_BLP_AVAILABLE):
+        print(f"[ERROR] {args.format.upper()} export requires NumPy.")
+        return 2
+
+    image_dirs = resolve_image_sets(args.image_sets)
+    if not image_dirs:
+        print(f"[ERROR] No image sets match: {' '.join(args.image_sets)}")
+        return 2
+    try:
+        if args.layout:
+            tile_boxes = load_layout_file(_resolve(args.layout, LAYOUTS_DIR))
+        else:
+            tile_boxes = {tag: data["coords"] for tag, data in PREVIEW_LAYOUT.items()}
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not read layout: {e}")
+        return 2
+    border_files = [_resolve(path, PRESET_BORDERS_DIR) for path in args.borders]
+    for path in border_files:
+        if not os.path.isfile(path):
+            print(f"[ERROR] Border file not found: {path}")
+            return 2
+
+    out_root = args.out or os.path.join(OUTPUT_DIR, f"export_{args.format}")
+    dds_options, blp_options = export_options(args.format, settings, vars(args))
+    workers = default_workers(settings, args.workers)
+
+    if len(image_dirs) == 1:
+        image_dir = image_dirs[0]
+        os.makedirs(out_root, exist_ok=True)
+        jobs, missing = build_jobs(tile_boxes, image_dir, border_files, args.format, out_root, dds_options, blp_options)
+        for tag in missing:
+            print(f"[WARNING] No image for '{tag}' in {image_dir}; skipped.")
+        if not jobs:
+            print("[ERROR] No tiles to export.")
+            return 1
+        print(f"[INFO] Exporting {len(jobs)} tiles as {args.format.upper()} with {workers} worker(s)...")
+        start = time.perf_counter()
+        results = run_jobs(jobs, workers, border_files, on_result=_print_result)
+        failed = [r for r in results if r["error"]]
+        print(f"[INFO] Exported {len(results) - len(failed)} of {len(results)} tiles to {out_root} in {time.perf_counter() - start:.2f}s.")
+        return 1 if failed else 0
+
+    print(f"[INFO] Exporting {len(image_dirs)} image sets as {args.format.upper()} with {workers} worker(s)...")
+    start = time.perf_counter()
+    reports = batch_export(image_dirs, tile_boxes, border_files, args.format, out_root, workers, dds_options, blp_options, on_result=_print_result)
+    print(f"[INFO] Batch finished in {time.perf_counter() - start:.2f}s. Output: {out_root}")
+    for line in format_report(reports):
+        print(line)
+    failed = any(report["failed"] or not report["exported"] for report in reports)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from uc_image_handle import ImageHandle
+from uc_memory_budget import memory_budget
+from uc_pixel_cache import DEFAULT_BUDGET_MB as PIXEL_CACHE_BUDGET_MB, PixelDiskCache
+
+DEFAULT_BUDGET_MB = 256
+DIGEST_INDEX_NAME = "content_digests.json" # (path, mtime, size) -> content digest, kept with the disk tier
+
+
+class DecodedImageCache:
+    """
+    A process-wide cache of decoded RGBA images, keyed by (path, mtime, size, variant).
+
+    Entries are ImageHandles. The cache holds one reference to every entry, so any component
+    that edits a cached image gets a copy-on-write copy and the cached pixels stay pristine.
+    When the total decoded size exceeds the budget, the least recently used entries are evicted.
+    Editing a file on disk changes its mtime/size, so a stale entry is simply never hit again.
+
+    Misses fall through to an optional on-disk tier (see `attach_disk_cache`) before decoding
+    the PNG, and freshly decoded pixels are written back to it for the next launch.
+    The "full" variant is the image itself; other variants (e.g. dock thumbnails) are derived.
+    Thumbnails are stored on disk by content hash, so a copied or renamed asset reuses its entry.
+    Content digests are remembered per (path, mtime, size) across launches (see
+    `save_digest_index`), so an unchanged asset is never re-read just to find its entry.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict() # key -> ImageHandle, least recently used first
+        self._keys_by_path = {} # (normalized path, variant) -> current key, to drop stale versions
+        self._total_bytes = 0
+        self._pinned = set() # (normalized path, "full") of the image set on screen; never evicted
+        self._lock = threading.Lock()
+        self.disk_cache = None
+        self._digests = {} # normalized path -> [mtime_ns, size, content digest]
+        self._digests_dirty = False
+        self._digest_index_path = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    @staticmethod
+    def _make_key(path, variant="full"):
+        """Returns the cache key for `path`, or None if the file can't be stat'ed."""
+        norm_path = os.path.normcase(os.path.abspath(path))
+        try:
+            stat = os.stat(norm_path)
+        except OSError:
+            return None
+        return (norm_path, stat.st_mtime_ns, stat.st_size, variant)
+
+    def attach_disk_cache(self, cache_dir, budget_mb=PIXEL_CACHE_BUDGET_MB):
+        """Enables the persistent memory-mapped pixel tier stored in `cache_dir`, kept under `budget_mb`."""
+        self.disk_cache = PixelDiskCache(cache_dir, budget_mb * 1024 * 1024)
+        if self.disk_cache.enabled:
+            print(f"[INFO] Pixel cache enabled at: {cache_dir}")
+            self._digest_index_path = os.path.join(cache_dir, DIGEST_INDEX_NAME)
+            try:
+                with open(self._digest_index_path, "r") as f:
+                    self._digests = json.load(f)
+            except (OSError, ValueError):
+                self._digests = {}
+
+    def save_digest_index(self):
+        """Writes the content digest index next to the disk tier, if it changed. Called on exit."""
+        if self._digest_index_path is None or not self._digests_dirty:
+            return
+        with self._lock:
+            data = json.dumps(self._digests, separators=(",", ":"))
+            self._digests_dirty = False
+        temp_path = f"{self._digest_index_path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                f.write(data)
+            os.replace(temp_path, self._digest_index_path)
+        except OSError as e:
+            print(f"[WARNING] Could not save the image digest index: {e}")
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def set_budget_mb(self, budget_mb):
+        """Changes the memory budget and evicts entries until the cache fits."""
+        with self._lock:
+            self.budget_bytes = max(0, int(budget_mb * 1024 * 1024))
+            self._evict_to_budget()
+        self._report_usage()
+
+    def _report_usage(self):
+        """Reports the cache to the global memory budget as one regenerable pool. Call outside the lock."""
+        memory_budget.track("image_cache", self._total_bytes, self.trim)
+
+    def trim(self, fraction=0.5):
+        """Evicts least recently used entries until the cache is at most `fraction` of its current size."""
+        with self._lock:
+            target = int(self._total_bytes * fraction)
+            while self._total_bytes > target and self._entries:
+                self._remove(next(iter(self._entries)))
+        self._report_usage()
+
+    def get(self, path):
+        """
+        Returns an ImageHandle with the decoded RGBA pixels of `path`, decoding it on a miss.
+        Raises the usual PIL/OS errors if the file can't be read.
+        """
+        return self._get_variant(path, "full", self._decode)
+
+    def prefetch(self, path):
+        """
+        Decodes `path` into the cache ahead of time. Unlike `get`, the entry is dropped again
+        if it only fits by going over the budget, and nothing pinned is ever evicted for it.
+        """
+        key = self._make_key(path)
+        with self._lock:
+            if key is None or key in self._entries or self._pinned_bytes() >= self.budget_bytes:
+                return
+        self._get_variant(path, "full", self._decode, speculative=True)
+
+    def pin(self, paths):
+        """Protects the full-size entries of `paths` (the image set being shown) from eviction; replaces earlier pins."""
+        with self._lock:
+            self._pinned = {(os.path.normcase(os.path.abspath(path)), "full") for path in paths}
+
+    def unpin(self, path):
+        """Lets the entry of `path` be evicted again (e.g. a tiled copy now holds the pixels)."""
+        with self._lock:
+            self._pinned.discard((os.path.normcase(os.path.abspath(path)), "full"))
+
+    def _is_pinned(self, key):
+        return (key[0], key[3]) in self._pinned
+
+    def _pinned_bytes(self):
+        return sum(handle.nbytes for key, handle in self._entries.items() if self._is_pinned(key))
+
+    def get_thumbnail(self, path, max_size):
+        """
+        Returns an ImageHandle with a LANCZOS thumbnail of `path` fitting inside `max_size`.
+        The full-resolution pixels are decoded only on a disk-cache miss and are not kept.
+        """
+        width, height = int(max_size[0]), int(max_size[1])
+
+        def make_thumbnail(source_path):
+            thumbnail = self._decode(source_path)
+            thumbnail.thumbnail((width, height), Image.Resampling.LANCZOS)
+            return thumbnail
+
+        def content_key(source_path, key):
+            return (f"content:{self._content_digest(source_path, key)}", 0, key[2], key[3])
+
+        # Without a disk tier the content key would be computed for nothing.
+        disk_key = content_key if self.disk_cache is not None and self.disk_cache.enabled else None
+        return self._get_variant(path, f"thumb{width}x{height}", make_thumbnail, disk_key)
+
+    def _content_digest(self, path, key):
+        """
+        Returns a hex digest of the file's bytes. The digest from an earlier launch is reused while
+        the file's mtime and size (from the cache `key`) are unchanged; otherwise the file is
+        hashed, which is still far cheaper than decoding it.
+        """
+        norm_path, mtime_ns, size = key[0], key[1], key[2]
+        with self._lock:
+            entry = self._digests.get(norm_path)
+        if entry and entry[0] == mtime_ns and entry[1] == size:
+            return entry[2]
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._digests[norm_path] = [mtime_ns, size, digest.hexdigest()]
+            self._digests_dirty = True
+        return digest.hexdigest()
+
+    def _get_variant(self, path, variant, build, disk_key=None, speculative=False):
+        key = self._make_key(path, variant)
+        if key is None:
+            raise FileNotFoundError(f"Image not found: {path}")
+
+        with self._lock:
+            handle = self._entries.get(key)
+            if handle is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return handle
+
+        # Decode outside the lock so other threads aren't blocked by a slow PNG.
+        handle = ImageHandle(self._load_from_disk_tier(disk_key(path, key) if disk_key else key, path, build))
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None: # Another thread decoded it first
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return existing
+            self.misses += 1
+            self._insert(key, handle)
+            if speculative and self._total_bytes > self.budget_bytes:
+                self._remove(key) # Only fit by going over budget; not worth keeping
+        self._report_usage()
+        return handle
+
+    def _load_from_disk_tier(self, key, path, build):
+        """
+        Maps the pixels from the disk cache if it has a fresh entry, otherwise builds and stores them.
+        `key` is (name, mtime_ns, size, variant); the name is usually the source path.
+        """
+        norm_path, mtime_ns, size, variant = key
+        if self.disk_cache is not None:
+            image = self.disk_cache.load(norm_path, mtime_ns, size, variant)
+            if image is not None:
+                self.disk_hits += 1
+                return image
+        image = build(path)
+        if self.disk_cache is not None:
+            self.disk_cache.store(norm_path, mtime_ns, size, image, variant)
+        return image
+
+    @staticmethod
+    def _decode(path):
+        """Decodes `path` to RGBA."""
+        with Image.open(path) as img:
+            return img.convert("RGBA")
+
+    def _insert(self, key, handle):
+        path_key = (key[0], key[3])
+        stale_key = self._keys_by_path.get(path_key)
+        if stale_key is not None and stale_key != key:
+            self._remove(stale_key)
+        self._entries[key] = handle.acquire()
+        self._keys_by_path[path_key] = key
+        self._total_bytes += handle.nbytes
+        self._evict_to_budget()
+
+    def _remove(self, key):
+        handle = self._entries.pop(key, None)
+        if handle is None:
+            return
+        path_key = (key[0], key[3])
+        if self._keys_by_path.get(path_key) == key:
+            del self._keys_by_path[path_key]
+        self._total_bytes -= handle.nbytes
+        handle.release()
+
+    def _evict_to_budget(self):
+        # Least recently used first, skipping pinned entries. Always keep the most recent entry,
+        # even if it alone exceeds the budget.
+        if self._total_bytes <= self.budget_bytes:
+            return
+        newest_key = next(reversed(self._entries))
+        for key in [k for k in self._entries if k != newest_key and not self._is_pinned(k)]:
+            if self._total_bytes <= self.budget_bytes:
+                break
+            self._remove(key)
+
+    def invalidate(self, path):
+        """Drops every cached variant of `path` from memory."""
+        norm_path = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            for path_key, key in list(self._keys_by_path.items()):
+                if path_key[0] == norm_path:
+                    self._remove(key)
+        self._report_usage()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+        self._report_usage()
+
+    def stats(self):
+        """Returns a small dict describing the cache, for logging."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_mb": self._total_bytes / (1024 * 1024),
+                "budget_mb": self.budget_bytes / (1024 * 1024),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+            }
+
+
+# The shared, process-wide instance used by the loader, the dock and the border manager.
+image_cache = DecodedImageCache()
+
+
+def load_image(path):
+    """Returns a cached ImageHandle for the RGBA image at `path`."""
+    return image_cache.get(path)
+
+
+def load_thumbnail(path, max_size):
+    """Returns a cached ImageHandle for a thumbnail of the image at `path`."""
+    return image_cache.get_thumbnail(path, max_size)
@@ -0,0 +1,303 @@
+import hashlib
+import itertools
+import threading
+import weakref
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+from uc_memory_budget import memory_budget
+from uc_tiled_image import TiledImage
+
+
+def new_hasher():
+    """Returns an incremental 128-bit hasher (xxhash if installed, otherwise blake2b)."""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_bytes(data):
+    """Returns a fast 128-bit hex digest of `data`."""
+    hasher = new_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+class ImageHandle:
+    """
+    An immutable, reference-counted handle to a PIL image with copy-on-write semantics.
+
+    Handles are shared freely between components, clones and the undo stack: sharing only
+    bumps a reference count. Pixels are physically copied only when someone asks to write
+    to a handle that is shared (see `writable_image`). Every distinct pixel state carries a
+    unique revision number, so two handles with the same revision hold the same pixels.
+    A content hash of the raw pixels is computed on first request and cached per revision,
+    so equality checks between handles are O(1) after the first comparison.
+
+    The wrapped image must be treated as read-only by everyone holding the handle.
+
+    A handle may instead wrap a TiledImage (see uc_tiled_image) for very large textures. Then
+    `writable_tiled` copies only the tiles that are written, `image` assembles a PIL image on
+    demand (cached per revision), and `display_image` builds a view from per-tile mips.
+
+    A lazy handle (see `lazy`) knows its size, mode and content hash up front and decodes its
+    pixels on first access, e.g. when a component from a project file is first drawn.
+    """
+    _revision_counter = itertools.count(1)
+    _counter_lock = threading.Lock()
+
+    __slots__ = ("_image", "_tiled", "_assembled_revision", "_display_cache", "_ref_count", "_lock", "revision", "_content_hash", "_hash_revision",
+                 "_loader", "_lazy_size", "_lazy_mode", "__weakref__")
+
+    def __init__(self, pil_image):
+        if isinstance(pil_image, TiledImage):
+            self._tiled, self._image = pil_image, None
+        else:
+            self._tiled, self._image = None, pil_image
+        self._assembled_revision = None
+        self._display_cache = None # (revision, level, PIL image) for tiled handles
+        self._ref_count = 0
+        self._lock = threading.Lock()
+        self.revision = self._next_revision()
+        self._content_hash = None
+        self._hash_revision = None
+        self._loader = None
+        self._lazy_size = None
+        self._lazy_mode = None
+
+    @classmethod
+    def lazy(cls, loader, size, mode, content_hash=None):
+        """
+        Returns a handle whose pixels are produced by `loader()` (returning a PIL image of `size`
+        and `mode`) on first access. A known `content_hash` is trusted, so comparing and saving
+        the handle doesn't decode it.
+        """
+        handle = cls(None)
+        handle._loader, handle._lazy_size, handle._lazy_mode = loader, tuple(size), mode
+        if content_hash:
+            handle._content_hash, handle._hash_revision = content_hash, handle.revision
+        return handle
+
+    @property
+    def is_loaded(self):
+        return self._loader is None
+
+    def _ensure_loaded(self):
+        if self._loader is None:
+            return
+        with self._lock:
+            if self._loader is not None:
+                self._image = self._loader()
+                self._loader = None
+
+    @classmethod
+    def _next_revision(cls):
+        with cls._counter_lock:
+            return next(cls._revision_counter)
+
+    @classmethod
+    def wrap(cls, image_or_handle):
+        """Returns `image_or_handle` if it is already a handle, otherwise a new handle owning the image."""
+        if image_or_handle is None or isinstance(image_or_handle, ImageHandle):
+            return image_or_handle
+        return cls(image_or_handle)
+
+    # --- Read-only access ---
+    @property
+    def image(self):
+        """
+        The wrapped PIL image. Do not modify it in place; use `writable_image` instead.
+        For tiled handles this assembles the full image once per revision.
+        """
+        self._ensure_loaded()
+        if self._tiled is not None and self._assembled_revision != self.revision:
+            self._image = self._tiled.to_image()
+            self._assembled_revision = self.revision
+        return self._image
+
+    @property
+    def tiled(self):
+        """The TiledImage backing this handle, or None for an ordinary PIL image."""
+        return self._tiled
+
+    @property
+    def _pixels(self):
+        self._ensure_loaded()
+        return self._tiled if self._tiled is not None else self._image
+
+    @property
+    def size(self):
+        return self._lazy_size if self._loader is not None else self._pixels.size
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def mode(self):
+        return self._lazy_mode if self._loader is not None else self._pixels.mode
+
+    @property
+    def nbytes(self):
+        """
+        Approximate size of the pixel buffers in bytes (0 while a lazy handle is not decoded).
+        For tiled handles this includes the assembled full-size copy while `image` keeps one.
+        """
+        if self._loader is not None:
+            return 0
+        nbytes = 0
+        if self._image is not None:
+            nbytes += self._image.width * self._image.height * len(self._image.getbands())
+        if self._tiled is not None:
+            nbytes += self._tiled.nbytes
+        return nbytes
+
+    def display_image(self, target_w, target_h):
+        """
+        Returns an image at least (target_w, target_h) for on-screen drawing. Ordinary handles
+        return `image`; tiled handles assemble the coarsest adequate mip level, cached per revision.
+        """
+        if self._tiled is None:
+            return self.image
+        level = self._tiled.level_for_size(target_w, target_h)
+        cache = self._display_cache
+        if cache is None or cache[0] != self.revision or cache[1] != level:
+            cache = (self.revision, level, self._tiled.mip_image(level))
+            self._display_cache = cache
+            # A weak reference, so a tracked view never keeps a discarded handle alive.
+            handle_ref = weakref.ref(self, lambda _ref, key=("display", id(self)): memory_budget.forget(key))
+            memory_budget.track(("display", id(self)), cache[2].width * cache[2].height * 4, lambda: handle_ref() and handle_ref().drop_caches())
+        return cache[2]
+
+    def drop_caches(self):
+        """Drops regenerable data (the mip view and the assembled copy of a tiled image)."""
+        self._display_cache = None
+        if self._tiled is not None:
+            self._image = None
+            self._assembled_revision = None
+
+    # --- Identity ---
+    def content_hash(self):
+        """Returns a digest of the mode, size and raw pixels, computed once per revision."""
+        revision = self.revision
+        if self._hash_revision != revision:
+            self._ensure_loaded()
+            hasher = new_hasher()
+            hasher.update(f"{self.mode}:{self.width}x{self.height}:".encode("ascii"))
+            if self._tiled is not None:
+                # Hash row bands in raster order so tiled and plain copies of an image match.
+                for y in range(0, self.height, 256):
+                    hasher.update(self._tiled.read_region((0, y, self.width, min(self.height, y + 256))).tobytes())
+            else:
+                hasher.update(self._image.tobytes())
+            self._content_hash = hasher.hexdigest()
+            self._hash_revision = revision
+        return self._content_hash
+
+    # --- Reference counting ---
+    @property
+    def ref_count(self):
+        return self._ref_count
+
+    @property
+    def is_shared(self):
+        return self._ref_count > 1
+
+    def acquire(self):
+        """Registers a new holder of this handle and returns it, so `x = handle.acquire()` reads naturally."""
+        with self._lock:
+            self._ref_count += 1
+        return self
+
+    def release(self):
+        """Unregisters a holder. Releasing more often than acquiring is harmless."""
+        with self._lock:
+            if self._ref_count > 0:
+                self._ref_count -= 1
+
+    # --- Copy-on-write ---
+    def writable_image(self):
+        """
+        Returns (handle, image) where `image` may be modified in place and `handle` is the
+        handle that now owns it. If this handle is shared, the pixels are copied into a new,
+        unacquired handle; otherwise this handle is reused and given a new revision, which
+        also invalidates its cached content hash. Modify the image right away, before anything
+        else reads the hash.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if self._tiled is not None:
+                # A whole-image edit of a tiled texture leaves tiled storage.
+                assembled = self._tiled.to_image()
+                if self._ref_count > 1:
+                    private_copy = ImageHandle(assembled)
+                    return private_copy, assembled
+                self._tiled, self._image = None, assembled
+                self.revision = self._next_revision()
+                return self, assembled
+            if self._ref_count > 1:
+                private_copy = ImageHandle(self._image.copy())
+                return private_copy, private_copy._image
+            self.revision = self._next_revision()
+            return self, self._image
+
+    def writable_tiled(self):
+        """
+        Like `writable_image`, for tiled handles: returns (handle, tiled). If this handle is
+        shared, the new handle gets a tile-sharing snapshot, so only tiles that are actually
+        written get copied.
+        """
+        with self._lock:
+            if self._ref_count > 1:
+                private_copy = ImageHandle(self._tiled.snapshot())
+                return private_copy, private_copy._tiled
+            self.revision = self._next_revision()
+            self._image = None # Drop the assembled copy; it's stale now
+            return self, self._tiled
+
+    def __repr__(self):
+        w, h = self.size
+        kind = " tiled" if self._tiled is not None else ""
+        return f"<ImageHandle {w}x{h} {self.mode}{kind} rev={self.revision} refs={self._ref_count}>"
+
+
+def release_handles(obj):
+    """Releases every ImageHandle found in `obj` (a handle, or a dict/list/tuple containing handles)."""
+    if isinstance(obj, ImageHandle):
+        obj.release()
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            release_handles(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            release_handles(value)
+
+
+def images_identical(handle_a, handle_b):
+    """
+    O(1) pixel equality for two handles (either may be None): same handle and revision first,
+    then size/mode, then the cached content hashes.
+    """
+    if handle_a is None or handle_b is None:
+        return handle_a is handle_b
+    if handle_a is handle_b:
+        return True
+    if handle_a.size != handle_b.size or handle_a.mode != handle_b.mode:
+        return False
+    return handle_a.content_hash() == handle_b.content_hash()
+
+
+def as_pil_image(image_or_handle):
+    """Returns the PIL image for either a PIL image or an ImageHandle."""
+    if isinstance(image_or_handle, ImageHandle):
+        return image_or_handle.image
+    return image_or_handle
+
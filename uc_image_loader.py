@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from uc_image_cache import image_cache, load_image
+
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 2))
+POLL_INTERVAL_MS = 15
+
+
+class ImageSetLoader:
+    """
+    Decodes the tile images of an image set on a thread pool and hands them to the Tk thread
+    in a single batch, so switching sets never blocks the UI.
+
+    Only the most recent request is delivered; results of superseded requests are dropped.
+    After a set is delivered, its neighbours in `app.image_sets` are decoded in the background
+    so the next switch is served straight from the image cache. The set being shown is pinned
+    in the cache, so prefetching never evicts it.
+    """
+
+    def __init__(self, app, max_workers=DEFAULT_WORKERS):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uc-image-loader")
+        self.results = queue.Queue() # (generation, {tag: ImageHandle}, errors) from worker threads
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._pending_futures = []
+        self._prefetch_futures = []
+        self._poll_job = None
+
+    def load_set(self, base_dir, tags, on_loaded, set_name=None, prepare=None):
+        """
+        Starts decoding `{tag}.png` from `base_dir` for every tag. `on_loaded(images, errors)`
+        runs on the Tk thread once every image is ready; `images` maps tag -> ImageHandle.
+        `prepare(handle)`, if given, runs on the worker thread after decoding and returns the
+        handle to deliver (e.g. a tiled copy of a huge texture), keeping that work off the Tk thread.
+        """
+        with self._lock:
+            self.generation += 1
+            generation = self.generation
+            self._cancel_futures(self._pending_futures)
+            self._cancel_futures(self._prefetch_futures)
+
+        paths = {tag: os.path.join(base_dir, f"{tag}.png") for tag in tags}
+        paths = {tag: path for tag, path in paths.items() if os.path.exists(path)}
+        image_cache.pin(paths.values())
+        print(f"[INFO] Loading {len(paths)} images in the background from: {base_dir}")
+
+        images, errors = {}, {}
+        remaining = [len(paths)]
+        batch_lock = threading.Lock()
+
+        def on_done(tag, future):
+            # Runs on a worker thread. The last image to finish posts the whole batch.
+            with batch_lock:
+                if future.cancelled():
+                    return
+                error = future.exception()
+                if error is not None:
+                    errors[tag] = error
+                else:
+                    images[tag] = future.result()
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    self.results.put((generation, images, errors))
+
+        futures = []
+        for tag, path in paths.items():
+            future = self.executor.submit(self._load, path, prepare)
+            future.add_done_callback(lambda f, tag=tag: on_done(tag, f))
+            futures.append(future)
+        with self._lock:
+            self._pending_futures = futures
+
+        if not paths:
+            self.results.put((generation, images, errors))
+
+        self._start_polling(generation, on_loaded, tags, set_name)
+
+    @staticmethod
+    def _load(path, prepare):
+        handle = load_image(path)
+        if not prepare:
+            return handle
+        prepared = prepare(handle)
+        if prepared is not handle:
+            # The component gets its own (e.g. tiled) copy; keeping the decoded entry pinned
+            # as well would hold the texture in memory twice.
+            image_cache.unpin(path)
+        return prepared
+
+    def _start_polling(self, generation, on_loaded, tags, set_name):
+        if self._poll_job is not None:
+            self.app.master.after_cancel(self._poll_job)
+        self._poll_job = self.app.master.after(POLL_INTERVAL_MS, self._poll, generation, on_loaded, tags, set_name)
+
+    def _poll(self, generation, on_loaded, tags, set_name):
+        """Checks for a finished batch on the Tk thread without blocking it."""
+        self._poll_job = None
+        while True:
+            try:
+                result_generation, images, errors = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result_generation == generation:
+                on_loaded(images, errors)
+                if set_name:
+                    self.prefetch_neighbours(set_name, tags)
+                return
+            # Anything else belongs to a superseded request; drop it.
+        self._poll_job = self.app.master.after(POLL_INTERVAL_MS, self._poll, generation, on_loaded, tags, set_name)
+
+    def prefetch_neighbours(self, set_name, tags):
+        """Decodes the sets just before and after `set_name` into the image cache."""
+        image_sets = self.app.image_sets
+        if set_name not in image_sets:
+            return
+        index = image_sets.index(set_name)
+        neighbours = [image_sets[i] for i in (index + 1, index - 1) if 0 <= i < len(image_sets) and i != index]
+
+        futures = []
+        for neighbour in neighbours:
+            neighbour_dir = os.path.join(self.app.image_base_dir, neighbour)
+            for tag in tags:
+                path = os.path.join(neighbour_dir, f"{tag}.png")
+                if os.path.exists(path):
+                    futures.append(self.executor.submit(self._prefetch, path))
+        with self._lock:
+            self._prefetch_futures = futures
+        if futures:
+            print(f"[DEBUG] Prefetching {len(futures)} images from neighbouring sets: {', '.join(neighbours)}")
+
+    @staticmethod
+    def _prefetch(path):
+        try:
+            image_cache.prefetch(path)
+        except Exception as e:
+            print(f"[DEBUG] Prefetch failed for {path}: {e}")
+
+    @staticmethod
+    def _cancel_futures(futures):
+        for future in futures:
+            future.cancel() # Only jobs that haven't started yet are actually cancelled
+
+    def shutdown(self):
+        """Stops polling and discards queued work. Called when the app closes."""
+        if self._poll_job is not None:
+            self.app.master.after_cancel(self._poll_job)
+            self._poll_job = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,60 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk, ImageChops, ImageEnhance, ImageDraw
+import math
 import os
 
 from uc_component import DraggableComponent
+from uc_image_handle import ImageHandle, images_identical
+from uc_memory_budget import memory_budget
+from uc_image_cache import load_image, load_thumbnail
+from uc_blend import BLEND_MASK, BLEND_OVER, BLEND_OVER_DST_ALPHA, composite_patch
+from uc_layout import scale_border_patch
+
+# --- NEW: Lookup table for the semi-transparent decal preview ---
+# Identity on R, G and B; halves alpha. Applied with a single Image.point call.
+PREVIEW_FADE_LUT = list(range(256)) * 3 + [a // 2 for a in range(256)]
+
+
+def _rotation_matrix(w, h, angle):
+    """The inverse rotation matrix `Image.rotate` builds for a w x h image, about its centre."""
+    radians = -math.radians(angle % 360.0)
+    cos_a, sin_a = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    cx, cy = w / 2.0, h / 2.0
+    return cos_a, sin_a, cos_a * -cx + sin_a * -cy + cx, -sin_a, cos_a, -sin_a * -cx + cos_a * -cy + cy
+
+
+def rotated_bounds(w, h, angle):
+    """Returns the (width, height) `Image.rotate(angle, expand=True)` would produce for a w x h image."""
+    a, b, c, d, e, f = _rotation_matrix(w, h, angle)
+    corners = ((0, 0), (w, 0), (w, h), (0, h))
+    xs = [a * x + b * y + c for x, y in corners]
+    ys = [d * x + e * y + f for x, y in corners]
+    return math.ceil(max(xs)) - math.floor(min(xs)), math.ceil(max(ys)) - math.floor(min(ys))
+
+
+def transform_decal(source, scaled_w, scaled_h, angle, resample):
+    """
+    Scales `source` to (scaled_w, scaled_h) and rotates it by `angle` degrees (counter-clockwise,
+    expanding the canvas) in a single composed affine `Image.transform`, matching the output of
+    `source.resize(...).rotate(angle, expand=True)` without the intermediate image.
+    """
+    out_w, out_h = rotated_bounds(scaled_w, scaled_h, angle)
+    # Inverse mapping, output pixel -> scaled space: the same rotation `Image.rotate` uses,
+    # shifted so the expanded canvas stays centred...
+    a, b, c, d, e, f = _rotation_matrix(scaled_w, scaled_h, angle)
+    shift_x, shift_y = -(out_w - scaled_w) / 2.0, -(out_h - scaled_h) / 2.0
+    c, f = a * shift_x + b * shift_y + c, d * shift_x + e * shift_y + f
+    # ...then scaled space -> source pixel.
+    sx, sy = source.width / scaled_w, source.height / scaled_h
+    matrix = (a * sx, b * sx, c * sx, d * sy, e * sy, f * sy)
+    return source.transform((out_w, out_h), Image.Transform.AFFINE, matrix, resample)
+
 
 class ImageManager:
     """Manages loading, cloning, transforming, and applying image assets (decals)."""
+    DECAL_PROXY_MAX_SIDE = 512 # Longest side of the cached proxy used while dragging sliders
+
     def __init__(self, app):
         self.app = app
         self.canvas = app.canvas
@@ -24,17 +72,165 @@ class ImageManager:
         self.ignore_borders_on_stamp = tk.BooleanVar(value=False) # NEW: For the checkbox
         self.dock_assets = []
         self.next_clone_id = 0
+        self._decal_proxy_key = None # (tag, revision) of the image the cached proxy was built from
+        self._decal_proxy = None
+        self._dock_thumbnail_job = None # Pending after_idle call of `_load_visible_dock_thumbnails`
+        self._broken_dock_entries = set() # Tags of dock entries whose thumbnail failed to load
 
     def _are_images_identical(self, img1, img2):
-        """Helper to check if two PIL images are identical."""
+        """
+        Helper to check if two images are identical. ImageHandles are compared by revision
+        and cached content hash; plain PIL images fall back to a pixel diff.
+        """
+        if isinstance(img1, ImageHandle) or isinstance(img2, ImageHandle):
+            return images_identical(ImageHandle.wrap(img1), ImageHandle.wrap(img2))
         if img1 is None or img2 is None:
             return img1 == img2
         if img1.size != img2.size or img1.mode != img2.mode:
             return False
         return ImageChops.difference(img1, img2).getbbox() is None
 
-    def _load_asset_to_dock_generic(self, is_border: bool):
-        """Loads an image, scales it, and places it in the asset dock as a new draggable component."""
+    # --- Asset Dock Layout ---
+    # Each dock (images, borders) is an ordered grid. `self.dock_assets` holds the entries in
+    # order; an entry's slot is its position among the entries of the same dock type.
+    DOCK_ITEMS_PER_ROW = 4
+    DOCK_PADDING = 15
+    DOCK_ITEM_SIZE = 128
+    DOCK_PRELOAD_ROWS = 1 # Rows beyond the visible area whose thumbnails are loaded ahead of scrolling
+
+    def _dock_canvas_for(self, is_border):
+        return self.app.ui_manager.border_dock_canvas if is_border else self.app.ui_manager.image_dock_canvas
+
+    def _dock_entries(self, is_border):
+        """Returns the ordered entries of one dock."""
+        return [asset for asset in self.dock_assets if asset.is_border_asset == is_border]
+
+    def _dock_slot_position(self, index):
+        """Returns the top-left (x, y) of grid slot `index` on a dock canvas."""
+        col = index % self.DOCK_ITEMS_PER_ROW
+        row = index // self.DOCK_ITEMS_PER_ROW
+        step = self.DOCK_ITEM_SIZE + self.DOCK_PADDING
+        return self.DOCK_PADDING + col * step, self.DOCK_PADDING + row * step
+
+    def _move_dock_entry_to_slot(self, asset_comp, index, target_canvas):
+        """Moves all canvas items of one entry to slot `index`, if it isn't there already."""
+        x, y = self._dock_slot_position(index)
+        dx, dy = x - asset_comp.world_x1, y - asset_comp.world_y1
+        if dx == 0 and dy == 0:
+            return False
+        target_canvas.move(asset_comp.tag, dx, dy) # Image, delete circle and 'X' share the tag
+        asset_comp.world_x1, asset_comp.world_y1 = x, y
+        asset_comp.world_x2, asset_comp.world_y2 = x + self.DOCK_ITEM_SIZE, y + self.DOCK_ITEM_SIZE
+        return True
+
+    def _relayout_dock(self, is_border, start_index=0):
+        """Moves the entries from `start_index` onwards to their slots. Entries before it never move."""
+        target_canvas = self._dock_canvas_for(is_border)
+        entries = self._dock_entries(is_border)
+        moved = sum(1 for index in range(start_index, len(entries)) if self._move_dock_entry_to_slot(entries[index], index, target_canvas))
+        self._update_dock_scrollregion(target_canvas, len(entries))
+        self.schedule_dock_thumbnails()
+        return moved
+
+    def _update_dock_scrollregion(self, target_canvas, entry_count):
+        """Computes the scroll region from the grid size instead of querying every item's bbox."""
+        rows = (entry_count + self.DOCK_ITEMS_PER_ROW - 1) // self.DOCK_ITEMS_PER_ROW
+        step = self.DOCK_ITEM_SIZE + self.DOCK_PADDING
+        width = self.DOCK_PADDING + self.DOCK_ITEMS_PER_ROW * step
+        height = self.DOCK_PADDING + rows * step
+        target_canvas.config(scrollregion=(0, 0, width, height))
+
+    # --- Dock Thumbnails ---
+    # Entries are created without pixels; thumbnails are loaded once an entry is in (or near)
+    # the visible part of its dock, so a long dock doesn't read every asset at startup.
+    def schedule_dock_thumbnails(self):
+        """Loads the thumbnails that came into view, once the current event has been handled."""
+        if self._dock_thumbnail_job is None:
+            self._dock_thumbnail_job = self.app.master.after_idle(self._load_visible_dock_thumbnails)
+
+    def _load_visible_dock_thumbnails(self):
+        self._dock_thumbnail_job = None
+        step = self.DOCK_ITEM_SIZE + self.DOCK_PADDING
+        for is_border in (False, True):
+            target_canvas = self._dock_canvas_for(is_border)
+            if target_canvas is None:
+                continue
+            top = target_canvas.canvasy(0) - self.DOCK_PRELOAD_ROWS * step
+            bottom = target_canvas.canvasy(target_canvas.winfo_height()) + self.DOCK_PRELOAD_ROWS * step
+            for asset_comp in self._dock_entries(is_border):
+                if asset_comp.tk_image is not None or asset_comp.tag in self._broken_dock_entries:
+                    continue
+                if asset_comp.world_y2 < top or asset_comp.world_y1 > bottom:
+                    continue
+                try:
+                    self._load_dock_thumbnail(asset_comp, target_canvas)
+                except Exception as e:
+                    print(f"[ERROR] Could not load dock thumbnail '{asset_comp.image_path}': {e}")
+                    self._broken_dock_entries.add(asset_comp.tag)
+
+    def _load_dock_thumbnail(self, asset_comp, target_canvas):
+        """Shows the cached LANCZOS thumbnail of a dock entry; the entry shares the cache's handle."""
+        thumbnail = load_thumbnail(asset_comp.image_path, (self.DOCK_ITEM_SIZE, self.DOCK_ITEM_SIZE))
+        asset_comp.pil_image = thumbnail
+        asset_comp.preview_pil_image = thumbnail.image
+        asset_comp.tk_image = ImageTk.PhotoImage(asset_comp.preview_pil_image)
+        target_canvas.itemconfig(asset_comp.rect_id, image=asset_comp.tk_image)
+
+    def _create_dock_entry(self, image_path, is_border, index=None, lazy=False):
+        """
+        Creates a dock entry for `image_path` and inserts it at `index` within its dock
+        (appends by default). Only the entries after the insertion point are moved.
+        With `lazy`, the thumbnail is loaded when the entry scrolls into view.
+        """
+        asset_tag = f"dock_{'border' if is_border else 'asset'}_{self.next_dynamic_id}"
+        self.next_dynamic_id += 1
+
+        target_canvas = self._dock_canvas_for(is_border)
+        entries = self._dock_entries(is_border)
+        if index is None or index > len(entries):
+            index = len(entries)
+        x, y = self._dock_slot_position(index)
+        size = self.DOCK_ITEM_SIZE
+
+        asset_comp = DraggableComponent(self.app, asset_tag, x, y, x + size, y + size, "blue", "ASSET", is_dock_asset=True)
+        asset_comp.is_border_asset = is_border
+        asset_comp.image_path = image_path # FIX: Save the file path for persistence
+
+        # At most the thumbnail is loaded here; the full-resolution image is decoded on first clone.
+        asset_comp.rect_id = target_canvas.create_image(x, y, anchor=tk.NW, tags=(asset_tag,))
+        if not lazy:
+            try:
+                self._load_dock_thumbnail(asset_comp, target_canvas)
+            except Exception:
+                target_canvas.delete(asset_tag)
+                raise
+        target_canvas.tag_bind(asset_tag, '<Button-1>', lambda event, comp=asset_comp: self.handle_dock_asset_press(event, comp))
+        target_canvas.tag_bind(asset_tag, '<Button-3>', lambda event, comp=asset_comp: self._show_dock_entry_menu(event, comp))
+
+        # --- NEW: Add a delete 'X' button ---
+        delete_tag = f"delete_{asset_tag}"
+        # Create a small white circle background for the 'X'
+        target_canvas.create_oval(x, y, x + 14, y + 14, fill='white', outline='black', tags=(delete_tag, asset_tag))
+        # Create the 'X' text on top of the circle
+        target_canvas.create_text(x + 7, y + 7, text="X", fill="red", font=("Arial", 10, "bold"), tags=(delete_tag, asset_tag))
+        # Bind the click event to the delete function
+        target_canvas.tag_bind(delete_tag, '<Button-1>', lambda event, comp=asset_comp: self._delete_and_stop_propagation(comp))
+
+        # Insert into the ordered model right after the entry that precedes it in this dock.
+        if index < len(entries):
+            self.dock_assets.insert(self.dock_assets.index(entries[index]), asset_comp)
+            self._relayout_dock(is_border, index + 1)
+        else:
+            self.dock_assets.append(asset_comp)
+            self._update_dock_scrollregion(target_canvas, len(entries) + 1)
+            self.schedule_dock_thumbnails()
+        return asset_comp
+
+    def _load_asset_to_dock_generic(self, is_border: bool, index=None):
+        """
+        Loads an image, scales it, and places it in the asset dock as a new draggable component,
+        at `index` within the dock (appended by default).
+        """
         asset_type = "Border" if is_border else "Asset"
         image_path = filedialog.askopenfilename(
             title=f"Select {asset_type} Image",
@@ -45,53 +241,7 @@ class ImageManager:
             return
 
         try:
-            full_res_image = Image.open(image_path).convert("RGBA")
-            asset_tag = f"dock_{'border' if is_border else 'asset'}_{self.next_dynamic_id}"
-            self.next_dynamic_id += 1
-
-            if is_border:
-                target_canvas = self.app.ui_manager.border_dock_canvas
-                item_index = sum(1 for asset in self.dock_assets if asset.is_border_asset) # Use manager's list
-            else:
-                target_canvas = self.app.ui_manager.image_dock_canvas
-                item_index = sum(1 for asset in self.dock_assets if not asset.is_border_asset) # Use manager's list
-
-            items_per_row = 4
-            padding = 15
-            asset_width = 128
-            asset_height = 128
-
-            col = item_index % items_per_row
-            row = item_index // items_per_row
-            x, y = padding + col * (asset_width + padding), padding + row * (asset_height + padding)
-
-            asset_comp = DraggableComponent(self.app, asset_tag, x, y, x + asset_width, y + asset_height, "blue", "ASSET", is_dock_asset=True)
-            asset_comp.is_border_asset = is_border
-            asset_comp.image_path = image_path # FIX: Save the file path for persistence
-
-            target_canvas.tag_bind(asset_tag, '<Button-1>', 
-                lambda event, comp=asset_comp: self.handle_dock_asset_press(event, comp))
-
-            asset_comp.original_pil_image = full_res_image
-            asset_comp.preview_pil_image = full_res_image.copy()
-            asset_comp.preview_pil_image.thumbnail((int(asset_width), int(asset_height)), Image.Resampling.LANCZOS)
-            
-            asset_comp.tk_image = ImageTk.PhotoImage(asset_comp.preview_pil_image)
-            asset_comp.rect_id = target_canvas.create_image(x, y, anchor=tk.NW, image=asset_comp.tk_image, tags=(asset_tag,))
-            asset_comp.pil_image = asset_comp.preview_pil_image
-
-            # --- NEW: Add a delete 'X' button ---
-            delete_tag = f"delete_{asset_tag}"
-            # Create a small white circle background for the 'X'
-            target_canvas.create_oval(x, y, x + 14, y + 14, fill='white', outline='black', tags=(delete_tag, asset_tag))
-            # Create the 'X' text on top of the circle
-            target_canvas.create_text(x + 7, y + 7, text="X", fill="red", font=("Arial", 10, "bold"), tags=(delete_tag, asset_tag))
-
-            # Bind the click event to the delete function
-            target_canvas.tag_bind(delete_tag, '<Button-1>', lambda event, comp=asset_comp: self._delete_and_stop_propagation(comp))
-            self.dock_assets.append(asset_comp)
-            
-            target_canvas.config(scrollregion=target_canvas.bbox("all"))
+            self._create_dock_entry(image_path, is_border, index)
             print(f"{asset_type} '{os.path.basename(image_path)}' loaded into dock.")
             
             # --- NEW: Save settings immediately after adding an asset ---
@@ -107,45 +257,7 @@ class ImageManager:
             return
 
         try:
-            full_res_image = Image.open(image_path).convert("RGBA")
-            asset_tag = f"dock_{'border' if is_border else 'asset'}_{self.next_dynamic_id}"
-            self.next_dynamic_id += 1
-
-            if is_border:
-                target_canvas = self.app.ui_manager.border_dock_canvas
-                item_index = sum(1 for asset in self.dock_assets if asset.is_border_asset)
-            else:
-                target_canvas = self.app.ui_manager.image_dock_canvas
-                item_index = sum(1 for asset in self.dock_assets if not asset.is_border_asset)
-
-            items_per_row = 4
-            padding = 15
-            asset_width = 128
-            asset_height = 128
-
-            col = item_index % items_per_row
-            row = item_index // items_per_row
-            x, y = padding + col * (asset_width + padding), padding + row * (asset_height + padding)
-
-            asset_comp = DraggableComponent(self.app, asset_tag, x, y, x + asset_width, y + asset_height, "blue", "ASSET", is_dock_asset=True)
-            asset_comp.is_border_asset = is_border
-            asset_comp.image_path = image_path # Save the path
-
-            target_canvas.tag_bind(asset_tag, '<Button-1>', lambda event, comp=asset_comp: self.handle_dock_asset_press(event, comp))
-
-            asset_comp.original_pil_image = full_res_image
-            asset_comp.preview_pil_image = full_res_image.copy()
-            asset_comp.preview_pil_image.thumbnail((int(asset_width), int(asset_height)), Image.Resampling.LANCZOS)
-            asset_comp.tk_image = ImageTk.PhotoImage(asset_comp.preview_pil_image)
-            asset_comp.rect_id = target_canvas.create_image(x, y, anchor=tk.NW, image=asset_comp.tk_image, tags=(asset_tag,))
-            
-            # --- NEW: Add a delete 'X' button ---
-            delete_tag = f"delete_{asset_tag}"
-            target_canvas.create_oval(x, y, x + 14, y + 14, fill='white', outline='black', tags=(delete_tag, asset_tag))
-            target_canvas.create_text(x + 7, y + 7, text="X", fill="red", font=("Arial", 10, "bold"), tags=(delete_tag, asset_tag))
-            target_canvas.tag_bind(delete_tag, '<Button-1>', lambda event, comp=asset_comp: self._delete_and_stop_propagation(comp))
-            self.dock_assets.append(asset_comp)
-            target_canvas.config(scrollregion=target_canvas.bbox("all"))
+            self._create_dock_entry(image_path, is_border, lazy=True)
         except Exception as e:
             print(f"[ERROR] Failed to reload asset from path '{image_path}': {e}")
 
@@ -155,29 +267,49 @@ class ImageManager:
         return "break"
 
     def delete_dock_asset(self, asset_to_delete):
-        """Removes an asset from the dock and redraws the dock."""
-        if not asset_to_delete or not asset_to_delete.is_dock_asset:
+        """Removes an asset from the dock. Only the entries after it are moved up one slot."""
+        if not asset_to_delete or not asset_to_delete.is_dock_asset or asset_to_delete not in self.dock_assets:
             return
 
-        # Remove from the manager's list
-        if asset_to_delete in self.dock_assets:
-            self.dock_assets.remove(asset_to_delete)
+        is_border = asset_to_delete.is_border_asset
+        removed_index = self._dock_entries(is_border).index(asset_to_delete)
+        self.dock_assets.remove(asset_to_delete)
 
-        # Clear the relevant dock canvas
-        target_canvas = self.app.ui_manager.border_dock_canvas if asset_to_delete.is_border_asset else self.app.ui_manager.image_dock_canvas
-        target_canvas.delete("all")
+        self._dock_canvas_for(is_border).delete(asset_to_delete.tag)
+        asset_to_delete.tk_image = None
+        asset_to_delete.pil_image = None # Release the thumbnail handle
+        self._broken_dock_entries.discard(asset_to_delete.tag)
 
-        # Reload remaining assets for that dock type
-        assets_to_reload = [asset for asset in self.dock_assets if asset.is_border_asset == asset_to_delete.is_border_asset]
-        
-        # Temporarily remove them from the main list to avoid duplicates during reload
-        self.dock_assets = [asset for asset in self.dock_assets if asset.is_border_asset != asset_to_delete.is_border_asset]
+        moved = self._relayout_dock(is_border, removed_index)
 
-        for asset in assets_to_reload:
-            self.load_asset_from_path(asset.image_path, asset.is_border_asset)
+        self.app.save_settings()
+        print(f"Deleted asset '{asset_to_delete.tag}' from the dock ({moved} entries moved).")
+
+    def move_dock_asset(self, asset_comp, new_index):
+        """Reorders an entry within its dock. Only the entries between the old and new slot move."""
+        if asset_comp not in self.dock_assets:
+            return
+        is_border = asset_comp.is_border_asset
+        entries = self._dock_entries(is_border)
+        old_index = entries.index(asset_comp)
+        new_index = max(0, min(new_index, len(entries) - 1))
+        if new_index == old_index:
+            return
+
+        self.dock_assets.remove(asset_comp)
+        entries.pop(old_index)
+        if new_index < len(entries):
+            self.dock_assets.insert(self.dock_assets.index(entries[new_index]), asset_comp)
+        else:
+            self.dock_assets.insert(self.dock_assets.index(entries[-1]) + 1, asset_comp)
+
+        target_canvas = self._dock_canvas_for(is_border)
+        entries = self._dock_entries(is_border)
+        for index in range(min(old_index, new_index), max(old_index, new_index) + 1):
+            self._move_dock_entry_to_slot(entries[index], index, target_canvas)
+        self.schedule_dock_thumbnails()
 
         self.app.save_settings()
-        print(f"Deleted asset '{asset_to_delete.tag}' from the dock.")
 
     def apply_decal_to_underlying_layer(self):
         """Finds the active decal and stamps it onto any underlying components."""
@@ -189,11 +321,9 @@ class ImageManager:
         scale_factor = self.decal_scale.get() / 100.0
         rotation_angle = self.decal_rotation.get()
 
-        original_w, original_h = stamp_source_comp.original_pil_image.size
-        new_w = int(original_w * scale_factor)
-        new_h = int(original_h * scale_factor)
-        resized_image = stamp_source_comp.original_pil_image.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        decal_stamp_image = resized_image.rotate(rotation_angle, expand=True, resample=Image.Resampling.BICUBIC)
+        decal_stamp_image = self._render_decal_full_quality(stamp_source_comp.original_pil_image, scale_factor, rotation_angle)
+        if decal_stamp_image is None:
+            return
         stamp_w, stamp_h = decal_stamp_image.size
 
         stamp_cx = (stamp_source_comp.world_x1 + stamp_source_comp.world_x2) / 2
@@ -204,13 +334,13 @@ class ImageManager:
         stamp_world_y2 = stamp_world_y1 + stamp_h
 
         undo_data = {}
-        applied_count = 0
+        stamped = [] # (target, new image); set only after the undo state is saved
 
         # --- DEFINITIVE FIX: Iterate through all components to find targets ---
         # The previous logic was flawed. We must check every component to see if it's a valid target.
         for target_comp in self.app.components.values():
             # Skip if it's the stamp itself, a dock asset, or has no image to stamp onto.
-            if target_comp.tag == stamp_source_comp.tag or target_comp.is_dock_asset or not target_comp.pil_image:
+            if target_comp.tag == stamp_source_comp.tag or target_comp.is_dock_asset or not target_comp.image_handle:
                 continue
 
             # --- FIX: A target is a border if it's a preset OR a finalized smart border ---
@@ -226,23 +356,33 @@ class ImageManager:
             if self.only_affect_borders_on_stamp.get() and not is_target_a_border:
                 continue
 
+            # Share the current image with the undo stack before compositing. Because the
+            # handle is then shared, the composite writes into a copy-on-write copy.
+            before_handle = target_comp.image_handle.acquire()
+
             # Attempt to composite the decal onto this specific target component.
             final_image, applied = self._composite_decal_onto_image(target_comp, decal_stamp_image, stamp_world_x1, stamp_world_y1, stamp_world_x2, stamp_world_y2, stamp_source_comp.is_border_asset)
             
             if applied:
                 # If the composite was successful, save an undo state and apply the new image.
                 if target_comp.tag not in undo_data:
-                    undo_data[target_comp.tag] = target_comp.pil_image.copy()
-                target_comp.set_image(final_image)
-                applied_count += 1
-                print(f"Stamped decal onto layer '{target_comp.tag}'.")
+                    undo_data[target_comp.tag] = before_handle
+                else:
+                    before_handle.release()
+                stamped.append((target_comp, final_image))
+            else:
+                before_handle.release()
 
-        if applied_count == 0:
+        if not stamped:
             messagebox.showwarning("No Target", "Decal must be positioned over a valid layer to be applied.")
             return
 
-        if undo_data:
-            self.app._save_undo_state(undo_data)
+        # Save the undo state before changing any image, like every other image edit: the
+        # undo manager diffs it against the images as they are when the next action starts.
+        self.app._save_undo_state(undo_data)
+        for target_comp, final_image in stamped:
+            target_comp.set_image(final_image, redraw=False)
+            print(f"Stamped decal onto layer '{target_comp.tag}'.")
 
         self._remove_stamp_source_component(stamp_source_comp)
         self.app.redraw_all_zoomable()
@@ -250,7 +390,8 @@ class ImageManager:
     def _composite_decal_onto_image(self, target_comp, decal_stamp_image, stamp_world_x1, stamp_world_y1, stamp_world_x2, stamp_world_y2, is_border):
         """
         Helper function to composite a decal/stamp image onto a target component's image.
-        Returns the new composited image and a boolean indicating if a change was made.
+        Returns the image handle holding the result and a boolean indicating if a change was made.
+        The target's pixels are copied only if its handle is shared (copy-on-write).
         """
         # Calculate the intersection in WORLD coordinates
         intersect_x1 = max(stamp_world_x1, target_comp.world_x1)
@@ -264,10 +405,10 @@ class ImageManager:
             target_world_w = target_comp.world_x2 - target_comp.world_x1
             target_world_h = target_comp.world_y2 - target_comp.world_y1
             if target_world_w == 0 or target_world_h == 0:
-                return target_comp.pil_image, False
+                return target_comp.image_handle, False
 
-            scale_x = target_comp.pil_image.width / target_world_w
-            scale_y = target_comp.pil_image.height / target_world_h
+            scale_x = target_comp.image_handle.width / target_world_w # Size only; never assembles tiled images
+            scale_y = target_comp.image_handle.height / target_world_h
 
             paste_x = int((intersect_x1 - target_comp.world_x1) * scale_x)
             paste_y = int((intersect_y1 - target_comp.world_y1) * scale_y)
@@ -298,28 +439,30 @@ class ImageManager:
             if final_stamp_w > 0 and final_stamp_h > 0:
                 cropped_stamp = cropped_stamp.resize((final_stamp_w, final_stamp_h), Image.Resampling.LANCZOS)
 
-            final_image = target_comp.pil_image.copy()
-            decal_layer = Image.new("RGBA", final_image.size, (0, 0, 0, 0))
-            decal_layer.paste(cropped_stamp, (paste_x, paste_y))
-
-            # Conditionally respect transparency of the underlying tile
-            if not is_border:
-                comp_alpha_mask = final_image.getchannel('A')
-                combined_alpha = ImageChops.multiply(decal_layer.getchannel('A'), comp_alpha_mask)
-                decal_layer.putalpha(combined_alpha)
-                
-            final_image = Image.alpha_composite(final_image, decal_layer)
+            # --- OPTIMIZATION: Only touch the intersection rectangle ---
+            # Instead of building a full-size transparent decal layer and compositing whole
+            # images, we crop the affected region of the target, blend the stamp into it and
+            # paste it back. The per-pixel work is proportional to the stamp, not the tile.
+            blend_mode = BLEND_OVER if is_border else BLEND_OVER_DST_ALPHA # Conditionally respect transparency of the underlying tile
+            if target_comp.image_handle.tiled is not None:
+                # Tiled texture: only the tiles under the stamp are copied and written.
+                final_handle, tiled = target_comp.image_handle.writable_tiled()
+                tiled.composite_patch(cropped_stamp, paste_x, paste_y, blend_mode)
+            else:
+                final_handle, final_image = target_comp.image_handle.writable_image()
+                composite_patch(final_image, cropped_stamp, paste_x, paste_y, blend_mode)
 
             # Return the new image and True to indicate a change was made
-            return final_image, True
+            return final_handle, True
 
         # No overlap, return original image and False
-        return target_comp.pil_image, False
+        return target_comp.image_handle, False
 
-    def _composite_border_onto_image(self, image_to_composite_onto, target_comp, border_comp):
+    def _composite_border_onto_image(self, image_to_composite_onto, target_comp, border_comp, copy=True):
         """
         Composites a pre-rendered border component onto its parent tile's image.
         This is a simplified version for preset borders which are already correctly sized.
+        Pass `copy=False` when the caller owns `image_to_composite_onto` and it may be modified in place.
         """
         # The image to draw on is now passed in directly.
         target_img = image_to_composite_onto
@@ -331,41 +474,62 @@ class ImageManager:
         # The border's position is already calculated relative to the world.
         # We just need to find its offset from the parent tile's top-left corner.
         # The parent's image (target_img) is our canvas.
-        
-        # Calculate the offset in world coordinates
-        offset_x_world = border_comp.world_x1 - target_comp.world_x1
-        offset_y_world = border_comp.world_y1 - target_comp.world_y1
-
-        # --- DEFINITIVE FIX for EXPORT SCALING and POSITIONING ---
-        # 1. Calculate separate scale factors for width and height to handle non-square images correctly.
-        target_world_w = target_comp.world_x2 - target_comp.world_x1
-        target_world_h = target_comp.world_y2 - target_comp.world_y1
-        if target_world_w == 0 or target_world_h == 0: return target_img, False
-
-        scale_x = target_img.width / target_world_w
-        scale_y = target_img.height / target_world_h
-
-        # 2. Calculate the paste position in the target image's pixel space.
-        paste_x = int(offset_x_world * scale_x)
-        paste_y = int(offset_y_world * scale_y)
-
-        # 3. Resize the border image to match the target's pixel scale.
-        # --- DEFINITIVE FIX for off-by-one errors ---
-        # Use the border component's world dimensions for precise scaling.
-        border_w_pixels = int((border_comp.world_x2 - border_comp.world_x1) * scale_x)
-        border_h_pixels = int((border_comp.world_y2 - border_comp.world_y1) * scale_y)
-        resized_border_img = border_img.resize((border_w_pixels, border_h_pixels), Image.Resampling.LANCZOS)
-
-        final_image = target_img.copy()
-        final_image.paste(resized_border_img, (paste_x, paste_y), resized_border_img)
+        resized_border_img, paste_x, paste_y = self._get_border_patch(target_img.size, target_comp, border_comp)
+        if resized_border_img is None: return target_img, False
+
+        # Blend only the region covered by the border.
+        final_image = target_img.copy() if copy else target_img
+        composite_patch(final_image, resized_border_img, paste_x, paste_y, BLEND_MASK)
         return final_image, True
 
+    def _get_border_patch(self, target_size, target_comp, border_comp):
+        """
+        Returns (border_image, paste_x, paste_y): the border component's image scaled to the
+        pixel scale of a target image of `target_size`, and its position in that image.
+        Returns (None, 0, 0) if the geometry is degenerate.
+        """
+        tile_box = (target_comp.world_x1, target_comp.world_y1, target_comp.world_x2, target_comp.world_y2)
+        border_box = (border_comp.world_x1, border_comp.world_y1, border_comp.world_x2, border_comp.world_y2)
+        return scale_border_patch(border_comp.pil_image, target_size, tile_box, border_box)
+
     def schedule_transform_update(self, event=None):
         """Schedules a decal transformation update, debouncing slider events."""
         if self.transform_job:
             self.app.master.after_cancel(self.transform_job)
         self.transform_job = self.app.master.after(150, self._update_active_decal_transform)
 
+    def _render_decal_full_quality(self, original, scale_factor, rotation_angle):
+        """
+        Renders the decal at full resolution with one BICUBIC affine transform. Large downscales
+        are first reduced by an integer box filter so the transform never minifies by more than 2x.
+        """
+        new_w, new_h = int(original.width * scale_factor), int(original.height * scale_factor)
+        if new_w <= 0 or new_h <= 0:
+            return None
+        source = original
+        reduce_factor = int(min(original.width / new_w, original.height / new_h) / 2)
+        if reduce_factor >= 2:
+            source = original.reduce(reduce_factor)
+        return transform_decal(source, new_w, new_h, rotation_angle, Image.Resampling.BICUBIC)
+
+    def _get_decal_proxy(self, decal):
+        """Returns a cached downscaled copy of the decal's original image for slider previews."""
+        key = (decal.tag, decal.original_image_handle.revision)
+        if self._decal_proxy_key != key:
+            original = decal.original_pil_image
+            scale = self.DECAL_PROXY_MAX_SIDE / max(original.width, original.height)
+            if scale < 1.0:
+                proxy_size = (max(1, int(original.width * scale)), max(1, int(original.height * scale)))
+                self._decal_proxy = original.resize(proxy_size, Image.Resampling.BILINEAR)
+            else:
+                self._decal_proxy = original
+            self._decal_proxy_key = key
+            memory_budget.track("decal_proxy", self._decal_proxy.width * self._decal_proxy.height * 4, self._drop_decal_proxy)
+        return self._decal_proxy
+
+    def _drop_decal_proxy(self):
+        self._decal_proxy_key, self._decal_proxy = None, None
+
     def _update_active_decal_transform(self, event=None, use_fast_preview=False):
         """Applies resize and rotation transformations to the active decal."""
         if self.transform_job:
@@ -374,29 +538,29 @@ class ImageManager:
             self.transform_job = self.app.master.after(250, self._update_active_decal_transform)
 
         decal = self._find_topmost_stamp_source(show_warning=False, clone_type='any')
-        if not decal or not decal.original_pil_image:
+        if not decal or decal.original_image_handle is None:
             return
 
         scale_factor = self.decal_scale.get() / 100.0
         rotation_angle = self.decal_rotation.get()
 
-        original_w, original_h = decal.original_pil_image.size
+        original_w, original_h = decal.original_image_handle.size
         new_w, new_h = int(original_w * scale_factor), int(original_h * scale_factor)
 
         if new_w > 0 and new_h > 0:
-            resample_quality = Image.Resampling.NEAREST if use_fast_preview else Image.Resampling.LANCZOS
-            rotate_quality = Image.Resampling.NEAREST if use_fast_preview else Image.Resampling.BICUBIC
-
-            resized_image = decal.original_pil_image.resize((new_w, new_h), resample_quality)
-            rotated_image = resized_image.rotate(rotation_angle, expand=True, resample=rotate_quality)
-
-            alpha = rotated_image.getchannel('A')
-            semi_transparent_alpha = Image.eval(alpha, lambda a: a // 2)
-            display_image = rotated_image.copy()
-            display_image.putalpha(semi_transparent_alpha)
+            if use_fast_preview:
+                # While dragging: one BILINEAR affine pass over the small cached proxy. The draw
+                # loop scales the result to the decal's on-screen size.
+                proxy = self._get_decal_proxy(decal)
+                proxy_scale = proxy.width / original_w
+                transformed = transform_decal(proxy, max(1, int(new_w * proxy_scale)), max(1, int(new_h * proxy_scale)),
+                                              rotation_angle, Image.Resampling.BILINEAR)
+            else:
+                transformed = self._render_decal_full_quality(decal.original_pil_image, scale_factor, rotation_angle)
+            display_image = transformed.point(PREVIEW_FADE_LUT) # Halve alpha via LUT
 
             # Update the component's world coordinates to match the new visual size
-            final_w, final_h = rotated_image.size
+            final_w, final_h = rotated_bounds(new_w, new_h, rotation_angle)
             cx = (decal.world_x1 + decal.world_x2) / 2
             cy = (decal.world_y1 + decal.world_y2) / 2
             decal.world_x1 = cx - final_w / 2
@@ -430,7 +594,7 @@ class ImageManager:
             tag = tags[0]
             if tag in self.app.components:
                 comp = self.app.components[tag]
-                if comp.is_draggable and comp.pil_image and not comp.is_dock_asset:
+                if comp.is_draggable and comp.image_handle and not comp.is_dock_asset:
                     if clone_type == 'any' and (tag.startswith('clone_') or tag.startswith('border_')):
                         return comp
                     if tag.startswith(prefix):
@@ -447,8 +611,33 @@ class ImageManager:
         self.canvas.delete(comp_to_remove.tag)
         if comp_to_remove.tag in self.app.components:
             del self.app.components[comp_to_remove.tag]
+        comp_to_remove.release_images() # Undo keeps its own references (see `_component_snapshot`)
+        memory_budget.forget(("tk_image", comp_to_remove.tag))
         self.app.redraw_all_zoomable()
 
+    def _show_dock_entry_menu(self, event, asset_comp):
+        """Right-click menu of a dock entry: reorder it, insert a new asset before it, or delete it."""
+        if asset_comp not in self.dock_assets:
+            return
+        is_border = asset_comp.is_border_asset
+        index = self._dock_entries(is_border).index(asset_comp)
+        last_index = len(self._dock_entries(is_border)) - 1
+        asset_type = "Border" if is_border else "Asset"
+
+        menu = tk.Menu(event.widget, tearoff=0)
+        menu.add_command(label="Move to Start", state='normal' if index > 0 else 'disabled', command=lambda: self.move_dock_asset(asset_comp, 0))
+        menu.add_command(label="Move Left", state='normal' if index > 0 else 'disabled', command=lambda: self.move_dock_asset(asset_comp, index - 1))
+        menu.add_command(label="Move Right", state='normal' if index < last_index else 'disabled', command=lambda: self.move_dock_asset(asset_comp, index + 1))
+        menu.add_command(label="Move to End", state='normal' if index < last_index else 'disabled', command=lambda: self.move_dock_asset(asset_comp, last_index))
+        menu.add_separator()
+        menu.add_command(label=f"Insert {asset_type} Here...", command=lambda: self._load_asset_to_dock_generic(is_border, index))
+        menu.add_command(label="Delete", command=lambda: self.delete_dock_asset(asset_comp))
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+        return "break"
+
     def load_asset_to_dock(self):
         """Loads a regular image to the asset dock."""
         self._load_asset_to_dock_generic(is_border=False)
@@ -466,9 +655,25 @@ class ImageManager:
         corrected_event.x, corrected_event.y = main_canvas_x, main_canvas_y
         self.create_clone_from_asset(asset_comp, corrected_event)
 
+    def _get_full_resolution_handle(self, asset_comp):
+        """
+        Returns the full-resolution image handle for a dock asset, decoding it on demand.
+        Dock items only keep their thumbnail; the full image lives in the shared image cache.
+        """
+        if asset_comp.original_image_handle:
+            return asset_comp.original_image_handle
+        if not asset_comp.image_path:
+            return None
+        try:
+            return load_image(asset_comp.image_path)
+        except Exception as e:
+            print(f"[ERROR] Could not load full-resolution image '{asset_comp.image_path}': {e}")
+            return None
+
     def create_clone_from_asset(self, asset_comp, event):
         """Creates a new draggable component by cloning an asset from the dock."""
-        if not asset_comp.original_pil_image:
+        full_res_handle = self._get_full_resolution_handle(asset_comp)
+        if not full_res_handle:
             return
 
         clone_prefix = "border_" if asset_comp.is_border_asset else "clone_"
@@ -485,23 +690,20 @@ class ImageManager:
         center_y_screen = self.app.CANVAS_HEIGHT / 2
         # 2. Convert the screen center to world coordinates to respect pan/zoom.
         world_x, world_y = self.app.camera.screen_to_world(center_x_screen, center_y_screen)
-        w, h = asset_comp.original_pil_image.size
+        w, h = full_res_handle.size
         clone_comp = DraggableComponent(self.app, clone_tag, world_x - w/2, world_y - h/2, world_x + w/2, world_y + h/2, "green", clone_tag)
 
         # --- DEFINITIVE FIX: Create the transparent preview BEFORE drawing ---
         # 1. Set the clone's core properties.
         clone_comp.is_border_asset = asset_comp.is_border_asset
         clone_comp.is_decal = True
-        clone_comp.original_pil_image = asset_comp.original_pil_image.copy()
-        clone_comp.pil_image = clone_comp.original_pil_image.copy()
+        # The clone shares the asset's pixels; nothing is copied until they change.
+        clone_comp.original_pil_image = full_res_handle
+        clone_comp.pil_image = full_res_handle
 
         # 2. Generate the initial semi-transparent display image.
         # This is the same logic from _update_active_decal_transform, but applied immediately.
-        alpha = clone_comp.original_pil_image.getchannel('A')
-        semi_transparent_alpha = Image.eval(alpha, lambda a: a // 2)
-        display_image = clone_comp.original_pil_image.copy()
-        display_image.putalpha(semi_transparent_alpha)
-        clone_comp.display_pil_image = display_image # Set the transparent image
+        clone_comp.display_pil_image = clone_comp.original_pil_image.point(PREVIEW_FADE_LUT) # Set the transparent image
 
         # 3. Now, add the fully prepared component to the app and draw it.
         self.app.components[clone_tag] = clone_comp
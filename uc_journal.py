@@ -0,0 +1,433 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from tkinter import messagebox
+
+from PIL import Image
+
+from uc_component import DraggableComponent
+from uc_memory_budget import memory_budget
+from uc_project import ProjectArchive
+
+# --- Autosave Journal ---
+# The journal directory holds:
+#   snapshot.json - the full editor state at the last compaction
+#   journal.log   - one JSON record per line for every change since that snapshot
+#   blobs/        - component images as PNG, named by content hash (shared by all records)
+# Records:
+#   {"op": "component", "tag", "box", "decal", "border_asset", "parent", "color", "text", "hash"}
+#       a component was added, moved, resized or got a new image ("hash" is None for placeholders;
+#       an optional "project" path means the image is read from that project file, not blobs/)
+#   {"op": "remove", "tag"}
+#   {"op": "points", "add": [[x, y], ...], "remove": [[x, y], ...]}   smart border stroke deltas
+# A clean exit deletes the directory, so anything found at launch is left over from a crash.
+SNAPSHOT_NAME = "snapshot.json"
+LOG_NAME = "journal.log"
+BLOBS_DIR = "blobs"
+JOURNAL_VERSION = 1
+
+
+def _atomic_write(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_journal(journal_dir):
+    """
+    Replays the snapshot and log in `journal_dir`. Returns (components, points): components
+    maps tags to their last recorded data, points is the smart border point list or None if
+    never recorded. Returns (None, None) if there is nothing to recover. A torn last line
+    (from a crash mid-write) is ignored.
+    """
+    snapshot_path = os.path.join(journal_dir, SNAPSHOT_NAME)
+    log_path = os.path.join(journal_dir, LOG_NAME)
+    components, points, found = {}, None, False
+    try:
+        with open(snapshot_path, "r") as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") == JOURNAL_VERSION:
+            components = snapshot.get("components", {})
+            points = snapshot.get("points")
+            found = True
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open(log_path, "r") as f:
+            lines = f.readlines()
+    except OSError:
+        lines = []
+    point_set = set(map(tuple, points)) if points is not None else None
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        op = record.pop("op", None)
+        if op == "component":
+            components[record["tag"]] = record
+        elif op == "remove":
+            components.pop(record["tag"], None)
+        elif op == "points":
+            point_set = point_set if point_set is not None else set()
+            point_set.difference_update(map(tuple, record.get("remove", [])))
+            point_set.update(map(tuple, record.get("add", [])))
+        else:
+            continue
+        found = True
+    if not found:
+        return None, None
+    return components, sorted(point_set) if point_set is not None else None
+
+
+def blob_path(journal_dir, content_hash):
+    return os.path.join(journal_dir, BLOBS_DIR, f"{content_hash}.png")
+
+
+class JournalWriter:
+    """
+    Appends journal records on a background thread. The Tk thread only enqueues: records hold
+    acquired image handles (copy-on-write keeps their pixels fixed), and the writer hashes
+    them, stores missing blobs, appends the record and releases the handles. Snapshots go
+    through the same queue, so they stay ordered with the records around them.
+    """
+
+    def __init__(self, journal_dir):
+        self.journal_dir = journal_dir
+        self._queue = queue.Queue()
+        self._thread = None
+        self._written_blobs = set()
+        self.records_since_snapshot = 0
+
+    def start(self):
+        os.makedirs(os.path.join(self.journal_dir, BLOBS_DIR), exist_ok=True)
+        self._written_blobs = {name[:-4] for name in os.listdir(os.path.join(self.journal_dir, BLOBS_DIR)) if name.endswith(".png")}
+        self._thread = threading.Thread(target=self._run, name="uc-journal", daemon=True)
+        self._thread.start()
+
+    # --- Called from the Tk thread ---
+    def append(self, record, handles=None):
+        """
+        Queues a record. `handles` maps record keys ("hash", "original") to handles acquired by
+        the caller; each one's content hash is filled in under its key.
+        """
+        self.records_since_snapshot += 1
+        self._queue.put(("record", record, handles))
+
+    def snapshot(self, components, points):
+        """Queues a compaction: `components` maps tags to (record, {key: acquired handle})."""
+        self.records_since_snapshot = 0
+        self._queue.put(("snapshot", components, points))
+
+    def close(self, timeout=5.0):
+        """Flushes queued records and stops the thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # --- Writer thread ---
+    def _store_blob(self, handle):
+        content_hash = handle.content_hash()
+        if content_hash not in self._written_blobs:
+            path = blob_path(self.journal_dir, content_hash)
+            temp_path = f"{path}.tmp"
+            handle.image.save(temp_path, format="PNG", compress_level=1)
+            os.replace(temp_path, path)
+            self._written_blobs.add(content_hash)
+        return content_hash
+
+    def _run(self):
+        log_path = os.path.join(self.journal_dir, LOG_NAME)
+        log = open(log_path, "a")
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                # Drain whatever else is queued, then flush once.
+                while item is not None:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+                stop = False
+                for item in batch:
+                    if item is None:
+                        stop = True
+                        continue
+                    try:
+                        if item[0] == "record":
+                            self._write_record(log, item[1], item[2])
+                        else:
+                            log = self._write_snapshot(log, log_path, item[1], item[2])
+                    except Exception as e:
+                        print(f"[WARNING] Autosave journal: could not write a record: {e}")
+                log.flush()
+                os.fsync(log.fileno())
+                if stop:
+                    return
+        finally:
+            log.close()
+
+    def _store_blobs(self, record, handles):
+        """Stores each handle's blob and fills in its hash under its record key."""
+        for key, handle in (handles or {}).items():
+            record[key] = self._store_blob(handle)
+
+    def _release_handles(self, handles):
+        for handle in (handles or {}).values():
+            handle.release()
+
+    def _write_record(self, log, record, handles):
+        try:
+            self._store_blobs(record, handles)
+        finally:
+            self._release_handles(handles)
+        log.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _write_snapshot(self, log, log_path, components, points):
+        data = {}
+        try:
+            for tag, (record, handles) in components.items():
+                self._store_blobs(record, handles)
+                data[tag] = record
+        finally:
+            for record, handles in components.values():
+                self._release_handles(handles)
+        snapshot = {"version": JOURNAL_VERSION, "time": time.time(), "components": data, "points": points}
+        _atomic_write(os.path.join(self.journal_dir, SNAPSHOT_NAME), json.dumps(snapshot, separators=(",", ":")))
+
+        # The snapshot covers everything logged so far: start a new log and drop unreferenced blobs.
+        log.close()
+        log = open(log_path, "w")
+        referenced = {record.get(key) for record in data.values() for key in ("hash", "original")}
+        for content_hash in list(self._written_blobs - referenced):
+            try:
+                os.remove(blob_path(self.journal_dir, content_hash))
+            except OSError:
+                pass
+            self._written_blobs.discard(content_hash)
+        return log
+
+
+class JournalManager:
+    """
+    Autosaves the UI Creator's work to an append-only journal (see `JournalWriter`) and offers
+    to replay it after a crash.
+
+    Instead of hooking every edit, the Tk thread compares the components and smart border
+    points with what was last journaled once per interval; that check only reads positions
+    and image revisions (plus a set difference for the border points), so it never waits on
+    disk. Records for moves, resizes, image changes (by content hash), added and removed
+    components and border stroke deltas are then handed to the writer thread. The log is
+    compacted into a snapshot every `COMPACT_EVERY_RECORDS` records or `COMPACT_INTERVAL_S`.
+    """
+    POLL_INTERVAL_MS = 1000
+    COMPACT_EVERY_RECORDS = 500
+    COMPACT_INTERVAL_S = 300
+
+    def __init__(self, app, journal_dir):
+        self.app = app
+        self.journal_dir = journal_dir
+        self.enabled = bool(app.settings_manager.get("autosave_journal", True))
+        self._writer = None
+        self._journaled = {} # tag -> (box, image revision, decal, border asset, parent)
+        self._points = None # frozenset of journaled smart border points
+        self._last_snapshot = 0.0
+        self._after_id = None
+
+    # --- Startup ---
+    def start(self):
+        """Offers to recover a crashed session, then starts journaling. Call once the first image set has loaded."""
+        if not self.enabled or self._writer is not None:
+            return
+        components, points = read_journal(self.journal_dir)
+        if components is not None:
+            if messagebox.askyesno("Recover Session", "The UI Creator did not shut down cleanly last time.\n\nRestore the unsaved work from the autosave journal?"):
+                self._replay(components, points)
+        shutil.rmtree(self.journal_dir, ignore_errors=True) # Recovered work is in the new baseline snapshot
+        self._writer = JournalWriter(self.journal_dir)
+        self._writer.start()
+        self._compact()
+        self._after_id = self.app.master.after(self.POLL_INTERVAL_MS, self._poll)
+        print(f"[INFO] Autosave journal started in {self.journal_dir}")
+
+    def _replay(self, components, points):
+        """Applies recovered state to the editor and redraws once."""
+        app = self.app
+        restored = 0
+        projects = {} # Project files referenced by records, opened once each
+        for tag, data in components.items():
+            comp = app.components.get(tag)
+            if comp is None:
+                comp = DraggableComponent(app, tag, *data["box"], data.get("color"), data.get("text"))
+                app.components[tag] = comp
+                app._bind_component_events(tag)
+            else:
+                comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2 = data["box"]
+            comp.is_decal = data.get("decal", False)
+            comp.is_border_asset = data.get("border_asset", False)
+            comp.parent_tag = data.get("parent")
+            content_hash = data.get("hash")
+            if content_hash and (comp.image_handle is None or comp.image_handle.content_hash() != content_hash):
+                image = self._recovered_image(content_hash, data.get("project"), projects)
+                if image is not None:
+                    comp.release_filter_base() # Filtered from the image being replaced
+                    comp.set_image(image, redraw=False)
+                else:
+                    print(f"[WARNING] Autosave journal: missing image for '{tag}'.")
+            original_hash = data.get("original")
+            if original_hash and original_hash == content_hash and comp.image_handle is not None:
+                comp.original_pil_image = comp.image_handle # Shared copy-on-write, as when it was loaded
+            elif original_hash and (comp.original_image_handle is None or comp.original_image_handle.content_hash() != original_hash):
+                original = self._recovered_image(original_hash, data.get("project"), projects)
+                if original is not None:
+                    comp.original_pil_image = original
+                else:
+                    print(f"[WARNING] Autosave journal: missing original image for '{tag}'.")
+            # Records from older journals (or a lost blob) have no original: fall back to the
+            # recovered image, so clones and borders can still be re-rendered and reset.
+            if comp.original_image_handle is None and comp.image_handle is not None:
+                comp.original_pil_image = comp.image_handle
+            restored += 1
+
+        for tag in [t for t, c in app.components.items() if t not in components and not c.is_dock_asset]:
+            comp = app.components.pop(tag)
+            app.canvas.delete(comp.tag)
+            if comp.rect_id: app.canvas.delete(comp.rect_id)
+            comp.release_images()
+            memory_budget.forget(("tk_image", tag))
+
+        if points is not None:
+            smart_manager = app.border_manager.smart_manager
+            smart_manager.raw_border_points = set(map(tuple, points))
+            smart_manager._rebuild_quadtree()
+            smart_manager._update_highlights()
+        app.redraw_all_zoomable()
+        print(f"[INFO] Autosave journal: restored {restored} components.")
+
+    def _recovered_image(self, content_hash, project_path, projects):
+        """Returns the image for a recovered record: its journal blob, or a lazy handle into the project it came from."""
+        try:
+            with Image.open(blob_path(self.journal_dir, content_hash)) as blob:
+                blob.load()
+                return blob.copy()
+        except OSError:
+            pass
+        if not project_path:
+            return None
+        if project_path not in projects:
+            try:
+                projects[project_path] = ProjectArchive.open(project_path)
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Autosave journal: could not open project {project_path}: {e}")
+                projects[project_path] = None
+        archive = projects[project_path]
+        return archive.lazy_handle(content_hash) if archive else None
+
+    # --- Change detection (Tk thread) ---
+    def _component_state(self, comp):
+        revision = comp.image_handle.revision if comp.image_handle else None
+        original = comp.original_image_handle
+        original_state = (id(original), original.revision) if original else None
+        return ((comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2), revision, original_state,
+                comp.is_decal, comp.is_border_asset, comp.parent_tag)
+
+    def _component_record(self, comp):
+        return {
+            "op": "component", "tag": comp.tag,
+            "box": [comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2],
+            "decal": comp.is_decal, "border_asset": comp.is_border_asset, "parent": comp.parent_tag,
+            "color": comp.placeholder_color, "text": comp.placeholder_text, "hash": None, "original": None,
+        }
+
+    def _image_refs(self, comp, record):
+        """
+        Returns {record key: acquired handle} for the images the writer should store for `comp`:
+        its image as "hash" and its original as "original". Images opened from a project file
+        that haven't been decoded yet are recorded by hash and project path instead, so
+        journaling never forces a decode (or a PNG copy) of untouched images.
+        """
+        archive = getattr(self.app, "project_manager", None) and self.app.project_manager.archive
+        handles = {}
+        for key, handle in (("hash", comp.image_handle), ("original", comp.original_image_handle)):
+            if handle is None:
+                continue
+            if not handle.is_loaded and archive is not None and handle.content_hash() in archive.blobs:
+                record[key], record["project"] = handle.content_hash(), archive.path
+            else:
+                handles[key] = handle.acquire()
+        return handles
+
+    def _journaled_components(self):
+        return {tag: comp for tag, comp in self.app.components.items() if not comp.is_dock_asset}
+
+    def _current_points(self):
+        smart_manager = getattr(self.app.border_manager, "smart_manager", None)
+        return smart_manager.raw_border_points if smart_manager else set()
+
+    def _poll(self):
+        self._after_id = None
+        try:
+            self.check_changes()
+        except Exception as e:
+            print(f"[WARNING] Autosave journal: change check failed: {e}")
+        self._after_id = self.app.master.after(self.POLL_INTERVAL_MS, self._poll)
+
+    def check_changes(self):
+        """Queues records for everything that changed since the last check."""
+        writer = self._writer
+        components = self._journaled_components()
+        for tag, comp in components.items():
+            state = self._component_state(comp)
+            if self._journaled.get(tag) == state:
+                continue
+            record = self._component_record(comp)
+            writer.append(record, self._image_refs(comp, record))
+            self._journaled[tag] = state
+        for tag in [t for t in self._journaled if t not in components]:
+            writer.append({"op": "remove", "tag": tag})
+            del self._journaled[tag]
+
+        points = self._current_points()
+        if points != self._points:
+            writer.append({"op": "points", "add": [list(p) for p in points - self._points], "remove": [list(p) for p in self._points - points]})
+            self._points = frozenset(points)
+
+        if writer.records_since_snapshot >= self.COMPACT_EVERY_RECORDS or (
+                writer.records_since_snapshot and time.time() - self._last_snapshot >= self.COMPACT_INTERVAL_S):
+            self._compact()
+
+    def _compact(self):
+        """Queues a snapshot of the whole state; the writer then starts a fresh log."""
+        components = {}
+        self._journaled = {}
+        for tag, comp in self._journaled_components().items():
+            record = self._component_record(comp)
+            del record["op"]
+            components[tag] = (record, self._image_refs(comp, record))
+            self._journaled[tag] = self._component_state(comp)
+        self._points = frozenset(self._current_points())
+        self._writer.snapshot(components, [list(p) for p in self._points])
+        self._last_snapshot = time.time()
+
+    # --- Shutdown ---
+    def shutdown(self, clean=True):
+        """Stops journaling. A clean shutdown deletes the journal, since there is nothing to recover."""
+        if self._after_id is not None:
+            self.app.master.after_cancel(self._after_id)
+            self._after_id = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if clean:
+            shutil.rmtree(self.journal_dir, ignore_errors=True)
@@ -0,0 +1,175 @@
+import json
+import os
+
+from PIL import Image, ImageDraw
+
+# Layout and border geometry shared by the editor and the headless renderer. Nothing in here
+# may import tkinter: `uc_headless` builds exports from these functions without any windows.
+
+# --- PREVIEW LAYOUT COORDINATES ---
+# World-space box (x1, y1, x2, y2) of every UI tile in the default "Show All" layout.
+PREVIEW_LAYOUT = {
+    "humanuitile01": {"coords": [261, 57, 511, 357]},
+    "humanuitile02": {"coords": [511, 57, 761, 357]},
+    "humanuitile03": {"coords": [761, 57, 1011, 357]},
+    "humanuitile04": {"coords": [1011, 57, 1041, 357]},
+    "humanuitile05": {"coords": [11, 57, 261, 357]},
+    "humanuitile06": {"coords": [1041, 57, 1291, 357]},
+    "humanuitile-inventorycover": {"coords": [724, 57, 844, 357]},
+    "humanuitile-timeindicatorframe": {"coords": [585, 57, 720, 132]}
+}
+
+
+# --- Layout Files ---
+# Schema 2 (written since world-coordinate layouts):
+#   {"schema": 2, "components": {tag: {"box": [x1, y1, x2, y2], "z": int, "parent": tag or null}}}
+# Boxes are world coordinates, so a layout doesn't depend on the zoom or pan it was saved at.
+# "z" is the stacking order (0 = bottom); "parent" links e.g. a border to its tile.
+# Schema 1 files ({tag: {"coords": canvas bbox}}) have no version key. They were only ever
+# applied as top-left positions at the default view, where canvas and world coordinates
+# coincide, so they are converted by keeping each component's size at the saved top-left.
+LAYOUT_SCHEMA_VERSION = 2
+
+
+def layout_schema(layout_data):
+    """Returns the schema version of parsed layout JSON."""
+    if isinstance(layout_data, dict) and isinstance(layout_data.get("schema"), int):
+        return layout_data["schema"]
+    return 1
+
+
+def upgrade_layout(layout_data, sizes):
+    """
+    Returns `layout_data` in the current schema. Schema 1 entries keep the (width, height)
+    from `sizes` ({tag: (width, height)}) at their saved top-left; tags without a size are dropped.
+    """
+    schema = layout_schema(layout_data)
+    if schema == LAYOUT_SCHEMA_VERSION:
+        return layout_data
+    if schema != 1:
+        raise ValueError(f"unsupported layout schema {schema}")
+    components = {}
+    for tag, data in layout_data.items():
+        if tag not in sizes or not isinstance(data, dict) or "coords" not in data:
+            continue
+        x1, y1 = data["coords"][0], data["coords"][1]
+        width, height = sizes[tag]
+        # Schema 1 stored no stacking order; the file's order is the order they were drawn in.
+        components[tag] = {"box": [x1, y1, x1 + width, y1 + height], "z": len(components), "parent": None}
+    return {"schema": LAYOUT_SCHEMA_VERSION, "components": components}
+
+
+def read_layout_file(path, sizes):
+    """Reads a layout file as (layout in the current schema, converted from an older schema?)."""
+    with open(path, "r") as f:
+        layout_data = json.load(f)
+    layout = upgrade_layout(layout_data, sizes)
+    return layout, layout is not layout_data
+
+
+def write_layout_file(path, components):
+    """Writes {tag: {"box", "z", "parent"}} as a current-schema layout file."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"schema": LAYOUT_SCHEMA_VERSION, "components": components}, f, indent=4)
+    os.replace(temp_path, path)
+
+
+def preview_sizes():
+    return {tag: (data["coords"][2] - data["coords"][0], data["coords"][3] - data["coords"][1]) for tag, data in PREVIEW_LAYOUT.items()}
+
+
+def load_layout_file(path):
+    """Reads a saved layout and returns {tag: [x1, y1, x2, y2]} merged over the preview layout."""
+    layout, _ = read_layout_file(path, preview_sizes())
+    boxes = {tag: list(data["coords"]) for tag, data in PREVIEW_LAYOUT.items()}
+    for tag, data in layout["components"].items():
+        if tag in boxes:
+            boxes[tag] = list(data["box"])
+    return boxes
+
+
+# --- Preset Borders ---
+def parse_border_file(filepath):
+    """Parses a .txt file and returns a dictionary of {tile_tag: [(x,y), ...]}.
+
+    Expected format:
+    humanuitile01
+    293,164
+    294,164
+    humanuitile02
+    123,123
+    """
+    points_by_tile = {}
+    current_tile_tag = None
+    with open(filepath, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            if ',' in line: # It's a coordinate
+                if current_tile_tag:
+                    x_str, y_str = line.split(',')
+                    points_by_tile[current_tile_tag].append((int(x_str), int(y_str)))
+            else: # It's a tile tag
+                current_tile_tag = line
+                if current_tile_tag not in points_by_tile:
+                    points_by_tile[current_tile_tag] = []
+    return points_by_tile
+
+
+def render_point_border(points, color=(0, 255, 255, 255)):
+    """
+    Draws a preset border's points into a tightly cropped RGBA image.
+    Returns (image, min_x, min_y), the offset of the image within its tile, or None for no points.
+    """
+    if not points:
+        return None
+    min_x = min(p[0] for p in points)
+    min_y = min(p[1] for p in points)
+    max_x = max(p[0] for p in points)
+    max_y = max(p[1] for p in points)
+    width = int(max_x - min_x) + 1
+    height = int(max_y - min_y) + 1
+
+    border_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(border_img)
+    for p_x, p_y in points:
+        draw.point((p_x - min_x, p_y - min_y), fill=color)
+    return border_img, min_x, min_y
+
+
+def scale_border_patch(border_img, target_size, tile_box, border_box):
+    """
+    Returns (border_image, paste_x, paste_y): a border image scaled to the pixel scale of a tile
+    image of `target_size`, and its position in that image. `tile_box` and `border_box` are the
+    world-space (x1, y1, x2, y2) boxes of the tile and the border.
+    Returns (None, 0, 0) if the geometry is degenerate.
+    """
+    target_w, target_h = target_size
+
+    # Calculate the offset in world coordinates
+    offset_x_world = border_box[0] - tile_box[0]
+    offset_y_world = border_box[1] - tile_box[1]
+
+    # --- DEFINITIVE FIX for EXPORT SCALING and POSITIONING ---
+    # 1. Calculate separate scale factors for width and height to handle non-square images correctly.
+    target_world_w = tile_box[2] - tile_box[0]
+    target_world_h = tile_box[3] - tile_box[1]
+    if not border_img or target_world_w == 0 or target_world_h == 0: return None, 0, 0
+
+    scale_x = target_w / target_world_w
+    scale_y = target_h / target_world_h
+
+    # 2. Calculate the paste position in the target image's pixel space.
+    paste_x = int(offset_x_world * scale_x)
+    paste_y = int(offset_y_world * scale_y)
+
+    # 3. Resize the border image to match the target's pixel scale.
+    # --- DEFINITIVE FIX for off-by-one errors ---
+    # Use the border component's world dimensions for precise scaling.
+    border_w_pixels = int((border_box[2] - border_box[0]) * scale_x)
+    border_h_pixels = int((border_box[3] - border_box[1]) * scale_y)
+    if border_w_pixels <= 0 or border_h_pixels <= 0: return None, 0, 0
+    if border_img.size != (border_w_pixels, border_h_pixels):
+        border_img = border_img.resize((border_w_pixels, border_h_pixels), Image.Resampling.LANCZOS)
+    return border_img, paste_x, paste_y
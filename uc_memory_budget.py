@@ -0,0 +1,165 @@
+import threading
+from collections import OrderedDict
+
+REGENERABLE = "regenerable"
+AUTHORITATIVE = "authoritative"
+DEFAULT_CAP_MB = 2048
+
+
+class MemoryBudget:
+    """
+    Tracks the memory held by images and evicts regenerable ones when the total exceeds a cap.
+
+    - Regenerable entries (canvas PhotoImages, preview proxies, mip views, decoded-file caches)
+      are registered with `track` together with an `evict` callback that drops them; they
+      are evicted least recently used first.
+    - Authoritative images (component images, originals, undo snapshots) are never evicted.
+      They are counted by scanning the handles returned by registered sources, so shared
+      copy-on-write handles are only counted once.
+    - Entries tracked or touched during the latest redraw (`begin_frame`/`end_frame`) are on
+      screen and are never evicted, nor is the entry being tracked. If the cap still can't be
+      met, the budget stays over it and warns once instead of evicting what it would redraw.
+    """
+
+    def __init__(self, cap_bytes=DEFAULT_CAP_MB * 1024 * 1024):
+        self.cap_bytes = cap_bytes
+        self._entries = OrderedDict() # key -> [nbytes, evict callback, frame], least recently used first
+        self._regenerable_bytes = 0
+        self._authoritative_sources = []
+        self._authoritative_bytes = 0
+        self._lock = threading.RLock()
+        self.evicted_bytes = 0
+        self._frame = 0 # Id of the latest redraw; entries used in it are on screen
+        self._in_frame = False
+        self._enforcing = False
+        self.over_cap = False # True while the cap can't be met without evicting on-screen data
+
+    # --- Redraw frames ---
+    def begin_frame(self):
+        """Starts a redraw. Entries tracked or touched until the next `begin_frame` are protected."""
+        with self._lock:
+            self._frame += 1
+            self._in_frame = True
+
+    def end_frame(self):
+        with self._lock:
+            self._in_frame = False
+
+    def _current_frame(self):
+        return self._frame if self._in_frame else None
+
+    # --- Regenerable entries ---
+    def track(self, key, nbytes, evict):
+        """Registers or updates a regenerable entry and marks it most recently used."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._regenerable_bytes -= entry[0]
+            frame = self._current_frame() or (entry[2] if entry is not None else None)
+            self._entries[key] = [nbytes, evict, frame]
+            self._regenerable_bytes += nbytes
+        if self.total_bytes > self.cap_bytes:
+            self.enforce(protect=key)
+
+    def touch(self, key):
+        """Marks an entry as recently used (e.g. it was just drawn)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                if self._in_frame:
+                    self._entries[key][2] = self._frame
+
+    def forget(self, key):
+        """Stops tracking an entry without calling its evict callback."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._regenerable_bytes -= entry[0]
+
+    def enforce(self, protect=None):
+        """
+        Evicts least recently used regenerable entries until the total fits the cap. Entries
+        used in the latest redraw and `protect` are skipped, and each entry is evicted at most
+        once per call, so callbacks that re-track a smaller size can't loop. Returns bytes freed.
+        """
+        with self._lock:
+            if self._enforcing: # An evict callback re-tracked its entry; the outer call continues
+                return 0
+            self._enforcing = True
+        freed, evicted = 0, set()
+        try:
+            while True:
+                with self._lock:
+                    if self.total_bytes <= self.cap_bytes:
+                        break
+                    key = next((k for k, (nbytes, _, frame) in self._entries.items()
+                                if nbytes > 0 and k != protect and k not in evicted and frame != self._frame), None)
+                    if key is None:
+                        break # Only on-screen or empty entries are left
+                    nbytes, evict, _ = self._entries.pop(key)
+                    self._regenerable_bytes -= nbytes
+                    evicted.add(key)
+                # Callbacks run outside the lock; they may re-track a smaller size (e.g. a trimmed cache).
+                try:
+                    evict()
+                except Exception as e:
+                    print(f"[WARNING] Memory budget could not evict '{key}': {e}")
+                freed += nbytes
+        finally:
+            with self._lock:
+                self._enforcing = False
+        if freed:
+            self.evicted_bytes += freed
+            print(f"[INFO] Memory budget: evicted {freed / (1024 * 1024):.1f} MB of regenerable image data.")
+        self._update_over_cap()
+        return freed
+
+    def _update_over_cap(self):
+        over_cap = self.total_bytes > self.cap_bytes
+        if over_cap and not self.over_cap:
+            mb = 1024 * 1024
+            print(f"[WARNING] Memory budget: {self.total_bytes / mb:.0f} MB in use is over the {self.cap_bytes / mb:.0f} MB cap, "
+                  f"with {self._authoritative_bytes / mb:.0f} MB of it in images that can't be evicted. "
+                  f"On-screen images are kept; raise the cap or close image sets.")
+        self.over_cap = over_cap
+
+    # --- Authoritative images ---
+    def add_authoritative_source(self, source):
+        """Registers a callable returning an iterable of ImageHandles that must never be evicted."""
+        self._authoritative_sources.append(source)
+
+    def refresh_authoritative(self):
+        """Re-counts authoritative bytes, counting each shared handle once."""
+        seen, total = set(), 0
+        for source in self._authoritative_sources:
+            for handle in source():
+                if handle is not None and id(handle) not in seen:
+                    seen.add(id(handle))
+                    total += handle.nbytes
+        self._authoritative_bytes = total
+        return total
+
+    # --- Readout ---
+    @property
+    def total_bytes(self):
+        return self._regenerable_bytes + self._authoritative_bytes
+
+    def set_cap_mb(self, cap_mb):
+        self.cap_bytes = max(64, int(cap_mb)) * 1024 * 1024
+        self.enforce()
+
+    def usage(self):
+        """Returns a dict of current usage in MB for display."""
+        mb = 1024 * 1024
+        return {
+            "regenerable_mb": self._regenerable_bytes / mb,
+            "authoritative_mb": self._authoritative_bytes / mb,
+            "total_mb": self.total_bytes / mb,
+            "cap_mb": self.cap_bytes / mb,
+            "entries": len(self._entries),
+            "over_cap": self.over_cap,
+        }
+
+
+# The shared, process-wide budget.
+memory_budget = MemoryBudget()
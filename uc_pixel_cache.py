@@ -0,0 +1,175 @@
+import hashlib
+import os
+import struct
+import threading
+
+from PIL import Image
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("[WARNING] NumPy not found. The on-disk pixel cache is disabled; images will be decoded from PNG.")
+
+# --- File Format ---
+# Every cache file is a fixed 64-byte little-endian header followed by raw RGBA rows:
+#   magic (4s) | version (H) | channels (H) | width (I) | height (I) |
+#   source mtime in ns (q) | source size in bytes (q) | padding up to 64 bytes
+# The source mtime/size are compared on every lookup, so an edited PNG invalidates its entry.
+MAGIC = b"UCPX"
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct("<4sHHIIqq")
+HEADER_SIZE = 64
+CHANNELS = 4
+DEFAULT_BUDGET_MB = 4096
+PRUNE_TARGET_RATIO = 0.9 # Pruning frees a little extra, so not every store has to prune
+
+
+class PixelDiskCache:
+    """
+    A persistent cache of decoded RGBA pixels, opened with `numpy.memmap` so a cold start maps
+    the pixels straight from disk instead of inflating PNGs. Images returned by `load` are
+    read-only views of the mapping; they must not be modified in place.
+
+    The cache is kept under `budget_bytes`: once a store goes over it, the least recently used
+    entries (oldest file mtime; `load` touches the entries it hits) are deleted.
+    """
+
+    def __init__(self, cache_dir, budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.enabled = NUMPY_AVAILABLE
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        if self.enabled:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError as e:
+                print(f"[WARNING] Could not create pixel cache directory '{cache_dir}': {e}")
+                self.enabled = False
+        if self.enabled:
+            self.prune() # Also applies a budget that was lowered since the last launch
+
+    def _list_entries(self):
+        """Returns (mtime, size, path) for every cache file."""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".rgba"):
+                path = os.path.join(self.cache_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def prune(self):
+        """Deletes the least recently used entries until the cache fits in its budget (with some headroom)."""
+        with self._lock:
+            try:
+                entries = self._list_entries()
+            except OSError as e:
+                print(f"[WARNING] Could not list pixel cache directory '{self.cache_dir}': {e}")
+                return
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            if total > self.budget_bytes:
+                target = self.budget_bytes * PRUNE_TARGET_RATIO
+                for _, size, path in sorted(entries):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue # Still mapped (Windows); it goes on a later prune
+                    total -= size
+                    removed += 1
+            self._total_bytes = total
+        if removed:
+            print(f"[INFO] Pixel cache pruned: {removed} entries removed, {total / (1024 * 1024):.0f} MB kept.")
+
+    def _entry_path(self, norm_path, variant):
+        """Cache files are named after the source path and variant, so a new version of a file replaces its old entry."""
+        digest = hashlib.blake2b(f"{norm_path}|{variant}".encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.rgba")
+
+    def load(self, norm_path, mtime_ns, size, variant="full"):
+        """Returns a read-only PIL image mapped from the cache, or None on a miss or stale entry."""
+        if not self.enabled:
+            return None
+        entry_path = self._entry_path(norm_path, variant)
+        try:
+            with open(entry_path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+        except OSError:
+            return None
+
+        if len(header) < HEADER_SIZE:
+            return None
+        magic, version, channels, width, height, src_mtime, src_size = HEADER_STRUCT.unpack_from(header)
+        if magic != MAGIC or version != FORMAT_VERSION or channels != CHANNELS:
+            return None
+        if src_mtime != mtime_ns or src_size != size:
+            return None # Stale: the source changed since this entry was written
+
+        try:
+            if os.path.getsize(entry_path) != HEADER_SIZE + width * height * CHANNELS:
+                return None # Truncated write
+            pixels = np.memmap(entry_path, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=(height, width, CHANNELS))
+            try:
+                os.utime(entry_path) # Mark as recently used for pruning
+            except OSError:
+                pass
+            # frombuffer shares the mapped memory instead of copying it.
+            return Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Could not map pixel cache entry '{entry_path}': {e}")
+            return None
+
+    def store(self, norm_path, mtime_ns, size, image, variant="full"):
+        """Writes `image` (converted to RGBA) to the cache. Failures are logged and ignored."""
+        if not self.enabled:
+            return
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        entry_path = self._entry_path(norm_path, variant)
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp" # Unique per writer thread
+        header = HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, CHANNELS, image.width, image.height, mtime_ns, size)
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+                f.write(image.tobytes())
+            entry_size = HEADER_SIZE + image.width * image.height * CHANNELS
+            try:
+                replaced_size = os.path.getsize(entry_path)
+            except OSError:
+                replaced_size = 0
+            # Write-then-rename so a crash never leaves a half-written entry behind.
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            # On Windows an entry that is still mapped can't be replaced; the next launch will retry.
+            print(f"[DEBUG] Could not write pixel cache entry for '{os.path.basename(norm_path)}': {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._total_bytes += entry_size - replaced_size
+            over_budget = self._total_bytes > self.budget_bytes
+        if over_budget:
+            self.prune()
+
+    def clear(self):
+        """Deletes every cache file. Entries that are currently mapped are skipped."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith((".rgba", ".tmp")):
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+        with self._lock:
+            self._total_bytes = sum(size for _, size, _ in self._list_entries()) # Mapped entries that stayed
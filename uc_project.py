@@ -0,0 +1,225 @@
+import json
+import os
+import struct
+import threading
+import weakref
+import zlib
+
+from PIL import Image
+
+from uc_image_handle import ImageHandle
+
+# --- Project File Layout ---
+#   magic (8 bytes) | blob | blob | ... | index (JSON) | footer
+#   footer: index offset (Q) | index length (Q) | footer magic (8 bytes)
+# Blobs are zlib-compressed raw pixels, one per distinct image, keyed in the index by the
+# image's content hash (`ImageHandle.content_hash`), so an image shared by several components,
+# originals or saves is stored once. The index holds the blob table (hash -> offset, length,
+# mode, size) and the project state, so opening a project only reads the tail of the file.
+#
+# Saving appends blobs that aren't in the file yet, then a new index and footer; existing
+# blobs are never rewritten. If a save is interrupted, readers fall back to the last complete
+# footer. Once superseded indexes and unreferenced blobs make up most of the file, the next
+# save compacts it into a fresh file.
+FILE_MAGIC = b"UCPROJ\x00\x01"
+FOOTER_MAGIC = b"UCPINDEX"
+FOOTER = struct.Struct("<QQ8s")
+PROJECT_VERSION = 1
+PROJECT_EXTENSION = ".ucproj"
+BLOB_COMPRESSION_LEVEL = 6
+COMPACT_MIN_BYTES = 4 * 1024 * 1024 # Don't bother compacting smaller files
+COMPACT_GARBAGE_RATIO = 0.5
+_SCAN_CHUNK = 1024 * 1024
+
+
+def encode_blob(image):
+    return zlib.compress(image.tobytes(), BLOB_COMPRESSION_LEVEL)
+
+
+def decode_blob(data, mode, size):
+    return Image.frombytes(mode, tuple(size), zlib.decompress(data))
+
+
+def _read_footer_at(f, footer_end, file_size):
+    """Returns the index dict if a valid footer ends at `footer_end`, else None."""
+    if footer_end < len(FILE_MAGIC) + FOOTER.size or footer_end > file_size:
+        return None
+    f.seek(footer_end - FOOTER.size)
+    index_offset, index_length, magic = FOOTER.unpack(f.read(FOOTER.size))
+    if magic != FOOTER_MAGIC or index_offset + index_length != footer_end - FOOTER.size:
+        return None
+    f.seek(index_offset)
+    try:
+        index = json.loads(f.read(index_length).decode("utf-8"))
+    except ValueError:
+        return None
+    index["_end"] = footer_end
+    return index
+
+
+def read_index(f):
+    """Reads the newest complete index from an open project file."""
+    f.seek(0)
+    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        raise ValueError("not a UI Creator project file")
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    index = _read_footer_at(f, file_size, file_size)
+    if index is not None:
+        return index
+
+    # Interrupted save: scan backwards for the last complete footer.
+    print("[WARNING] Project file has an incomplete save at the end; using the last complete one.")
+    end = file_size
+    while end > len(FILE_MAGIC):
+        start = max(len(FILE_MAGIC), end - _SCAN_CHUNK)
+        f.seek(start)
+        chunk = f.read(end - start + len(FOOTER_MAGIC) - 1)
+        pos = len(chunk)
+        while True:
+            pos = chunk.rfind(FOOTER_MAGIC, 0, pos)
+            if pos < 0:
+                break
+            index = _read_footer_at(f, start + pos + len(FOOTER_MAGIC), file_size)
+            if index is not None:
+                return index
+        end = start
+    raise ValueError("project file has no complete index")
+
+
+class ProjectArchive:
+    """
+    An open project file. Components get lazy handles (`lazy_handle`) that read and decode
+    their blob on first access; because blobs are looked up by hash at that moment, the
+    handles stay valid when a later save appends to or compacts the file. Handles whose blob
+    a save would leave out (e.g. only held by the undo history) are decoded before the file
+    is rewritten, and same-file compaction waits until no such handles are left.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.blobs = {} # content hash -> [offset, length, mode, [width, height]]
+        self.state = {}
+        self._end = None # End of the last complete footer; appends start here
+        self._lock = threading.RLock() # Saving may decode lazy handles of this same archive
+        self._lazy_handles = weakref.WeakSet() # Handles from `lazy_handle` that are still in use
+
+    @classmethod
+    def open(cls, path):
+        archive = cls(path)
+        with open(path, "rb") as f:
+            index = read_index(f)
+        if index.get("version") != PROJECT_VERSION:
+            raise ValueError(f"unsupported project version {index.get('version')}")
+        archive.blobs = index.get("blobs", {})
+        archive.state = index.get("state", {})
+        archive._end = index["_end"]
+        return archive
+
+    # --- Reading ---
+    def read_blob(self, content_hash):
+        """Decodes one blob to a PIL image."""
+        with self._lock:
+            offset, length, mode, size = self.blobs[content_hash]
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read(length)
+        return decode_blob(data, mode, size)
+
+    def lazy_handle(self, content_hash):
+        """Returns an ImageHandle for a blob that is decoded on first access, or None for no image."""
+        if not content_hash or content_hash not in self.blobs:
+            return None
+        _, _, mode, size = self.blobs[content_hash]
+        handle = ImageHandle.lazy(lambda: self.read_blob(content_hash), size, mode, content_hash)
+        self._lazy_handles.add(handle)
+        return handle
+
+    def _orphaned_handles(self, handles):
+        """Returns this archive's undecoded lazy handles whose blobs a save of `handles` would not keep."""
+        return [h for h in list(self._lazy_handles) if not h.is_loaded and h.content_hash() not in handles]
+
+    # --- Writing ---
+    def save(self, state, handles, path=None):
+        """
+        Saves `state` (JSON-serialisable, referring to images by content hash) and the images
+        in `handles` ({content hash: ImageHandle}). Blobs already in the file are kept; only
+        new ones are encoded. Passing a different `path` writes a complete new file there.
+        Returns {"written": new blobs, "reused": kept blobs, "compacted": bool}.
+        """
+        path = path or self.path
+        with self._lock:
+            live = {h: self.blobs[h] for h in handles if h in self.blobs}
+            live_bytes = sum(entry[1] for entry in live.values())
+            same_file = path == self.path and self._end is not None and os.path.exists(path)
+            orphaned = self._orphaned_handles(handles)
+            compact = (same_file and not orphaned and self._end > COMPACT_MIN_BYTES
+                       and live_bytes < self._end * (1 - COMPACT_GARBAGE_RATIO))
+            if same_file and not compact:
+                stats = self._append(state, handles, live)
+            else:
+                # The new file won't contain these blobs: decode them while they can still be read.
+                for handle in orphaned:
+                    handle.image
+                stats = self._rewrite(path, state, handles, live)
+                stats["compacted"] = same_file
+            self.path = path
+            self.state = state
+            return stats
+
+    def _write_blobs(self, f, handles, live, copy_from=None):
+        """Writes blobs for `handles` at the file position; `live` blobs are copied from `copy_from` or kept."""
+        blobs, written, reused = {}, 0, 0
+        for content_hash, handle in handles.items():
+            if content_hash in live:
+                offset, length, mode, size = live[content_hash]
+                if copy_from is not None:
+                    copy_from.seek(offset)
+                    data = copy_from.read(length)
+                    blobs[content_hash] = [f.tell(), length, mode, size]
+                    f.write(data)
+                else:
+                    blobs[content_hash] = live[content_hash]
+                reused += 1
+                continue
+            image = handle.image
+            data = encode_blob(image)
+            blobs[content_hash] = [f.tell(), len(data), image.mode, list(image.size)]
+            f.write(data)
+            written += 1
+        return blobs, written, reused
+
+    def _write_index(self, f, blobs, state):
+        index_offset = f.tell()
+        data = json.dumps({"version": PROJECT_VERSION, "blobs": blobs, "state": state}, separators=(",", ":")).encode("utf-8")
+        f.write(data)
+        f.write(FOOTER.pack(index_offset, len(data), FOOTER_MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+    def _append(self, state, handles, live):
+        with open(self.path, "r+b") as f:
+            f.seek(self._end)
+            f.truncate() # Drop a torn save after the last complete footer
+            blobs, written, reused = self._write_blobs(f, handles, live)
+            end = self._write_index(f, blobs, state)
+        # Blobs left out of the new index are still in the file, so lazy handles that were not
+        # saved (e.g. held by the undo history) can still read them until the next compaction.
+        self.blobs, self._end = {**self.blobs, **blobs}, end
+        return {"written": written, "reused": reused, "compacted": False}
+
+    def _rewrite(self, path, state, handles, live):
+        temp_path = f"{path}.tmp"
+        source = open(self.path, "rb") if live else None
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(FILE_MAGIC)
+                blobs, written, reused = self._write_blobs(f, handles, live, copy_from=source)
+                end = self._write_index(f, blobs, state)
+        finally:
+            if source:
+                source.close()
+        os.replace(temp_path, path)
+        self.blobs, self._end = blobs, end
+        return {"written": written, "reused": reused, "compacted": False}
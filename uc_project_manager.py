@@ -0,0 +1,145 @@
+import os
+import time
+from tkinter import filedialog, messagebox
+
+from uc_component import DraggableComponent
+from uc_memory_budget import memory_budget
+from uc_project import PROJECT_EXTENSION, ProjectArchive
+
+
+class ProjectManager:
+    """
+    Saves and opens single-file projects (see uc_project): every canvas component (tiles,
+    decals, borders) with its position, image and original, plus the smart border points.
+    Images are stored once per content hash. Opening gives components lazy handles, so only
+    the index is read up front and each image is decoded when its component is first drawn
+    (or otherwise used). Saving again only encodes images the file doesn't contain yet.
+    Dock assets are not part of a project; they stay in the settings as before.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.projects_dir = os.path.join(app.ui_creator_contents_path, "projects")
+        self.archive = None
+
+    # --- Save ---
+    def _collect_state(self):
+        """Returns (state, {content hash: handle}) for the current canvas."""
+        components, handles = {}, {}
+
+        def add_image(handle):
+            if handle is None:
+                return None
+            content_hash = handle.content_hash() # Known without decoding for lazy handles
+            handles.setdefault(content_hash, handle)
+            return content_hash
+
+        for tag, comp in self.app.components.items():
+            if comp.is_dock_asset:
+                continue
+            components[tag] = {
+                "box": [comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2],
+                "decal": comp.is_decal, "border_asset": comp.is_border_asset, "parent": comp.parent_tag,
+                "color": comp.placeholder_color, "text": comp.placeholder_text,
+                "image": add_image(comp.image_handle),
+                "original": add_image(comp.original_image_handle),
+            }
+        smart_manager = self.app.border_manager.smart_manager
+        state = {
+            "components": components,
+            "points": [list(p) for p in smart_manager.raw_border_points],
+            "image_set": self.app.selected_image_set.get(),
+            "saved": time.time(),
+        }
+        return state, handles
+
+    def save_project(self, save_as=False):
+        """Saves to the open project file, or asks for a file name first."""
+        path = self.archive.path if self.archive and not save_as else None
+        if path is None:
+            os.makedirs(self.projects_dir, exist_ok=True)
+            path = filedialog.asksaveasfilename(
+                defaultextension=PROJECT_EXTENSION,
+                filetypes=[("UI Creator projects", f"*{PROJECT_EXTENSION}")],
+                title="Save Project",
+                initialdir=self.projects_dir
+            )
+            if not path:
+                return
+
+        start = time.perf_counter()
+        try:
+            state, handles = self._collect_state()
+            archive = self.archive or ProjectArchive(path)
+            stats = archive.save(state, handles, path)
+        except Exception as e:
+            messagebox.showerror("Save Error", f"Failed to save project: {e}")
+            return
+        self.archive = archive
+        compacted = " (file compacted)" if stats["compacted"] else ""
+        print(f"[INFO] Project saved to {path} in {time.perf_counter() - start:.2f}s: "
+              f"{stats['written']} new images, {stats['reused']} unchanged{compacted}.")
+
+    # --- Open ---
+    def open_project(self):
+        """Asks for a project file and replaces the canvas with its contents."""
+        os.makedirs(self.projects_dir, exist_ok=True)
+        path = filedialog.askopenfilename(
+            filetypes=[("UI Creator projects", f"*{PROJECT_EXTENSION}")],
+            title="Open Project",
+            initialdir=self.projects_dir
+        )
+        if not path:
+            return
+        try:
+            archive = ProjectArchive.open(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Open Error", f"Failed to open project: {e}")
+            return
+        self.archive = archive
+        self._apply_state(archive)
+        print(f"[INFO] Opened project {path} ({len(archive.state.get('components', {}))} components, {len(archive.blobs)} images).")
+
+    def _apply_state(self, archive):
+        app = self.app
+        components = archive.state.get("components", {})
+        lazy_handles = {} # One handle per image, so shared images are decoded once
+
+        def handle_for(content_hash):
+            if content_hash and content_hash not in lazy_handles:
+                lazy_handles[content_hash] = archive.lazy_handle(content_hash)
+            return lazy_handles.get(content_hash)
+
+        # The project replaces the canvas, so the undo history no longer applies.
+        app.undo_manager.clear()
+        app._update_undo_buttons()
+
+        for tag in [t for t, c in app.components.items() if t not in components and not c.is_dock_asset]:
+            comp = app.components.pop(tag)
+            app.canvas.delete(comp.tag)
+            if comp.rect_id: app.canvas.delete(comp.rect_id)
+            comp.release_images()
+            memory_budget.forget(("tk_image", tag))
+
+        for tag, data in components.items():
+            comp = app.components.get(tag)
+            if comp is None:
+                comp = DraggableComponent(app, tag, *data["box"], data.get("color"), data.get("text"))
+                app.components[tag] = comp
+                app._bind_component_events(tag)
+            else:
+                comp.world_x1, comp.world_y1, comp.world_x2, comp.world_y2 = data["box"]
+            comp.is_decal = data.get("decal", False)
+            comp.is_border_asset = data.get("border_asset", False)
+            comp.parent_tag = data.get("parent")
+            comp.original_pil_image = handle_for(data.get("original"))
+            image = handle_for(data.get("image"))
+            if image is not None and image is not comp.image_handle:
+                comp.release_filter_base() # Filtered from the image being replaced
+                comp.set_image(image, redraw=False)
+
+        smart_manager = app.border_manager.smart_manager
+        smart_manager.raw_border_points = set(map(tuple, archive.state.get("points", [])))
+        smart_manager._rebuild_quadtree()
+        smart_manager._update_highlights()
+        app.redraw_all_zoomable() # Decodes only the components that are on screen
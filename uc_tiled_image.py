@@ -0,0 +1,200 @@
+import math
+
+from PIL import Image
+
+from uc_blend import BLEND_OVER, blend_arrays, clip_box
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("[WARNING] NumPy not found. Tiled texture storage is disabled; large textures stay monolithic.")
+
+TILE_SIZE = 256
+DEFAULT_TILING_THRESHOLD = 4096 * 4096 # Images with at least this many pixels are stored tiled
+
+
+class TiledImage:
+    """
+    An RGBA image stored as TILE_SIZE x TILE_SIZE NumPy tiles.
+
+    - Writes (`composite_patch`, `paste_array`) touch only the tiles they overlap and mark them dirty.
+    - `snapshot()` returns a copy that shares every tile; a tile is physically copied only when
+      one side writes to it, so an undo snapshot of an 8K sheet costs a list, not 256 MB.
+    - Each tile keeps its own mip chain, rebuilt lazily after the tile changes, so a zoomed-out
+      view of a huge sheet is assembled from small, mostly cached pieces.
+    """
+
+    def __init__(self, width, height, tiles=None):
+        self.width = width
+        self.height = height
+        self.cols = math.ceil(width / TILE_SIZE)
+        self.rows = math.ceil(height / TILE_SIZE)
+        if tiles is None:
+            tiles = [np.zeros((self._tile_h(i), self._tile_w(i), 4), dtype=np.uint8) for i in range(self.cols * self.rows)]
+        self.tiles = tiles
+        self._owned = set(range(len(tiles))) # Tiles this instance may write without copying
+        self.dirty = set(range(len(tiles))) # Tiles changed since the last `clear_dirty`
+        self._mips = {} # tile index -> {level: array}
+
+    # --- Construction ---
+    @classmethod
+    def from_image(cls, image):
+        """Splits a PIL image into tiles (one copy of the pixels)."""
+        pixels = np.asarray(image.convert("RGBA") if image.mode != "RGBA" else image)
+        tiled = cls(image.width, image.height, tiles=[])
+        for row in range(tiled.rows):
+            for col in range(tiled.cols):
+                y, x = row * TILE_SIZE, col * TILE_SIZE
+                tiled.tiles.append(np.array(pixels[y:y + TILE_SIZE, x:x + TILE_SIZE]))
+        tiled._owned = set(range(len(tiled.tiles)))
+        tiled.dirty = set(range(len(tiled.tiles)))
+        return tiled
+
+    def snapshot(self):
+        """Returns a copy sharing all tiles. Whichever side writes a tile first copies it."""
+        copy = TiledImage(self.width, self.height, tiles=list(self.tiles))
+        copy._owned = set()
+        copy.dirty = set()
+        copy._mips = {index: dict(levels) for index, levels in self._mips.items()}
+        self._owned = set()
+        return copy
+
+    # --- Geometry ---
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    @property
+    def mode(self):
+        return "RGBA"
+
+    @property
+    def nbytes(self):
+        return self.width * self.height * 4
+
+    def _tile_w(self, index):
+        return min(TILE_SIZE, self.width - (index % self.cols) * TILE_SIZE)
+
+    def _tile_h(self, index):
+        return min(TILE_SIZE, self.height - (index // self.cols) * TILE_SIZE)
+
+    def tiles_in_box(self, box):
+        """Yields (index, tile_x, tile_y) for every tile overlapping the (x1, y1, x2, y2) box."""
+        x1, y1, x2, y2 = box
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(self.width, x2), min(self.height, y2)
+        if x1 >= x2 or y1 >= y2:
+            return
+        for row in range(y1 // TILE_SIZE, (y2 - 1) // TILE_SIZE + 1):
+            for col in range(x1 // TILE_SIZE, (x2 - 1) // TILE_SIZE + 1):
+                yield row * self.cols + col, col * TILE_SIZE, row * TILE_SIZE
+
+    # --- Writing ---
+    def _writable_tile(self, index):
+        if index not in self._owned:
+            self.tiles[index] = self.tiles[index].copy()
+            self._owned.add(index)
+        self.dirty.add(index)
+        self._mips.pop(index, None)
+        return self.tiles[index]
+
+    def composite_patch(self, patch, x, y, mode=BLEND_OVER):
+        """
+        Blends the RGBA `patch` (array or PIL image) in at (x, y) using the uc_blend kernels.
+        Only the tiles under the patch are copied (if shared) and written. Returns True if any
+        pixels were covered.
+        """
+        if not isinstance(patch, np.ndarray):
+            patch = np.asarray(patch.convert("RGBA") if patch.mode != "RGBA" else patch)
+        patch_h, patch_w = patch.shape[:2]
+        touched = False
+        for index, tile_x, tile_y in self.tiles_in_box((x, y, x + patch_w, y + patch_h)):
+            tile = self._writable_tile(index)
+            boxes = clip_box(tile.shape[1], tile.shape[0], patch_w, patch_h, x - tile_x, y - tile_y)
+            if boxes is None:
+                continue
+            (dx1, dy1, dx2, dy2), (sx1, sy1, sx2, sy2) = boxes
+            blend_arrays(tile[dy1:dy2, dx1:dx2], patch[sy1:sy2, sx1:sx2], mode)
+            touched = True
+        return touched
+
+    def paste_array(self, pixels, x, y):
+        """Overwrites the region at (x, y) with the RGBA array `pixels`, touching only those tiles."""
+        patch_h, patch_w = pixels.shape[:2]
+        for index, tile_x, tile_y in self.tiles_in_box((x, y, x + patch_w, y + patch_h)):
+            tile = self._writable_tile(index)
+            boxes = clip_box(tile.shape[1], tile.shape[0], patch_w, patch_h, x - tile_x, y - tile_y)
+            if boxes is None:
+                continue
+            (dx1, dy1, dx2, dy2), (sx1, sy1, sx2, sy2) = boxes
+            tile[dy1:dy2, dx1:dx2] = pixels[sy1:sy2, sx1:sx2]
+
+    def clear_dirty(self):
+        """Returns and resets the set of tiles changed since the last call (e.g. for incremental export)."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    # --- Reading ---
+    def read_region(self, box):
+        """Returns a new RGBA array for the (x1, y1, x2, y2) box, reading only the overlapping tiles."""
+        x1, y1, x2, y2 = box
+        out = np.zeros((max(0, y2 - y1), max(0, x2 - x1), 4), dtype=np.uint8)
+        for index, tile_x, tile_y in self.tiles_in_box(box):
+            tile = self.tiles[index]
+            sx1, sy1 = max(x1, tile_x) - tile_x, max(y1, tile_y) - tile_y
+            sx2, sy2 = min(x2, tile_x + tile.shape[1]) - tile_x, min(y2, tile_y + tile.shape[0]) - tile_y
+            out[tile_y + sy1 - y1:tile_y + sy2 - y1, tile_x + sx1 - x1:tile_x + sx2 - x1] = tile[sy1:sy2, sx1:sx2]
+        return out
+
+    def to_image(self):
+        """Assembles the full-resolution PIL image (one full-size allocation)."""
+        return Image.fromarray(self.read_region((0, 0, self.width, self.height)), "RGBA")
+
+    def _tile_mip(self, index, level):
+        """Returns the tile downsampled by 2**level (2x2 box filter per level), cached until the tile changes."""
+        if level == 0:
+            return self.tiles[index]
+        levels = self._mips.setdefault(index, {})
+        mip = levels.get(level)
+        if mip is None:
+            parent = self._tile_mip(index, level - 1)
+            h, w = parent.shape[0] // 2 * 2, parent.shape[1] // 2 * 2
+            if h == 0 or w == 0:
+                mip = parent[:max(1, parent.shape[0] // 2), :max(1, parent.shape[1] // 2)].copy()
+            else:
+                quad = parent[:h, :w].reshape(h // 2, 2, w // 2, 2, 4).astype(np.uint16)
+                mip = ((quad.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8)
+            levels[level] = mip
+        return mip
+
+    def mip_image(self, level):
+        """Assembles a PIL image at 1 / 2**level scale from the per-tile mips."""
+        if level <= 0:
+            return self.to_image()
+        tile_step = TILE_SIZE >> level
+        if tile_step == 0:
+            level = int(math.log2(TILE_SIZE))
+            tile_step = 1
+        mips = [self._tile_mip(index, level) for index in range(len(self.tiles))]
+        out_w = sum(mips[col].shape[1] for col in range(self.cols))
+        out_h = sum(mips[row * self.cols].shape[0] for row in range(self.rows))
+        out = np.zeros((out_h, out_w, 4), dtype=np.uint8)
+        for index, mip in enumerate(mips):
+            y = (index // self.cols) * tile_step
+            x = (index % self.cols) * tile_step
+            out[y:y + mip.shape[0], x:x + mip.shape[1]] = mip
+        return Image.fromarray(out, "RGBA")
+
+    def level_for_size(self, target_w, target_h):
+        """Returns the coarsest mip level that is still at least (target_w, target_h) pixels."""
+        level = 0
+        while level < int(math.log2(TILE_SIZE)) and (self.width >> (level + 1)) >= target_w and (self.height >> (level + 1)) >= target_h:
+            level += 1
+        return level
+
+
+def should_tile(image, threshold=DEFAULT_TILING_THRESHOLD):
+    """True if `image` is large enough to be stored tiled (and NumPy is available)."""
+    return NUMPY_AVAILABLE and threshold > 0 and image is not None and image.width * image.height >= threshold
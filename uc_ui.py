@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, colorchooser
 
 class UIManager:
     """Manages the creation and layout of the Tkinter UI widgets."""
@@ -46,6 +46,11 @@ class UIManager:
         self.app.undo_button = tk.Button(status_box_frame, text="Undo / Ctrl Z", bg='#4b5563', fg='white', relief='flat', font=('Inter', 10, 'bold'),
                                      command=self.app.undo_last_action, state='disabled', padx=5, pady=2)
         self.app.undo_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        # --- NEW: Redo ---
+        self.app.redo_button = tk.Button(status_box_frame, text="Redo / Ctrl Y", bg='#4b5563', fg='white', relief='flat', font=('Inter', 10, 'bold'),
+                                     command=self.app.redo_last_action, state='disabled', padx=5, pady=2)
+        self.app.redo_button.pack(side=tk.LEFT, padx=(0, 5), pady=5)
         
         zoom_label = tk.Label(status_box_frame, textvariable=self.app.camera.zoom_label_var, bg="#1f2937", fg="#d1d5db", font=('Inter', 10, 'bold'))
         zoom_label.pack(side=tk.LEFT, padx=(0, 5), pady=5)
@@ -54,6 +59,10 @@ class UIManager:
                                            command=self.app.camera.reset_view, padx=5, pady=2)
         self.app.reset_view_button.pack(side=tk.LEFT, padx=(0, 5), pady=5)
 
+        # --- NEW: Live memory budget readout ---
+        memory_label = tk.Label(status_box_frame, textvariable=self.app.memory_label_var, bg="#1f2937", fg="#9ca3af", font=('Inter', 10))
+        memory_label.pack(side=tk.LEFT, padx=(0, 5), pady=5)
+
         self.app.canvas.create_window(10, 10, window=status_box_frame, anchor="nw")
 
     def create_coordinate_display(self):
@@ -139,7 +148,17 @@ class UIManager:
         tk.Button(layout_frame, text="Save Layout", bg='#3b82f6', fg='white', relief='flat', font=button_font, command=self.app.save_layout).pack(side=tk.LEFT, fill='x', expand=True, padx=(0, 5))
         tk.Button(layout_frame, text="Load Layout", bg='#3b82f6', fg='white', relief='flat', font=button_font, command=self.app.load_layout).pack(side=tk.RIGHT, fill='x', expand=True, padx=(5, 0))
         tk.Button(tab, text="Default Layout", bg='#6b7280', fg='white', relief='flat', font=button_font, command=self.app.apply_preview_layout).pack(fill='x', padx=10, pady=5)
-        
+
+        tk.Frame(tab, height=2, bg="#6b7280").pack(fill='x', padx=10, pady=10)
+
+        # --- NEW: Single-file projects ---
+        tk.Label(tab, text="PROJECT", **label_style).pack(fill='x')
+        project_frame = tk.Frame(tab, bg="#374151")
+        project_frame.pack(fill='x', padx=10, pady=5)
+        tk.Button(project_frame, text="Save Project", bg='#3b82f6', fg='white', relief='flat', font=button_font, command=self.app.project_manager.save_project).pack(side=tk.LEFT, fill='x', expand=True, padx=(0, 5))
+        tk.Button(project_frame, text="Open Project", bg='#3b82f6', fg='white', relief='flat', font=button_font, command=self.app.project_manager.open_project).pack(side=tk.RIGHT, fill='x', expand=True, padx=(5, 0))
+        tk.Button(tab, text="Save Project As...", bg='#6b7280', fg='white', relief='flat', font=button_font, command=lambda: self.app.project_manager.save_project(save_as=True)).pack(fill='x', padx=10, pady=5)
+
         tk.Frame(tab, height=2, bg="#6b7280").pack(fill='x', padx=10, pady=10)
         
         tk.Label(tab, text="IMAGE SET", **label_style).pack(fill='x')
@@ -164,7 +183,10 @@ class UIManager:
         self.image_dock_canvas.grid(row=0, column=0, sticky='nsew')
         image_scrollbar = ttk.Scrollbar(image_dock_frame, orient="vertical", command=self.image_dock_canvas.yview)
         image_scrollbar.grid(row=0, column=1, sticky='ns')
-        self.image_dock_canvas.configure(yscrollcommand=image_scrollbar.set)
+        def on_dock_scrolled(first, last):
+            image_scrollbar.set(first, last)
+            self.app.image_manager.schedule_dock_thumbnails() # Scrolled, resized or grown
+        self.image_dock_canvas.configure(yscrollcommand=on_dock_scrolled)
 
         self._create_transform_controls(tab)
 
@@ -249,6 +271,16 @@ class UIManager:
             if col >= 2: # 2 buttons per row
                 col = 0; row += 1
 
+        # --- NEW: Memory cap for regenerable image data ---
+        tk.Frame(tab, height=2, bg="#6b7280").pack(fill='x', padx=10, pady=10)
+        tk.Label(tab, text="MEMORY", **label_style).pack(fill='x')
+        memory_frame = tk.Frame(tab, bg="#374151", padx=10, pady=5)
+        memory_frame.pack(fill='x')
+        tk.Label(memory_frame, text="Cap (MB):", bg="#374151", fg="white").pack(side=tk.LEFT)
+        tk.Entry(memory_frame, textvariable=self.app.memory_cap_var, width=8).pack(side=tk.LEFT, padx=5)
+        tk.Button(memory_frame, text="Apply", bg='#6b7280', fg='white', relief='flat',
+                  command=self.app.apply_memory_cap).pack(side=tk.LEFT)
+
     def _populate_border_tab(self, tab):
         # --- FIX: Clear existing widgets before repopulating to prevent duplicates ---
         for widget in tab.winfo_children():
@@ -389,8 +421,42 @@ class UIManager:
         label_style = {"bg": "#374151", "fg": "white", "font": ("Inter", 12, "bold"), "pady": 10}
         button_font = ('Inter', 11, 'bold')
 
+        manager = self.app.filter_manager
+        scale_style = {"orient": tk.HORIZONTAL, "bg": "#374151", "fg": "white", "troughcolor": "#4b5563", "highlightthickness": 0}
+
         tk.Label(tab, text="IMAGE FILTERS", **label_style).pack(fill='x')
-        tk.Label(tab, text="Controls for brightness, contrast, etc.\nwill go here.", bg="#374151", fg="#9ca3af", justify=tk.LEFT, padx=10).pack(fill='x', pady=10)
+        tk.Label(tab, text="Adjusts the selected tile. Dragging previews at\nreduced size; releasing applies at full quality.", bg="#374151", fg="#9ca3af", justify=tk.LEFT, padx=10).pack(fill='x')
+
+        def add_section(title, sliders):
+            tk.Label(tab, text=title, bg="#374151", fg="white", font=("Inter", 10, "bold"), anchor='w', padx=10).pack(fill='x', pady=(8, 0))
+            frame = tk.Frame(tab, bg="#374151")
+            frame.pack(fill='x', padx=10)
+            for row, (label, key, from_, to, resolution) in enumerate(sliders):
+                tk.Label(frame, text=label, bg="#374151", fg="white").grid(row=row, column=0, sticky='w')
+                scale = tk.Scale(frame, from_=from_, to=to, resolution=resolution, variable=manager.vars[key], command=manager.preview, **scale_style)
+                scale.grid(row=row, column=1, sticky='ew')
+                scale.bind("<ButtonRelease-1>", manager.commit)
+            frame.grid_columnconfigure(1, weight=1)
+            return frame
+
+        add_section("LIGHT", [("Brightness:", "brightness", -100, 100, 1), ("Contrast:", "contrast", -100, 100, 1)])
+        add_section("COLOR", [("Hue:", "hue", -180, 180, 1), ("Saturation:", "saturation", -100, 100, 1)])
+        add_section("LEVELS", [("Black:", "levels_black", 0, 254, 1), ("White:", "levels_white", 1, 255, 1), ("Gamma:", "levels_gamma", 0.1, 5.0, 0.05)])
+        tint_frame = add_section("TINT", [("Strength:", "tint_strength", 0, 100, 1)])
+
+        def choose_tint_color():
+            color = colorchooser.askcolor(initialcolor=manager.vars["tint_color"].get(), title="Choose Tint Color")[1]
+            if color:
+                manager.vars["tint_color"].set(color)
+                tint_button.config(bg=color)
+                manager.commit()
+
+        tint_button = tk.Button(tint_frame, text="Color", bg=manager.vars["tint_color"].get(), fg='black', relief='flat', font=('Inter', 8), command=choose_tint_color)
+        tint_button.grid(row=0, column=2, padx=(5, 0))
+        add_section("DETAIL", [("Sharpen:", "sharpen", 0, 100, 1)])
+
+        tk.Button(tab, text="Reset Filters", bg='#6b7280', fg='white', relief='flat', font=button_font,
+                  command=manager.reset_filters).pack(fill='x', padx=10, pady=10)
 
     def _populate_text_tab(self, tab):
         label_style = {"bg": "#374151", "fg": "white", "font": ("Inter", 12, "bold"), "pady": 10}
@@ -405,10 +471,34 @@ class UIManager:
         
         tk.Button(tab, text="Save Modified as DDS", bg='#3b82f6', fg='white', relief='flat', font=button_font, command=lambda: self.app.export_manager.export_images('dds')).pack(fill='x', padx=10, pady=(5, 10))
 
+        tk.Button(tab, text="Save Modified as BLP", bg='#8b5cf6', fg='white', relief='flat', font=button_font, command=lambda: self.app.export_manager.export_images('blp')).pack(fill='x', padx=10, pady=(0, 10))
+
+        # --- NEW: Built-in DDS encoder options ---
+        dds_frame = tk.Frame(tab, bg="#374151")
+        dds_frame.pack(fill='x', padx=10)
+        tk.Label(dds_frame, text="DDS quality:", bg="#374151", fg="white").pack(side=tk.LEFT)
+        for text, value in (("Fast", "fast"), ("High", "hq")):
+            tk.Radiobutton(dds_frame, text=text, value=value, variable=self.app.export_manager.dds_quality_var,
+                           bg="#374151", fg="white", selectcolor="#1f2937", activebackground="#374151", activeforeground="white").pack(side=tk.LEFT)
+        tk.Checkbutton(dds_frame, text="Mipmaps", variable=self.app.export_manager.dds_mipmaps_var,
+                       bg="#374151", fg="white", selectcolor="#1f2937", activebackground="#374151", activeforeground="white").pack(side=tk.RIGHT)
+
         # --- NEW: Checkbox to control export behavior ---
         tk.Checkbutton(tab, text="Export all tiles (not just modified)", variable=self.app.export_all_tiles,
                         bg="#374151", fg="white", selectcolor="#1f2937", activebackground="#374151", activeforeground="white"
                         ).pack(pady=5)
+        tk.Checkbutton(tab, text="Force full export (ignore unchanged tiles)", variable=self.app.export_manager.force_full_export_var,
+                        bg="#374151", fg="white", selectcolor="#1f2937", activebackground="#374151", activeforeground="white"
+                        ).pack(pady=(0, 5))
+
+        # --- NEW: Background export progress ---
+        export_manager = self.app.export_manager
+        progress_frame = tk.Frame(tab, bg="#374151")
+        progress_frame.pack(fill='x', padx=10, pady=5)
+        ttk.Progressbar(progress_frame, variable=export_manager.progress_var, maximum=100.0, mode='determinate').pack(side=tk.LEFT, fill='x', expand=True)
+        tk.Button(progress_frame, text="Cancel", bg='#ef4444', fg='white', relief='flat', font=('Inter', 9, 'bold'),
+                  command=export_manager.cancel_export).pack(side=tk.RIGHT, padx=(5, 0))
+        tk.Label(tab, textvariable=export_manager.status_var, bg="#374151", fg="#9ca3af", padx=10).pack(fill='x')
 
         tk.Frame(tab, height=2, bg="#6b7280").pack(fill='x', padx=10, pady=10)
         tk.Label(tab, text="OPEN EXPORT FOLDER", **label_style).pack(fill='x')
@@ -416,8 +506,9 @@ class UIManager:
         open_folder_frame.pack(fill='x', padx=10, pady=5)
         tk.Button(open_folder_frame, text="Open PNG Folder", bg='#6b7280', fg='white', relief='flat', font=button_font, command=lambda: self.app.open_export_folder('png')).pack(side=tk.LEFT, fill='x', expand=True, padx=(0, 5))
         tk.Button(open_folder_frame, text="Open DDS Folder", bg='#6b7280', fg='white', relief='flat', font=button_font, command=lambda: self.app.open_export_folder('dds')).pack(side=tk.RIGHT, fill='x', expand=True, padx=(5, 0))
+        tk.Button(tab, text="Open BLP Folder", bg='#6b7280', fg='white', relief='flat', font=button_font, command=lambda: self.app.open_export_folder('blp')).pack(fill='x', padx=10, pady=(0, 5))
 
-        tk.Label(tab, text="Note: DDS export requires the image\ndimensions to be a power of two\n(e.g., 256x256, 512x512) and may not\nsupport all internal DDS formats.",
+        tk.Label(tab, text="Note: DDS files are written as BC3 (DXT5).\nPower-of-two sizes (e.g., 256x256, 512x512)\nare recommended for in-game textures.",
                  bg="#374151", fg="#9ca3af", justify=tk.LEFT, padx=10).pack(fill='x')
 
     def _create_transform_controls(self, parent_tab):
@@ -0,0 +1,355 @@
+import itertools
+import os
+import shutil
+import tempfile
+import zlib
+
+from PIL import Image, ImageChops
+
+from uc_image_handle import ImageHandle, images_identical, release_handles
+from uc_memory_budget import memory_budget
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_BUDGET_MB = 256 # Compressed undo/redo data kept in memory
+DEFAULT_DISK_BUDGET_MB = 2048 # Compressed undo/redo data spilled to temp files
+COMPRESSION_LEVEL = 1 # zlib's fastest level; diff regions are small, so speed matters more than ratio
+
+
+# --- Image Diffs ---
+def _changed_box(before, after):
+    """Bounding box (x1, y1, x2, y2) of the pixels that differ between two same-sized images, or None."""
+    if NUMPY_AVAILABLE:
+        changed = np.asarray(before) != np.asarray(after)
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if not rows.size:
+            return None
+        cols = np.flatnonzero(changed.any(axis=0))
+        return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+    # Per band, so a change in one channel (e.g. alpha only) is never missed.
+    boxes = [ImageChops.difference(a, b).getbbox() for a, b in zip(before.split(), after.split())]
+    boxes = [box for box in boxes if box]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+class ImageDiff:
+    """
+    A compressed rectangle of one image's pixels, for undo/redo. `box` is the rectangle's place
+    in the image, or None when the diff holds a whole image (the size changed, or the component
+    no longer exists). Applying a diff to the image it was taken against swaps the pixels in:
+    it returns the restored image and a new diff that reverts the swap, so undo and redo are
+    the same operation.
+    """
+    __slots__ = ("box", "mode", "region_size", "raw_bytes", "_payload", "spill_path", "disk_bytes")
+
+    def __init__(self, region, box=None):
+        self.box = box
+        self.mode = region.mode
+        self.region_size = region.size
+        raw = region.tobytes()
+        self.raw_bytes = len(raw)
+        self._payload = zlib.compress(raw, COMPRESSION_LEVEL)
+        self.spill_path = None
+        self.disk_bytes = 0
+
+    @classmethod
+    def between(cls, before, after):
+        """Returns the diff that turns `after` back into `before` (PIL images), or None if they are identical."""
+        if before.size != after.size or before.mode != after.mode:
+            return cls(before)
+        box = _changed_box(before, after)
+        if box is None:
+            return None
+        return cls(before.crop(box), box)
+
+    @property
+    def nbytes(self):
+        """Compressed bytes held in memory (0 once spilled)."""
+        return len(self._payload) if self._payload is not None else 0
+
+    @property
+    def spilled(self):
+        return self._payload is None
+
+    def region(self):
+        """Decompresses the stored pixels."""
+        data = self._payload
+        if data is None:
+            with open(self.spill_path, "rb") as f:
+                data = f.read()
+        return Image.frombytes(self.mode, self.region_size, zlib.decompress(data))
+
+    def apply(self, current):
+        """Returns (restored PIL image, inverse diff) for the PIL image `current`."""
+        region = self.region()
+        if self.box is None:
+            return region, ImageDiff(current)
+        inverse = ImageDiff(current.crop(self.box), self.box)
+        restored = current.copy()
+        restored.paste(region, self.box[:2])
+        return restored, inverse
+
+    def spill(self, path):
+        """Moves the compressed pixels from memory to `path`."""
+        if self._payload is None:
+            return 0
+        with open(path, "wb") as f:
+            f.write(self._payload)
+        freed, self._payload, self.spill_path = len(self._payload), None, path
+        self.disk_bytes = freed
+        return freed
+
+    def discard(self):
+        """Deletes the spill file, if any. The diff must not be used afterwards."""
+        self._payload = None
+        if self.spill_path:
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+            self.spill_path = None
+        self.disk_bytes = 0
+
+
+def _walk(obj):
+    """Yields every ImageDiff and ImageHandle inside an undo state (nested dicts/lists/tuples)."""
+    if isinstance(obj, (ImageDiff, ImageHandle)):
+        yield obj
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            yield from _walk(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            yield from _walk(value)
+
+
+def discard_state(state):
+    """Releases the handles and deletes the spill files held by a state that is being dropped."""
+    for item in _walk(state):
+        if isinstance(item, ImageDiff):
+            item.discard()
+    release_handles(state)
+
+
+class UndoManager:
+    """
+    Holds the undo and redo stacks and keeps their image data small.
+
+    States are the same dicts the app has always pushed; image values start out as shared
+    ImageHandles. When the next state is pushed, the previous one is "sealed": each image is
+    replaced by an ImageDiff holding only the bounding box of the pixels that changed since,
+    zlib-compressed. Undo and redo swap those diffs in and produce the inverse state for the
+    other stack. The stacks are capped by bytes, not by count: once the compressed data in
+    memory exceeds the budget the oldest diffs are spilled to temp files, and once the spill
+    files exceed the disk budget the oldest steps are dropped. Tiled textures keep their
+    handles, because their storage already shares unchanged tiles.
+    """
+
+    def __init__(self, app, budget_mb=DEFAULT_BUDGET_MB, disk_budget_mb=DEFAULT_DISK_BUDGET_MB):
+        self.app = app
+        self.undo_stack = []
+        self.redo_stack = []
+        self.budget_bytes = max(1, int(budget_mb)) * 1024 * 1024
+        self.disk_budget_bytes = max(0, int(disk_budget_mb)) * 1024 * 1024
+        self._spill_dir = None
+        self._spill_ids = itertools.count()
+        self._open = None # The newest undo state, whose images are not sealed yet
+
+    # --- Stacks ---
+    def push(self, state):
+        """Records a new action. Seals the previous one and clears the redo stack."""
+        self._seal_open()
+        for old_state in self.redo_stack:
+            discard_state(old_state)
+        self.redo_stack.clear()
+        self.undo_stack.append(state)
+        # Images the caller already replaced are sealed against their post-action image now;
+        # the rest (the usual push-before-change) are sealed when the next action is pushed.
+        self._seal(state, only_replaced=True)
+        self._open = state
+        self._enforce()
+
+    def pop_undo(self):
+        return self._pop(self.undo_stack)
+
+    def pop_redo(self):
+        return self._pop(self.redo_stack)
+
+    def _pop(self, stack):
+        if not stack:
+            return None
+        state = stack.pop()
+        if state is self._open:
+            self._open = None
+        return state
+
+    def push_inverse(self, state, to_redo):
+        """Pushes the inverse of an undone (`to_redo`) or redone state. Its images are sealed right away."""
+        self._seal_open()
+        self._seal(state)
+        (self.redo_stack if to_redo else self.undo_stack).append(state)
+        self._enforce()
+
+    def clear(self):
+        """Drops both stacks (e.g. when a project replaces the canvas)."""
+        for state in self.undo_stack + self.redo_stack:
+            discard_state(state)
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._open = None
+        memory_budget.track("undo_history", 0, self.spill)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def iter_handles(self):
+        """Yields the ImageHandles still held by either stack (for the memory budget)."""
+        for state in self.undo_stack + self.redo_stack:
+            for item in _walk(state):
+                if isinstance(item, ImageHandle):
+                    yield item
+
+    # --- Swapping images ---
+    def swap_image(self, current_handle, value):
+        """
+        Returns (image to set, inverse value) for restoring `value` (an ImageHandle or ImageDiff)
+        over a component's `current_handle`. The inverse is the component's current image; it
+        is sealed into a diff by `push_inverse`.
+        """
+        if isinstance(value, ImageDiff):
+            image, inverse = value.apply(current_handle.image)
+            value.discard()
+            return image, inverse
+        inverse = current_handle.acquire() if current_handle else None
+        return value, inverse
+
+    @staticmethod
+    def resolve_image(value):
+        """Returns a settable image for a value that is restored without a current image (e.g. a re-created component)."""
+        if isinstance(value, ImageDiff):
+            image = value.region()
+            value.discard()
+            return image
+        return value
+
+    # --- Sealing ---
+    def _seal_open(self):
+        if self._open is not None:
+            self._seal(self._open)
+            self._open = None
+
+    def _current_handle(self, tag):
+        comp = self.app.components.get(tag)
+        return comp.image_handle if comp else None
+
+    def _seal(self, state, only_replaced=False):
+        """
+        Replaces the image handles in `state` by diffs against the components' current images.
+        With `only_replaced`, images the component still holds (the change hasn't happened yet)
+        are left as handles, and deleted components' images are left alone.
+        """
+        if not isinstance(state, dict):
+            return
+        action_type = state.get('type')
+        if action_type == 'filters':
+            state['image'] = self._compress(state.get('image'), self._current_handle(state.get('tag')), only_replaced)
+        elif action_type == 'delete_component':
+            if not only_replaced:
+                data = state.get('component_data') or {}
+                data['pil_image'] = self._compress(data.get('pil_image'), None)
+        elif action_type is None:
+            for tag, value in list(state.items()):
+                state[tag] = self._compress(value, self._current_handle(tag), only_replaced)
+
+    def _compress(self, value, current_handle, only_replaced=False):
+        if not isinstance(value, ImageHandle):
+            return value
+        if only_replaced and value is current_handle:
+            return value
+        if value.tiled is not None or (current_handle is not None and current_handle.tiled is not None):
+            return value
+        if current_handle is None:
+            diff = ImageDiff(value.image)
+        elif images_identical(value, current_handle):
+            return value # Same pixels as the component; the handle costs nothing extra
+        else:
+            diff = ImageDiff.between(value.image, current_handle.image)
+            if diff is None:
+                return value
+        value.release()
+        return diff
+
+    # --- Budget ---
+    def _diffs_oldest_first(self):
+        # Redo states are popped from the end, so their oldest-to-need entries are at the start too.
+        for stack in (self.undo_stack, self.redo_stack):
+            for state in stack:
+                for item in _walk(state):
+                    if isinstance(item, ImageDiff):
+                        yield item
+
+    def memory_bytes(self):
+        return sum(diff.nbytes for diff in self._diffs_oldest_first())
+
+    def disk_bytes(self):
+        return sum(diff.disk_bytes for diff in self._diffs_oldest_first())
+
+    def _spill_path(self):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="uc_undo_")
+        return os.path.join(self._spill_dir, f"{next(self._spill_ids)}.bin")
+
+    def spill(self, target_bytes=0):
+        """Spills the oldest in-memory diffs to temp files until at most `target_bytes` stay in memory."""
+        in_memory = self.memory_bytes()
+        spilled = 0
+        for diff in self._diffs_oldest_first():
+            if in_memory <= target_bytes:
+                break
+            if diff.spilled:
+                continue
+            try:
+                freed = diff.spill(self._spill_path())
+            except OSError as e:
+                print(f"[WARNING] Could not spill undo data to disk: {e}")
+                break
+            in_memory -= freed
+            spilled += freed
+        if spilled:
+            print(f"[INFO] Undo history: spilled {spilled / (1024 * 1024):.1f} MB to disk.")
+        memory_budget.track("undo_history", in_memory, self.spill)
+        return spilled
+
+    def _enforce(self):
+        if self.memory_bytes() > self.budget_bytes:
+            self.spill(self.budget_bytes // 2) # Spill in chunks instead of on every push
+        dropped = 0
+        while self.disk_bytes() > self.disk_budget_bytes and (self.undo_stack or self.redo_stack):
+            stack = self.undo_stack if self.undo_stack else self.redo_stack
+            state = stack.pop(0)
+            if state is self._open:
+                self._open = None
+            discard_state(state)
+            dropped += 1
+        if dropped:
+            print(f"[INFO] Undo history: dropped the {dropped} oldest step(s) to stay within the disk budget.")
+        memory_budget.track("undo_history", self.memory_bytes(), self.spill)
+
+    def shutdown(self):
+        """Deletes the spill files."""
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None